@@ -1,18 +1,68 @@
 from datetime import datetime
-from flask_openapi3 import OpenAPI, Info, Tag
-from flask import redirect
-from urllib.parse import unquote
+from flask_openapi3 import OpenAPI, APIBlueprint, Info, Tag
+from flask import g, redirect, request, Response, current_app, \
+    stream_with_context
+from urllib.parse import unquote, urlencode
+from flask.json.provider import DefaultJSONProvider
+import json
+import logging
+import os
+import time
 
+from pydantic import ValidationError
+from sqlalchemy import update, delete, and_
 from sqlalchemy.exc import IntegrityError
 
-from model import Session, Data
-from logger import logger
+from model import Session, Data, AreaClosure, AREAS, data_rtree, \
+    data_tombstone, current_version, read_stats, rebuild_stats, \
+    match_expression, suggest_names, TEXT_SEARCH_SQL, \
+    next_check_date_expression, begin_transaction, configure_engine, \
+    init_db
+from logger import logger, access_logger
+from cache import response_cache
+from coalesce import make_write_coalescer
+from replica import make_replica, page
+import metrics
+import profiling
+from jobs import WFSResolver, ExtentNormalizer, LinkChecker, start_job, \
+    get_job
 from schemas import *
 from flask_cors import CORS
+import click
 
 info = Info(title="DataControl API", version="1.0.0")
-app = OpenAPI(__name__, info=info)
-CORS(app)
+# routes, hooks and commands of the API, registered on the app by create_app
+api = APIBlueprint("api", __name__, cli_group=None)
+
+
+@api.before_app_request
+def start_access_log():
+    """Notes when the request started, for the access log. Registered
+    before the response cache, so cached responses are logged too.
+    """
+    g.access_started = time.perf_counter()
+
+
+@api.after_app_request
+def write_access_log(response):
+    """Writes a structured (JSON) record of the request to the access log.
+    The record is formatted and written by the logging listener thread.
+    """
+    if access_logger.isEnabledFor(logging.INFO):
+        started = g.get("access_started")
+        access_logger.info(
+            "%s %s %s", request.method, request.path, response.status_code,
+            extra={
+                "method": request.method,
+                "path": request.path,
+                "query": request.query_string.decode("latin-1"),
+                "status": response.status_code,
+                "size": response.content_length,
+                "duration_ms": round((time.perf_counter() - started) * 1000,
+                                     3) if started is not None else None,
+                "remote_addr": request.remote_addr,
+            })
+    return response
 
 # defining tags
 home_tag = Tag(
@@ -23,27 +73,140 @@ data_tag = Tag(
     name="Data",
     description="Searching, Adding, Viewing and Removing Data to/from the Database"
     )
+monitoring_tag = Tag(
+    name="Monitoring",
+    description="Metrics of the API in the Prometheus format"
+    )
+job_tag = Tag(
+    name="Job",
+    description="Starting and Following Background Jobs over the Dataset"
+    )
 
 
-@app.get('/', tags=[home_tag])
-def home():
-    """Redirects to /openapi, where it allows the choice of documentation style.
+def remove_session(exception=None):
+    """Closes the session of the request, returning its connection to the
+    pool and releasing its identity map.
     """
-    return redirect('/openapi')
+    Session.remove()
 
 
-@app.post('/data', tags=[data_tag],
-          responses={
-              "200": DataViewSchema,
-              "409": ErrorSchema,
-              "400": ErrorSchema
-              })
-def add_data(form: DataSchema):
-    """Add a new Data to the database
+# read endpoints whose responses are cached until the catalog changes
+CACHED_ENDPOINTS = {"get_dataset", "get_data", "get_area", "get_bbox",
+                    "search_data", "search_text", "suggest_data"}
 
-    Returns a representation of the data.
+
+def view_name():
+    """Returns the name of the view of the request: its endpoint without
+    the name of the blueprint.
+    """
+    return (request.endpoint or "").rpartition(".")[2]
+
+
+def cache_key():
+    """Returns the key of the response of the request in the cache: the
+    path plus the query arguments in a canonical order.
+    """
+    return request.path + "?" + \
+        urlencode(sorted(request.args.items(multi=True)))
+
+
+@api.before_app_request
+def cached_response():
+    """Answers the cached read endpoints from the response cache, with a 304
+    when the client already holds the response (If-None-Match).
     """
-    data = Data(
+    if request.method != "GET" or view_name() not in CACHED_ENDPOINTS \
+            or "profiler" in g:
+        return None
+    # the version the response will be built from, see save_response: read
+    # from the database, since any worker may have changed the catalog
+    g.catalog_version = current_version(Session().connection())
+    entry = response_cache.get(cache_key(), g.catalog_version)
+    if entry is None:
+        return None
+    response = Response(entry["body"], status=entry["status"],
+                        mimetype=entry["mimetype"])
+    response.set_etag(entry["etag"])
+    g.from_cache = True
+    return response.make_conditional(request)
+
+
+@api.after_app_request
+def save_response(response):
+    """Adds a strong ETag to the responses of the cached read endpoints,
+    saves them in the response cache and turns them into a 304 when the
+    client already holds them.
+    """
+    if request.method != "GET" or view_name() not in CACHED_ENDPOINTS \
+            or g.get("from_cache") or response.is_streamed \
+            or "catalog_version" not in g \
+            or response.status_code not in (200, 404):
+        return response
+    response.add_etag()
+    etag, _ = response.get_etag()
+    response_cache.set(cache_key(), g.catalog_version,
+                       body=response.get_data(), status=response.status_code,
+                       mimetype=response.mimetype, etag=etag)
+    return response.make_conditional(request)
+
+
+def stream_query(session, chunks):
+    """Yields the chunks of a streamed response, closing the session once
+    they are written: the request teardown runs before the response body is
+    streamed, so the session used by the stream is closed here.
+    """
+    try:
+        yield from chunks
+    finally:
+        session.close()
+
+
+# rows fetched per round trip when streaming the dataset
+STREAM_CHUNK_SIZE = 500
+# records validated and inserted per transaction in a bulk import
+BULK_CHUNK_SIZE = 500
+
+
+# group commit of the check date updates and of the inserts of single data
+# (WRITE_COALESCING=1), None when each request commits its own write
+write_coalescer = make_write_coalescer(Session.session_factory)
+
+# in-memory snapshot of the catalog answering the reads by name, area and
+# format (REPLICA=1), None when every read goes to the database
+replica = make_replica(Session.session_factory)
+
+
+def replica_snapshot():
+    """Returns the snapshot of the read replica, brought up to the catalog
+    version the response cache read for the request (when it did), so the
+    writes of the other workers are seen at once.
+    """
+    return replica.snapshot(g.get("catalog_version"))
+
+
+def apply_write(write):
+    """Applies a small write: queued for the next group commit when the
+    write coalescer is on, otherwise in the session of the request. write
+    receives the session and returns the data written (or None when there
+    is nothing to write).
+
+    Returns the representation of the data written, or None.
+    """
+    if write_coalescer is not None:
+        return write_coalescer.submit(write, show_data).result()
+    session = Session()
+    data = write(session)
+    if data is None:
+        return None
+    session.commit()
+    response_cache.catalog_changed()
+    return show_data(data)
+
+
+def new_data(form: DataSchema):
+    """Creates a Data from the informed form
+    """
+    return Data(
         name=form.name,
         area=form.area,
         description=form.description,
@@ -62,53 +225,395 @@ def add_data(form: DataSchema):
         bounding_box=form.bounding_box
         )
 
-    logger.debug(f"Adding Data named: '{data.name}'")
-    try:
-        # creating a connection with the database
-        session = Session()
-        # adding data to the session
+
+# list endpoints answered by the fast path: column tuples encoded straight
+# to JSON, with no ORM object (FAST_JSON_ENDPOINTS="" turns it off)
+FAST_JSON_ENDPOINTS = set(os.environ.get(
+    "FAST_JSON_ENDPOINTS",
+    "get_dataset,get_area,get_bbox,search_data,get_due").split(","))
+
+
+def use_fast_json():
+    """Tells if the list of data of the request goes through the fast path.
+    It is only taken when the JSON provider writes what encode_dataset
+    writes (the default provider with sorted keys, compact and ASCII only).
+    """
+    provider = current_app.json
+    return view_name() in FAST_JSON_ENDPOINTS \
+        and type(provider) is DefaultJSONProvider \
+        and provider.sort_keys and provider.ensure_ascii \
+        and not (provider.compact is False or
+                 (provider.compact is None and current_app.debug))
+
+
+def dataset_response(dataset_query, limit=None):
+    """Runs a query of Data and returns the response with the list of data.
+    When limit is informed, the response tells where the next page starts.
+    """
+    if use_fast_json():
+        # pk_data goes last: it is not shown, only used for the next page
+        rows = dataset_query.with_entities(*dataset_columns(), Data.id).all()
+        logger.debug("%s data found", len(rows))
+        extra = {}
+        if limit:
+            # a full page means there may be more data after the last one
+            extra["next_after"] = rows[-1][-1] if len(rows) == limit \
+                else None
+        return Response(encode_dataset(rows, **extra),
+                        mimetype=current_app.json.mimetype)
+
+    dataset = dataset_query.all()
+    logger.debug("%s data found", len(dataset))
+    result = show_dataset(dataset)
+    if limit:
+        # a full page means there may be more data after the last one
+        full_page = len(dataset) == limit
+        result["next_after"] = dataset[-1].id if full_page else None
+    return result, 200
+
+
+def list_dataset(dataset_query, search: DatasetSearchSchema):
+    """Applies the keyset pagination (or the NDJSON streaming) asked in
+    search to a query of Data.
+
+    Returns the response for the list of data.
+    """
+    # pk_data is the cursor: each page is an indexed range scan on it
+    dataset_query = dataset_query.order_by(Data.id)
+    if search.after is not None:
+        dataset_query = dataset_query.filter(Data.id > search.after)
+    if search.limit:
+        dataset_query = dataset_query.limit(search.limit)
+
+    if search.stream:
+        # rows are fetched from the database cursor in chunks and written
+        # as they come, so memory stays flat whatever the catalog size
+        rows = dataset_query.yield_per(STREAM_CHUNK_SIZE)
+        return Response(
+            stream_with_context(stream_query(
+                dataset_query.session,
+                stream_dataset(rows, current_app.json.dumps,
+                               STREAM_CHUNK_SIZE))),
+            mimetype="application/x-ndjson")
+
+    return dataset_response(dataset_query, search.limit)
+
+
+def replica_response(rows, limit=None):
+    """Returns the response with a list of rows of the read replica.
+    When limit is informed, the response tells where the next page starts.
+    """
+    logger.debug("%s data found in the replica", len(rows))
+    extra = {}
+    if limit:
+        # a full page means there may be more data after the last one
+        extra["next_after"] = rows[-1].id if len(rows) == limit else None
+    if use_fast_json():
+        return Response(encode_dataset(map(dataset_values, rows), **extra),
+                        mimetype=current_app.json.mimetype)
+    return {**show_dataset(rows), **extra}, 200
+
+
+def list_replica(rows, search: DatasetSearchSchema):
+    """Applies the keyset pagination (or the NDJSON streaming) asked in
+    search to rows of the read replica, in id order.
+
+    Returns the response for the list of data.
+    """
+    rows = page(rows, search.after, search.limit)
+    if search.stream:
+        # the snapshot never changes, so it is streamed with no session
+        return Response(
+            stream_dataset(rows, current_app.json.dumps, STREAM_CHUNK_SIZE),
+            mimetype="application/x-ndjson")
+    return replica_response(rows, search.limit)
+
+
+@api.get('/', tags=[home_tag])
+def home():
+    """Redirects to /openapi, where it allows the choice of documentation style.
+    """
+    return redirect('/openapi')
+
+
+@api.get('/metrics', tags=[monitoring_tag])
+def get_metrics():
+    """Metrics of the API: requests, latencies, response sizes, SQL
+    statements and connection pool, in the Prometheus text format.
+
+    The metrics are kept by each worker process.
+    """
+    return Response(metrics.render(),
+                    mimetype="text/plain; version=0.0.4")
+
+
+@api.get('/replica/check', tags=[monitoring_tag],
+         responses={"200": ReplicaCheckSchema, "404": ErrorSchema})
+def check_replica():
+    """Check of the read replica of the catalog against the database
+
+    Compares the snapshot of the worker answering with the catalog in the
+    database, replacing it when they differ.
+    """
+    if replica is None:
+        return {"message": "The read replica is off (REPLICA=1)"}, 404
+    return replica.check(), 200
+
+
+@api.post('/data', tags=[data_tag],
+          responses={
+              "200": DataViewSchema,
+              "409": ErrorSchema,
+              "400": ErrorSchema
+              })
+def add_data(form: DataSchema):
+    """Add a new Data to the database
+
+    Returns a representation of the data.
+    """
+    data = new_data(form)
+
+    logger.debug("Adding Data named: '%s'", data.name)
+
+    def insert(session):
+        # adding data to the session, committed by apply_write
         session.add(data)
-        # effectively executing the command to add new data to the table
-        session.commit()
-        logger.debug(f"Added Data named: '{data.name}'")
-        return show_data(data), 200
+        return data
+
+    try:
+        result = apply_write(insert)
+        logger.debug("Added Data named: '%s'", data.name)
+        return result, 200
 
     except IntegrityError:
         # name duplicity is the likely reason for the IntegrityError
         error_msg = "Data has same name as one saved on the database :/"
-        logger.warning(f"Error to add data '{data.name}', {error_msg}")
+        logger.warning("Error to add data '%s', %s", data.name, error_msg)
         return {"message": error_msg}, 409
 
     except Exception:
         # in case of a error out of the expected
         error_msg = "It is not possible to save new data :/"
-        logger.warning(f"Error to add data '{data.name}', {error_msg}")
+        logger.warning("Error to add data '%s', %s", data.name, error_msg)
         return {"message": error_msg}, 400
 
 
-@app.get('/dataset', tags=[data_tag],
+def read_bulk_records():
+    """Yields the records of a bulk import, read from a JSON array or, when
+    the body is NDJSON, line by line from the request stream.
+
+    Each item is a (record, error message) pair.
+    """
+    if request.mimetype in ("application/x-ndjson", "application/jsonl"):
+        for line in request.stream:
+            if not line.strip():
+                continue
+            try:
+                yield json.loads(line), None
+            except ValueError:
+                yield None, "Invalid JSON line"
+    else:
+        records = request.get_json(silent=True)
+        if not isinstance(records, list):
+            raise ValueError("The body must be a JSON array or NDJSON")
+        for record in records:
+            yield record, None
+
+
+def import_chunk(session, chunk, results):
+    """Inserts a chunk of validated (row, form) records in one transaction,
+    appending the outcome of each record to results.
+    """
+    names = [form.name for _, form in chunk]
+    existing = {name for (name,) in
+                session.query(Data.name).filter(Data.name.in_(names))}
+    pending = []
+    for row, form in chunk:
+        if form.name in existing:
+            results.append({"row": row, "name": form.name,
+                            "status": "duplicate",
+                            "message": "Data has same name as one saved "
+                                       "on the database"})
+            continue
+        # a name repeated inside the request is a duplicate as well
+        existing.add(form.name)
+        pending.append((row, new_data(form)))
+
+    try:
+        # the whole chunk goes in batched INSERTs and a single commit
+        session.add_all([data for _, data in pending])
+        session.commit()
+        created = {row for row, _ in pending}
+    except IntegrityError:
+        # some name was saved concurrently: retry one by one, so only
+        # the offending records are rejected, still in one transaction
+        session.rollback()
+        begin_transaction(session)
+        created = set()
+        for row, data in pending:
+            try:
+                with session.begin_nested():
+                    session.add(data)
+                created.add(row)
+            except IntegrityError:
+                results.append({"row": row, "name": data.name,
+                                "status": "duplicate",
+                                "message": "Data has same name as one saved "
+                                           "on the database"})
+        session.commit()
+
+    for row, data in pending:
+        if row in created:
+            results.append({"row": row, "name": data.name,
+                            "status": "created", "message": None})
+
+
+@api.post('/dataset/bulk', tags=[data_tag],
+          responses={"200": BulkResultSchema, "400": ErrorSchema})
+def add_dataset():
+    """Add a list of Data to the database
+
+    The body is a JSON array of Data or a NDJSON stream with one Data per
+    line. Records are validated and inserted in chunks, each one in a single
+    transaction; an invalid or duplicated record doesn't stop the others.
+
+    Returns the outcome of each record: created, duplicate or invalid.
+    """
+    logger.debug("Adding a list of data")
+    # creating a connection with the database
+    session = Session()
+    results = []
+    chunk = []
+    try:
+        for row, (record, error) in enumerate(read_bulk_records()):
+            if error is None:
+                try:
+                    if not isinstance(record, dict):
+                        raise TypeError("The record must be a JSON object")
+                    chunk.append((row, DataSchema(**record)))
+                except (ValidationError, TypeError) as e:
+                    error = str(e)
+            if error is not None:
+                name = record.get("name") if isinstance(record, dict) \
+                    else None
+                results.append({"row": row, "name": name,
+                                "status": "invalid", "message": error})
+            if len(chunk) >= BULK_CHUNK_SIZE:
+                import_chunk(session, chunk, results)
+                chunk = []
+        if chunk:
+            import_chunk(session, chunk, results)
+
+    except ValueError as e:
+        error_msg = f"It is not possible to read the list of data: {e} :/"
+        logger.warning("Error to add a list of data, %s", error_msg)
+        return {"message": error_msg}, 400
+
+    response_cache.catalog_changed()
+    results.sort(key=lambda result: result["row"])
+    summary = {status: sum(1 for result in results
+                           if result["status"] == status)
+               for status in ("created", "duplicate", "invalid")}
+    logger.debug("Added a list of data: %s", summary)
+    return {**summary, "results": results}, 200
+
+
+@api.get('/dataset', tags=[data_tag],
          responses={"200": ListDatasetSchema, "404": ErrorSchema})
-def get_dataset():
+def get_dataset(query: DatasetSearchSchema):
     """Search all Dataset.
-    Returns a representation of the list of Data.
+    Returns a representation of the list of Data, a page of it when
+    limit/after are informed, or a NDJSON stream when stream is true.
     """
     logger.debug("Collecting data from the database.")
+    if replica is not None:
+        return list_replica(replica_snapshot().rows, query)
     # creating a connection with the database
     session = Session()
     # searching
-    dataset = session.query(Data).all()
+    return list_dataset(session.query(Data), query)
 
-    if not dataset:
-        # if there are no registered data
-        return {"Dataset": []}, 200
+
+@api.get('/dataset/changes', tags=[data_tag],
+         responses={"200": ChangesSchema})
+def get_changes(query: ChangesSearchSchema):
+    """Search the changes of the Dataset since a version
+    Returns the data inserted or updated and the data deleted after the
+    version since, in version order, so a client can sync the delta
+    instead of reading the whole catalog again.
+    """
+    logger.debug("Collecting the changes since version %s", query.since)
+    # creating a connection with the database
+    session = Session()
+    current = current_version(session.connection())
+    # both ranges are read off the version indexes, one row past the limit
+    # so a list filling the page on its own still tells there is more
+    changed = session.query(Data).filter(Data.version > query.since) \
+        .order_by(Data.version).limit(query.limit + 1).all()
+    deleted = session.execute(
+        data_tombstone.select()
+        .where(data_tombstone.c.version > query.since)
+        .order_by(data_tombstone.c.version).limit(query.limit + 1)).all()
+
+    # the first limit changes of both lists, merged in version order
+    versions = sorted([data.version for data in changed] +
+                      [row.version for row in deleted])
+    more = len(versions) > query.limit
+    if more:
+        version = versions[query.limit - 1]
+        changed = [data for data in changed if data.version <= version]
+        deleted = [row for row in deleted if row.version <= version]
     else:
-        logger.debug(f"{len(dataset)} data found")
-        # returns the representation of data
-        print(dataset)
-        return show_dataset(dataset), 200
+        # a change committed after the version was read may be included
+        version = max(versions[-1:] + [current])
+    return show_changes(changed, deleted, version, more), 200
+
+
+@api.get('/dataset/stats', tags=[data_tag],
+         responses={"200": StatsSchema})
+def get_stats():
+    """Statistics of the Dataset
+    Returns the number of data in total and by area, format, coordinate
+    system, permission and check status, read from summary tables kept up
+    to date on every write instead of counted over the whole catalog.
+    """
+    logger.debug("Collecting the statistics of the dataset")
+    # creating a connection with the database
+    session = Session()
+    return read_stats(session.connection()), 200
 
 
-@app.get('/data', tags=[data_tag],
+@api.get('/dataset/export', tags=[data_tag],
+         responses={"200": None, "501": ErrorSchema})
+def export_dataset(query: ExportSchema):
+    """Export all Dataset as CSV, GeoJSON or Parquet
+
+    The data are read from the database cursor and written in chunks (row
+    groups for Parquet), so memory stays flat whatever the catalog size.
+    In GeoJSON the bounding box of each data is its polygon geometry.
+    Parquet is only offered when the optional pyarrow is installed.
+    """
+    logger.debug("Exporting the dataset as %s", query.format)
+    if query.format == "parquet" and not PARQUET_EXPORT:
+        error_msg = "The Parquet export needs pyarrow installed :/"
+        logger.warning("Error exporting the dataset, %s", error_msg)
+        return {"message": error_msg}, 501
+
+    # creating a connection with the database
+    session = Session()
+    rows = session.query(Data).with_entities(*export_columns()) \
+        .order_by(Data.id).yield_per(STREAM_CHUNK_SIZE)
+    writers = {"csv": export_csv, "geojson": export_geojson,
+               "parquet": export_parquet}
+    return Response(
+        stream_with_context(stream_query(session,
+                                         writers[query.format](rows))),
+        mimetype=EXPORT_MIMETYPES[query.format],
+        headers={"Content-Disposition":
+                 f"attachment; filename=dataset.{query.format}"})
+
+
+@api.get('/data', tags=[data_tag],
          responses={"200": DataViewSchema, "404": ErrorSchema})
 def get_data(query: DataSearchSchema):
     """Search for a Data from the data name
@@ -116,25 +621,28 @@ def get_data(query: DataSearchSchema):
     Returns a representation of the Data.
     """
     data_name = query.name
-    logger.debug(f"Collecting data from the product: #{data_name}") 
+    logger.debug("Collecting data from the product: #%s", data_name) 
     
-    # creating a connection with the database
-    session = Session()
-    # searching
-    data = session.query(Data).filter(Data.name == data_name).first()
+    if replica is not None:
+        data = replica_snapshot().by_name.get(data_name)
+    else:
+        # creating a connection with the database
+        session = Session()
+        # searching
+        data = session.query(Data).filter(Data.name == data_name).first()
 
     if not data:
         # if the data was not found
         error_msg = "Data not found in the database :/"
-        logger.warning(f"Error searching for data '{data_name}', {error_msg}")
+        logger.warning("Error searching for data '%s', %s", data_name, error_msg)
         return {"message": error_msg}, 404
     else:
-        logger.debug(f"Data found: '{data.name}'")
+        logger.debug("Data found: '%s'", data.name)
         # returns the representation of data
         return show_data(data), 200
 
 
-@app.get('/area', tags=[data_tag],
+@api.get('/area', tags=[data_tag],
          responses={"200": ListDatasetSchema, "404": ErrorSchema})
 def get_area(query: AreaSearchSchema):
     """ Search for a Data from the data area
@@ -142,50 +650,236 @@ def get_area(query: AreaSearchSchema):
     Returns a representation of the Data
     """
     data_area = query.area
-    logger.debug(f"Collecting data from the area: #{data_area}")
+    logger.debug("Collecting data from the area: #%s", data_area)
+    if replica is not None:
+        rows = replica_snapshot().area(data_area, query.include)
+        if query.after is None and not query.stream and not rows:
+            error_msg = "Data not found in the database :/"
+            logger.warning("Error searching for data '%s', %s", data_area,
+                           error_msg)
+            return {"message": error_msg}, 404
+        return list_replica(rows, query)
     # creating a connection with the database
     session = Session()
     # searching
-    dataset = session.query(Data).filter(Data.area == data_area).all()
+    dataset_query = session.query(Data)
+    if query.include and data_area in AREAS:
+        # the areas above or below the area (and the area itself) come
+        # from the closure table, joined on the indexed area of the data
+        if query.include == "ancestors":
+            dataset_query = dataset_query.join(
+                AreaClosure, Data.area == AreaClosure.ancestor) \
+                .filter(AreaClosure.descendant == data_area)
+        else:
+            dataset_query = dataset_query.join(
+                AreaClosure, Data.area == AreaClosure.descendant) \
+                .filter(AreaClosure.ancestor == data_area)
+    else:
+        dataset_query = dataset_query.filter(Data.area == data_area)
 
-    if not dataset:
+    if query.after is None and not query.stream and \
+            dataset_query.first() is None:
         # if the data was not found
         error_msg = "Data not found in the database :/"
-        logger.warning(f"Error searching for data '{data_area}', {error_msg}")
+        logger.warning("Error searching for data '%s', %s", data_area, error_msg)
         return {"message": error_msg}, 404
     else:
-        logger.debug(f"{len(dataset)} data found")
         # returns the representation of data
-        return show_dataset(dataset), 200
+        return list_dataset(dataset_query, query)
+
+
+@api.get('/data/bbox', tags=[data_tag],
+         responses={"200": ListDatasetSchema, "400": ErrorSchema})
+def get_bbox(query: BoundingBoxSearchSchema):
+    """Search for the Data covering a map extent
+
+    Returns a representation of the list of Data whose bounding box
+    intersects, is within or contains the extent.
+    """
+    logger.debug("Collecting data %s the extent: %s %s; %s %s",
+                 query.relation, query.minx, query.miny, query.maxx,
+                 query.maxy)
+    if query.minx > query.maxx or query.miny > query.maxy:
+        error_msg = "The minimum coordinates must not exceed the maximum :/"
+        logger.warning("Error searching for extent, %s", error_msg)
+        return {"message": error_msg}, 400
+
+    # creating a connection with the database
+    session = Session()
+    # the R*Tree narrows the search to the boxes intersecting the extent,
+    # the exact relation is then checked on the data columns (the R*Tree
+    # stores rounded coordinates)
+    dataset_query = session.query(Data) \
+        .join(data_rtree, data_rtree.c.id == Data.id) \
+        .filter(data_rtree.c.min_lon <= query.maxx,
+                data_rtree.c.max_lon >= query.minx,
+                data_rtree.c.min_lat <= query.maxy,
+                data_rtree.c.max_lat >= query.miny)
+    if query.relation == "within":
+        dataset_query = dataset_query.filter(
+            Data.min_lon >= query.minx, Data.max_lon <= query.maxx,
+            Data.min_lat >= query.miny, Data.max_lat <= query.maxy)
+    elif query.relation == "contains":
+        dataset_query = dataset_query.filter(
+            Data.min_lon <= query.minx, Data.max_lon >= query.maxx,
+            Data.min_lat <= query.miny, Data.max_lat >= query.maxy)
+    else:
+        dataset_query = dataset_query.filter(
+            Data.min_lon <= query.maxx, Data.max_lon >= query.minx,
+            Data.min_lat <= query.maxy, Data.max_lat >= query.miny)
+    if query.limit:
+        dataset_query = dataset_query.limit(query.limit)
 
+    # returns the representation of data
+    return dataset_response(dataset_query)
 
-@app.patch('/data', tags=[data_tag],
+
+@api.get('/data/search', tags=[data_tag],
+         responses={"200": ListDatasetSchema})
+def search_data(query: DataFilterSchema):
+    """Search for the Data matching a combination of filters
+
+    Returns a representation of the list of Data, sorted and limited in the
+    database.
+    """
+    logger.debug("Collecting data filtered by: %s", query)
+    if replica is not None:
+        return replica_response(replica_snapshot().search(
+            **query.model_dump()))
+    # creating a connection with the database
+    session = Session()
+    # searching, every informed filter narrows the search
+    dataset_query = session.query(Data)
+    for field in ("area", "format", "coordinate_system", "permitted",
+                  "creator"):
+        value = getattr(query, field)
+        if value is not None:
+            dataset_query = dataset_query.filter(
+                getattr(Data, field) == value)
+    if query.check_date_from is not None:
+        dataset_query = dataset_query.filter(
+            Data.check_date >= query.check_date_from)
+    if query.check_date_to is not None:
+        dataset_query = dataset_query.filter(
+            Data.check_date <= query.check_date_to)
+
+    sort_column = getattr(Data, query.sort)
+    if query.order == "desc":
+        dataset_query = dataset_query.order_by(sort_column.desc(),
+                                               Data.id.desc())
+    else:
+        dataset_query = dataset_query.order_by(sort_column, Data.id)
+    # returns the representation of data
+    return dataset_response(dataset_query.limit(query.limit))
+
+
+@api.get('/data/text', tags=[data_tag],
+         responses={"200": ListTextResultSchema, "400": ErrorSchema})
+def search_text(query: TextSearchSchema):
+    """Search for the Data by words of the name, description, info or source
+
+    Returns a representation of the list of Data found, the most relevant
+    first, with the matching excerpt of each one.
+    """
+    logger.debug("Collecting data with the words: '%s'", query.q)
+    match = match_expression(query.q)
+    if match is None:
+        error_msg = "Inform at least one word to search :/"
+        logger.warning("Error searching for '%s', %s", query.q, error_msg)
+        return {"message": error_msg}, 400
+
+    # creating a connection with the database
+    session = Session()
+    # the full-text index gives the ids, ranks and snippets in order
+    hits = session.execute(TEXT_SEARCH_SQL,
+                           {"match": match, "limit": query.limit}).all()
+    dataset = {data.id: data for data in
+               session.query(Data).filter(
+                   Data.id.in_([hit.rowid for hit in hits]))}
+    result = []
+    for hit in hits:
+        if hit.rowid in dataset:
+            result.append({**show_dataset_item(dataset[hit.rowid]),
+                           "snippet": hit.snippet, "rank": hit.rank})
+    logger.debug("%s data found", len(result))
+    # returns the representation of data
+    return {"dataset": result}, 200
+
+
+@api.get('/data/suggest', tags=[data_tag],
+         responses={"200": ListSuggestionSchema, "400": ErrorSchema})
+def suggest_data(query: SuggestSearchSchema):
+    """Search for the names of Data similar to a name
+
+    Returns the names closest to a misspelled or incomplete name, the most
+    similar first, to be used in the searches by the exact name.
+    """
+    logger.debug("Collecting names similar to: '%s'", query.q)
+    if not query.q.strip():
+        error_msg = "Inform a name to search :/"
+        logger.warning("Error searching for '%s', %s", query.q, error_msg)
+        return {"message": error_msg}, 400
+
+    # creating a connection with the database
+    session = Session()
+    # the candidates come from the trigram index, scored on their names
+    suggestions = suggest_names(session.connection(), query.q.strip(),
+                                query.limit, query.min_similarity)
+    logger.debug("%s similar names found", len(suggestions))
+    return {"suggestions": [
+        {"id": data_id, "name": name, "area": area, "similarity": score}
+        for data_id, name, area, score in suggestions]}, 200
+
+
+@api.get('/data/due', tags=[data_tag],
+         responses={"200": ListDatasetSchema})
+def get_due(query: DueSearchSchema):
+    """Search for the Data due for a check
+
+    Returns a representation of the list of Data whose next check date is
+    before the informed date (or now), the most overdue first.
+    """
+    before = query.before or datetime.now()
+    logger.debug("Collecting data due for a check before: %s", before)
+    # creating a connection with the database
+    session = Session()
+    # the queue is read in order straight off the next_check_date index
+    dataset_query = session.query(Data) \
+        .filter(Data.next_check_date <= before) \
+        .order_by(Data.next_check_date, Data.id) \
+        .limit(query.limit)
+    # returns the representation of data
+    return dataset_response(dataset_query)
+
+
+@api.patch('/data', tags=[data_tag],
            responses={"200": DataViewSchema, "404": ErrorSchema})
 def patch_data(query: DataSearchSchema):
     """Update the check date, with the current date, of a specified Data by its name
     """
     data_name = query.name
-    logger.debug(f"Collecting data from the product: #{data_name}")
-    # creating a connection with the database
-    session = Session()
-    # searching
-    data = session.query(Data).filter(Data.name == data_name).first()
+    logger.debug("Collecting data from the product: #%s", data_name)
 
-    if not data:
+    def check(session):
+        # searching
+        data = session.query(Data).filter(Data.name == data_name).first()
+        if data:
+            data.check_date = datetime.now()
+        return data
+
+    result = apply_write(check)
+    if result is None:
         # if the data was not found
         error_msg = "Data not found in the database :/"
-        logger.warning(f"Error searching for data '{data_name}', {error_msg}")
+        logger.warning("Error searching for data '%s', %s", data_name, error_msg)
         return {"message": error_msg}, 404
     else:
-        logger.debug(f"Data found: '{data.name}'")
-        data.check_date = datetime.now()
-        session.commit()
-        logger.debug(f"Data changed: '{data.name}'")
+        logger.debug("Data changed: '%s'", data_name)
         # returns the representation of data
-        return show_data(data), 200
+        return result, 200
 
 
-@app.put('/data', tags=[data_tag],
+@api.put('/data', tags=[data_tag],
          responses={"200": DataViewSchema, "404": ErrorSchema})
 def update_data(query: DataSearchSchema, form: DataSchema):
     """Update a Data from the informed name of the data
@@ -193,9 +887,7 @@ def update_data(query: DataSearchSchema, form: DataSchema):
     Returns a representation of the updated data.
     """
     data_name = query.name
-    # debug
-    print(data_name)
-    logger.debug(f"Collecting data from the product: #{data_name}")
+    logger.debug("Collecting data from the product: #%s", data_name)
     # creating a connection with the database
     session = Session()
     # searching
@@ -204,10 +896,10 @@ def update_data(query: DataSearchSchema, form: DataSchema):
     if not data:
         # if the data was not found
         error_msg = "Data not found in the database :/"
-        logger.warning(f"Error searching for data '{data_name}', {error_msg}")
+        logger.warning("Error searching for data '%s', %s", data_name, error_msg)
         return {"message": error_msg}, 404
     else:
-        logger.debug(f"Data found: '{data.name}'")
+        logger.debug("Data found: '%s'", data.name)
         try:
             # updating the data
             data.name = form.name
@@ -231,24 +923,25 @@ def update_data(query: DataSearchSchema, form: DataSchema):
             # effectively executing the command to update the data in the table
             # and committing the changes to the database
             session.commit()
-            logger.debug(f"Dado atualizado: '{data.name}'")
+            response_cache.catalog_changed()
+            logger.debug("Dado atualizado: '%s'", data.name)
             # returns the representation of data
             return show_data(data), 200
 
         except IntegrityError:
             # name duplicity is the likely reason for the IntegrityError
             error_msg = "Data has same name as one saved on the database :/"
-            logger.warning(f"Error to add data '{data.name}', {error_msg}")
+            logger.warning("Error to add data '%s', %s", data.name, error_msg)
             return {"message": error_msg}, 409
 
         except Exception:
             # in case of a error out of the expected
             error_msg = "It is not possible to save new data :/"
-            logger.warning(f"Error to add data '{data.name}', {error_msg}")
+            logger.warning("Error to add data '%s', %s", data.name, error_msg)
             return {"message": error_msg}, 400
 
 
-@app.delete('/data', tags=[data_tag],
+@api.delete('/data', tags=[data_tag],
             responses={"200": DataDelSchema, "404": ErrorSchema})
 def del_data(query: DataSearchSchema):
     """Delete a Data from the informed name of the data
@@ -256,7 +949,7 @@ def del_data(query: DataSearchSchema):
     Returns a confirmation message of the removal.
     """
     data_name = unquote(unquote(query.name))
-    logger.debug(f"Deleting data about product #{data_name}")
+    logger.debug("Deleting data about product #%s", data_name)
     # creating a connection with the database
     session = Session()
     # deleting
@@ -264,11 +957,278 @@ def del_data(query: DataSearchSchema):
     session.commit()
 
     if count:
+        response_cache.catalog_changed()
         # returns the representation of the confirmation message
-        logger.debug(f"Deleted data #{data_name}")
+        logger.debug("Deleted data #%s", data_name)
         return {"message": "Data removed", "name": data_name}
     else:
         # if the data was not found
         error_msg = "Data not found in the database :/"
-        logger.warning(f"Error searching for data '{data_name}', {error_msg}")
+        logger.warning("Error searching for data '%s', %s", data_name, error_msg)
+        return {"message": error_msg}, 404
+
+
+def batch_criteria(body: BatchSchema):
+    """Returns the filter selecting the data of a batch operation: the data
+    named, every data of the area, or the data named of the area when both
+    are informed. Returns None when the batch names no data.
+    """
+    criteria = []
+    if body.names:
+        criteria.append(Data.name.in_(body.names))
+    if body.area is not None:
+        criteria.append(Data.area == body.area)
+    return and_(*criteria) if criteria else None
+
+
+def batch_results(body: BatchSchema, names, status: str):
+    """Returns the outcome of each data of a batch operation, given the
+    names of the data it reached: the names informed out of them (or out
+    of the area) are not_found.
+    """
+    reached = set(names)
+    results = [{"name": name, "status": status} for name in sorted(reached)]
+    if body.names:
+        results += [{"name": name, "status": "not_found"}
+                    for name in dict.fromkeys(body.names)
+                    if name not in reached]
+    return {"count": len(reached), "results": results}
+
+
+@api.patch('/dataset/check', tags=[data_tag],
+           responses={"200": BatchResultSchema, "400": ErrorSchema})
+def check_dataset(body: BatchSchema):
+    """Update the check date, with the current date, of a list of Data by
+    their names, of every Data of an area, or of the Data of the list in
+    the area when both are informed
+
+    It runs as a single UPDATE in one transaction. Returns the outcome for
+    each name.
+    """
+    criteria = batch_criteria(body)
+    if criteria is None:
+        error_msg = "Inform the names or the area of the data :/"
+        logger.warning("Error checking a list of data, %s", error_msg)
+        return {"message": error_msg}, 400
+
+    logger.debug("Checking a list of data: %s", body)
+    now = datetime.now()
+    # creating a connection with the database
+    session = Session()
+    names = session.execute(
+        update(Data).where(criteria)
+        .values(check_date=now,
+                next_check_date=next_check_date_expression(now))
+        .returning(Data.name)).scalars().all()
+    session.commit()
+    if names:
+        response_cache.catalog_changed()
+    logger.debug("%s data checked", len(names))
+    return batch_results(body, names, "checked"), 200
+
+
+@api.delete('/dataset', tags=[data_tag],
+            responses={"200": BatchResultSchema, "400": ErrorSchema})
+def del_dataset(body: BatchSchema):
+    """Delete a list of Data by their names, every Data of an area, or the
+    Data of the list in the area when both are informed
+
+    It runs as a single DELETE in one transaction. Returns the outcome for
+    each name.
+    """
+    criteria = batch_criteria(body)
+    if criteria is None:
+        error_msg = "Inform the names or the area of the data :/"
+        logger.warning("Error deleting a list of data, %s", error_msg)
+        return {"message": error_msg}, 400
+
+    logger.debug("Deleting a list of data: %s", body)
+    # creating a connection with the database
+    session = Session()
+    names = session.execute(
+        delete(Data).where(criteria).returning(Data.name)).scalars().all()
+    session.commit()
+    if names:
+        response_cache.catalog_changed()
+    logger.debug("%s data removed", len(names))
+    return batch_results(body, names, "removed"), 200
+
+
+@api.post('/dataset/wfs', tags=[job_tag],
+          responses={"202": JobViewSchema})
+def resolve_wfs(query: WFSResolveSchema):
+    """Start fetching the bounding box of the WFS Data from their services
+
+    Returns a representation of the background job.
+    """
+    logger.debug("Starting to resolve the WFS bounding boxes")
+    job = start_job("resolve-wfs", WFSResolver(Session).run,
+                    only_missing=query.only_missing)
+    return show_job(job), 202
+
+
+@api.post('/dataset/extents', tags=[job_tag],
+          responses={"202": JobViewSchema})
+def normalize_extents(query: ExtentsNormalizeSchema):
+    """Start normalizing the bounding boxes of the Dataset to WGS84
+
+    Returns a representation of the background job.
+    """
+    logger.debug("Starting to normalize the extents")
+    job = start_job("normalize-extents", ExtentNormalizer(Session).run,
+                    only_missing=query.only_missing)
+    return show_job(job), 202
+
+
+@api.post('/dataset/links', tags=[job_tag],
+          responses={"202": JobViewSchema})
+def check_links(query: LinkCheckSchema):
+    """Start probing the links of the Dataset
+
+    Returns a representation of the background job.
+    """
+    logger.debug("Starting to check the links")
+    job = start_job("check-links", LinkChecker(Session).run,
+                    only_due=query.only_due)
+    return show_job(job), 202
+
+
+@api.get('/jobs/<int:job_id>', tags=[job_tag],
+         responses={"200": JobViewSchema, "404": ErrorSchema})
+def get_job_status(path: JobPathSchema):
+    """Search for a background job from its id
+
+    Returns a representation of the job.
+    """
+    job = get_job(path.job_id)
+    if job is None:
+        error_msg = "Job not found :/"
+        logger.warning("Error searching for job #%s, %s", path.job_id, error_msg)
         return {"message": error_msg}, 404
+    return show_job(job), 200
+
+
+@api.cli.command("resolve-wfs")
+@click.option("--only-missing", is_flag=True,
+              help="Only the WFS data without a bounding box.")
+@click.option("--workers", default=8, help="Services fetched at once.")
+@click.option("--per-host", default=2, help="Services of a host at once.")
+@click.option("--timeout", default=10.0, help="Seconds per service.")
+def resolve_wfs_command(only_missing, workers, per_host, timeout):
+    """Fetch the bounding box of the WFS data from their services."""
+    init_db()
+    resolver = WFSResolver(Session, max_workers=workers,
+                           max_per_host=per_host, timeout=timeout)
+    summary = resolver.run(only_missing=only_missing)
+    Session.remove()
+    click.echo(json.dumps(summary, indent=2))
+
+
+@api.cli.command("check-links")
+@click.option("--only-due", is_flag=True,
+              help="Only the data due for a check.")
+@click.option("--workers", default=16, help="Links probed at once.")
+@click.option("--per-host", default=4, help="Links of a host at once.")
+@click.option("--timeout", default=10.0, help="Seconds per web link.")
+@click.option("--root", default=None,
+              help="Mount point of the share of the file links.")
+def check_links_command(only_due, workers, per_host, timeout, root):
+    """Probe the links of the data and save their status."""
+    init_db()
+    checker = LinkChecker(Session, max_workers=workers,
+                          max_per_host=per_host, timeout=timeout, root=root)
+    summary = checker.run(only_due=only_due)
+    Session.remove()
+    click.echo(json.dumps(summary, indent=2))
+
+
+@api.cli.command("normalize-extents")
+@click.option("--only-missing", is_flag=True,
+              help="Only the data without an extent yet.")
+@click.option("--chunk", default=5000, help="Data reprojected per commit.")
+def normalize_extents_command(only_missing, chunk):
+    """Normalize the bounding boxes of the data to WGS84."""
+    init_db()
+    summary = ExtentNormalizer(Session, chunk_size=chunk) \
+        .run(only_missing=only_missing)
+    Session.remove()
+    click.echo(json.dumps(summary, indent=2))
+
+
+@api.cli.command("rebuild-stats")
+def rebuild_stats_command():
+    """Count the data again into the summary tables of the statistics."""
+    init_db()
+    session = Session()
+    rebuild_stats(session.connection())
+    session.commit()
+    click.echo(json.dumps(read_stats(session.connection()), indent=2))
+    Session.remove()
+
+
+@api.cli.command("check-fast-json")
+@click.option("--chunk", default=1000, help="Data compared at a time.")
+def check_fast_json_command(chunk):
+    """Compare the fast path of the lists of data with the ORM one."""
+    init_db()
+    session = Session()
+    after, checked, mismatches = 0, 0, 0
+    while True:
+        dataset_query = session.query(Data).filter(Data.id > after) \
+            .order_by(Data.id).limit(chunk)
+        dataset = dataset_query.all()
+        if not dataset:
+            break
+        expected = current_app.json.response(show_dataset(dataset)).get_data(
+            as_text=True)
+        fast = encode_dataset(
+            dataset_query.with_entities(*dataset_columns()).all())
+        if fast != expected:
+            mismatches += 1
+            click.echo(f"Mismatch in the data after #{after}")
+        checked += len(dataset)
+        after = dataset[-1].id
+        session.expunge_all()
+    Session.remove()
+    click.echo(f"{checked} data checked, {mismatches} chunks mismatching")
+
+
+def create_app(config: dict = None) -> OpenAPI:
+    """Creates the app of the API
+
+    Arguments:
+        config {dict} -- settings of the app. DATABASE_URL, DB_POOL_SIZE,
+            DB_MAX_OVERFLOW and DB_POOL_TIMEOUT configure the database
+            (read from the environment variables of the same name when
+            missing). There is one engine per process, so the last app
+            created sets it. PROFILING turns on the profiling of the
+            requests that ask for it (only with PROFILING_TOKEN as the
+            value, when set) and SLOW_QUERY_MS is the threshold of the
+            slow-query log (read from the environment when missing too).
+
+    The database is only touched by the first request (or command), which
+    creates or upgrades the schema once per process.
+    """
+    app = OpenAPI(__name__, info=info)
+    app.config.from_mapping(DATABASE_URL=None, DB_POOL_SIZE=None,
+                            DB_MAX_OVERFLOW=None, DB_POOL_TIMEOUT=None,
+                            PROFILING=None, PROFILING_TOKEN=None,
+                            SLOW_QUERY_MS=None)
+    if config:
+        app.config.update(config)
+    engine = configure_engine(app.config["DATABASE_URL"],
+                              pool_size=app.config["DB_POOL_SIZE"],
+                              max_overflow=app.config["DB_MAX_OVERFLOW"],
+                              pool_timeout=app.config["DB_POOL_TIMEOUT"])
+    CORS(app)
+    # creating the schema, if needed, before anything reads the database
+    app.before_request(init_db)
+    # measuring the requests and the SQL statements
+    metrics.instrument_app(app)
+    metrics.instrument_engine(engine)
+    # profiling the requests that ask for it, logging the slow queries
+    profiling.instrument_app(app)
+    profiling.instrument_engine(engine, app.config["SLOW_QUERY_MS"])
+    app.teardown_appcontext(remove_session)
+    app.register_api(api)
+    return app
@@ -0,0 +1,376 @@
+"""Benchmark and load test of the DataControl API endpoints.
+
+Seeds a synthetic catalog of the informed size in a temporary SQLite
+database, drives every endpoint through the Flask test client (client mode)
+and/or a threaded HTTP server hit by concurrent clients (http mode), and
+writes the throughput and the p50/p95/p99 latencies to a JSON report.
+
+    python benchmarks/bench_api.py --rows 10000 --requests 200
+    python benchmarks/bench_api.py --rows 500000 --mode http --concurrency 16
+    python benchmarks/bench_api.py --compare bench_before.json
+
+Runs from the root of the repository.
+"""
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from urllib.parse import urlencode
+from urllib.request import Request, urlopen
+from urllib.error import HTTPError
+import argparse
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+
+AREAS = ["All Ireland", "ROI - All", "Carlow", "Cavan", "Clare", "Cork",
+         "Donegal", "Dublin", "Galway", "Kerry", "Kildare", "Kilkenny",
+         "Laois", "Leitrim", "Limerick", "Longford", "Louth", "Mayo",
+         "Meath", "Monaghan", "Offaly", "Roscommon", "Sligo", "Tipperary",
+         "Waterford", "Westmeath", "Wexford", "Wicklow", "UK - All",
+         "England", "Scotland", "Wales", "Northern Ireland"]
+FORMATS = ["SHP", "GDB", "CSV", "WFS", "WMS"]
+COORDINATE_SYSTEMS = ["ITM", "BNG", "WGS84"]
+FREQUENCIES = [7, 14, 30, 90, 180, 365, None]
+THEMES = ["Flood Zone", "Townlands", "Road Strategy", "Nature Reserves",
+          "Wind Farms", "Protected Structures", "Conservation Areas",
+          "Water Bodies", "Land Use", "Electoral Divisions"]
+SOURCES = ["OSi", "Tailte Eireann", "EPA", "NPWS", "OSNI", "Environment Agency",
+           "County Council", "SEAI"]
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=10000,
+                        help="size of the synthetic catalog")
+    parser.add_argument("--requests", type=int, default=200,
+                        help="requests sent to each endpoint")
+    parser.add_argument("--concurrency", type=int, default=8,
+                        help="concurrent clients in http mode")
+    parser.add_argument("--mode", choices=["client", "http", "both"],
+                        default="client")
+    parser.add_argument("--cache", action="store_true",
+                        help="keep the response cache on (off by default, "
+                             "to measure the database path)")
+    parser.add_argument("--full-dataset", action="store_true",
+                        help="also benchmark the unpaged GET /dataset")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--database", default=None,
+                        help="SQLite file (a temporary one by default)")
+    parser.add_argument("--output", default="bench_output.json")
+    parser.add_argument("--compare", default=None,
+                        help="previous report to compare the results with")
+    return parser.parse_args()
+
+
+def synthetic_rows(count: int, rng: random.Random):
+    """Yields the columns of count synthetic data, with the derived columns
+    filled the way the model fills them on write.
+    """
+    from model.crs import normalize_extents, EXTENT_COLUMNS
+
+    now = datetime.now()
+    for index in range(count):
+        # the name can be rebuilt from the index, see scenarios
+        theme = THEMES[index % len(THEMES)]
+        area = rng.choice(AREAS)
+        min_lat = rng.uniform(51.4, 55.3)
+        min_lon = rng.uniform(-10.6, -6.0)
+        bounding_box = f"{min_lat} {min_lon}; " \
+                       f"{min_lat + rng.uniform(0.01, 1.5)} " \
+                       f"{min_lon + rng.uniform(0.01, 1.5)}"
+        coordinate_system = rng.choice(COORDINATE_SYSTEMS)
+        extent = normalize_extents([(None, coordinate_system,
+                                     bounding_box)])[0]
+        frequency = rng.choice(FREQUENCIES)
+        check_date = now - timedelta(minutes=rng.randint(0, 60 * 24 * 365))
+        source = rng.choice(SOURCES)
+        yield {
+            "name": f"{theme} {index}",
+            "area": area,
+            "description": f"{theme} of {area} published by {source}",
+            "source": source,
+            "creator": source,
+            "permitted": rng.random() < 0.9,
+            "copyright": "Creative Commons Attribution 4.0",
+            "link": f"\\\\Dataset\\{area}\\{theme}\\{index}",
+            "info": rng.choice(["None", "Updated yearly", "Draft"]),
+            "coordinate_system": coordinate_system,
+            "creation_date": "01/01/2019",
+            "update_date": "01/01/2020",
+            "format": rng.choice(FORMATS),
+            "check_date": check_date,
+            "update_frequency_days": frequency,
+            "next_check_date": check_date + timedelta(days=frequency)
+            if frequency is not None else None,
+            "bounding_box": bounding_box,
+            **{column: extent[column] for column in EXTENT_COLUMNS},
+        }
+
+
+def seed(rows: int, rng: random.Random, chunk_size: int = 5000):
+    """Fills the benchmark database with rows synthetic data, in chunked
+    executemany inserts (the indexes are kept by the table triggers).
+    """
+    from sqlalchemy import insert
+    from model import engine, Data
+
+    started = time.perf_counter()
+    chunk = []
+    with engine.begin() as connection:
+        for row in synthetic_rows(rows, rng):
+            chunk.append(row)
+            if len(chunk) >= chunk_size:
+                connection.execute(insert(Data), chunk)
+                chunk = []
+        if chunk:
+            connection.execute(insert(Data), chunk)
+    return time.perf_counter() - started
+
+
+def form(name: str, rng: random.Random):
+    """Returns the form of a new data, as sent by the frontend."""
+    return {
+        "name": name, "area": rng.choice(AREAS), "description": "Benchmark",
+        "source": "Benchmark", "creator": "Benchmark", "permitted": "true",
+        "copyright": "", "link": "\\\\Dataset\\Benchmark", "info": "None",
+        "coordinate_system": "ITM", "creation_date": "01/01/2019",
+        "update_date": "01/01/2019", "format": "SHP",
+        "update_frequency_days": "90",
+        "bounding_box": "52.1 -8.5; 52.4 -8.1",
+    }
+
+
+def scenarios(rows: int, rng: random.Random, full_dataset: bool):
+    """Returns the benchmarked requests: for each endpoint, a function
+    building the (method, path, query, form) of the i-th request.
+    """
+    def name(i):
+        # an existing data, as named by synthetic_rows
+        index = rng.randrange(rows)
+        return f"{THEMES[index % len(THEMES)]} {index}"
+
+    def typo(i):
+        # an existing name with one letter dropped
+        misspelled = name(i)
+        index = rng.randrange(len(misspelled))
+        return misspelled[:index] + misspelled[index + 1:]
+
+    def extent(i):
+        lat, lon = rng.uniform(51.4, 55.3), rng.uniform(-10.6, -6.0)
+        return {"minx": lon, "miny": lat, "maxx": lon + 0.2,
+                "maxy": lat + 0.2}
+
+    result = {
+        "GET /dataset?limit=100": lambda i: (
+            "GET", "/dataset",
+            {"limit": 100, "after": rng.randrange(max(rows - 100, 1))}, None),
+        "GET /data": lambda i: ("GET", "/data", {"name": name(i)}, None),
+        "GET /area?limit=100": lambda i: (
+            "GET", "/area", {"area": rng.choice(AREAS), "limit": 100}, None),
+        "GET /data/bbox": lambda i: ("GET", "/data/bbox",
+                                     {**extent(i), "limit": 100}, None),
+        "GET /data/search": lambda i: (
+            "GET", "/data/search",
+            {"area": rng.choice(AREAS), "format": rng.choice(FORMATS),
+             "sort": "check_date", "limit": 100}, None),
+        "GET /data/text": lambda i: (
+            "GET", "/data/text",
+            {"q": rng.choice(THEMES).split()[0], "limit": 20}, None),
+        "GET /data/suggest": lambda i: (
+            "GET", "/data/suggest", {"q": typo(i), "limit": 5}, None),
+        "GET /data/due": lambda i: ("GET", "/data/due", {"limit": 100},
+                                    None),
+        "POST /data": lambda i: ("POST", "/data", None,
+                                 form(f"Benchmark {i}", rng)),
+        "PUT /data": lambda i: ("PUT", "/data", {"name": f"Benchmark {i}"},
+                                form(f"Benchmark {i}", rng)),
+        "PATCH /data": lambda i: ("PATCH", "/data", {"name": name(i)}, None),
+        "DELETE /data": lambda i: ("DELETE", "/data",
+                                   {"name": f"Benchmark {i}"}, None),
+    }
+    if full_dataset:
+        result = {"GET /dataset": lambda i: ("GET", "/dataset", None, None),
+                  **result}
+    return result
+
+
+def percentile(values, fraction: float) -> float:
+    """Nearest-rank percentile of sorted values."""
+    if not values:
+        return 0.0
+    rank = max(int(round(fraction * len(values) + 0.5)) - 1, 0)
+    return values[min(rank, len(values) - 1)]
+
+
+def summarize(latencies, errors: int, elapsed: float):
+    """Returns the statistics of the latencies (seconds) of one endpoint."""
+    values = sorted(latencies)
+    return {
+        "requests": len(values),
+        "errors": errors,
+        "throughput_rps": round(len(values) / elapsed, 2) if elapsed else 0,
+        "mean_ms": round(sum(values) / len(values) * 1000, 3)
+        if values else 0,
+        "p50_ms": round(percentile(values, 0.50) * 1000, 3),
+        "p95_ms": round(percentile(values, 0.95) * 1000, 3),
+        "p99_ms": round(percentile(values, 0.99) * 1000, 3),
+        "max_ms": round(values[-1] * 1000, 3) if values else 0,
+    }
+
+
+def run_client(app, plan, requests: int):
+    """Sends the requests of each endpoint, one after the other, through
+    the Flask test client.
+    """
+    client = app.test_client()
+    results = {}
+    for label, build in plan.items():
+        latencies, errors = [], 0
+        started = time.perf_counter()
+        for i in range(requests):
+            method, path, query, data = build(i)
+            begin = time.perf_counter()
+            response = client.open(path, method=method, query_string=query,
+                                   data=data)
+            response.get_data()
+            latencies.append(time.perf_counter() - begin)
+            if response.status_code >= 500:
+                errors += 1
+        results[label] = summarize(latencies, errors,
+                                   time.perf_counter() - started)
+        print(f"  {label:<24} {results[label]['throughput_rps']:>10} req/s "
+              f"p95 {results[label]['p95_ms']} ms", flush=True)
+    return results
+
+
+def run_http(app, plan, requests: int, concurrency: int):
+    """Sends the requests of each endpoint from concurrency clients to the
+    API served by a threaded HTTP server.
+    """
+    from werkzeug.serving import make_server
+
+    server = make_server("127.0.0.1", 0, app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base = f"http://127.0.0.1:{server.server_port}"
+
+    def send(request):
+        method, path, query, data = request
+        url = base + path + ("?" + urlencode(query) if query else "")
+        body = urlencode(data).encode() if data else None
+        begin = time.perf_counter()
+        try:
+            with urlopen(Request(url, data=body, method=method),
+                         timeout=60) as response:
+                response.read()
+                status = response.status
+        except HTTPError as e:
+            e.read()
+            status = e.code
+        return time.perf_counter() - begin, status
+
+    results = {}
+    try:
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            for label, build in plan.items():
+                batch = [build(i) for i in range(requests)]
+                started = time.perf_counter()
+                outcomes = list(executor.map(send, batch))
+                elapsed = time.perf_counter() - started
+                results[label] = summarize(
+                    [latency for latency, _ in outcomes],
+                    sum(1 for _, status in outcomes if status >= 500),
+                    elapsed)
+                print(f"  {label:<24} "
+                      f"{results[label]['throughput_rps']:>10} req/s "
+                      f"p95 {results[label]['p95_ms']} ms", flush=True)
+    finally:
+        server.shutdown()
+    return results
+
+
+def compare(report, previous_path: str):
+    """Prints the change of throughput and p95 against a previous report."""
+    with open(previous_path) as file:
+        previous = json.load(file)
+    print(f"\nCompared with {previous_path} "
+          f"({previous['meta'].get('commit')}):")
+    for mode, results in report["results"].items():
+        for label, stats in results.items():
+            before = previous.get("results", {}).get(mode, {}).get(label)
+            if not before or not before["throughput_rps"]:
+                continue
+            throughput = stats["throughput_rps"] / before["throughput_rps"]
+            print(f"  {mode:<6} {label:<24} throughput x{throughput:.2f}  "
+                  f"p95 {before['p95_ms']} -> {stats['p95_ms']} ms")
+
+
+def main():
+    args = parse_args()
+    sys.path.insert(0, os.path.dirname(os.path.dirname(
+        os.path.abspath(__file__))))
+    database = args.database or os.path.join(
+        tempfile.mkdtemp(prefix="datacontrol-bench-"), "bench.sqlite3")
+    # the response cache reads its configuration on import
+    if not args.cache:
+        os.environ["CACHE_MAX_ENTRIES"] = "0"
+
+    import logging
+    from app import create_app
+    from model import init_db
+    app = create_app({"DATABASE_URL": f"sqlite:///{database}"})
+    init_db()
+    # the 404s of random lookups and the access log would flood the output
+    logging.getLogger().setLevel(logging.ERROR)
+    logging.getLogger("werkzeug").setLevel(logging.ERROR)
+
+    rng = random.Random(args.seed)
+    print(f"Seeding {args.rows} data in {database}", flush=True)
+    seed_seconds = seed(args.rows, rng)
+    print(f"Seeded in {seed_seconds:.1f}s", flush=True)
+
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"],
+                                capture_output=True, text=True).stdout.strip()
+    except OSError:
+        commit = None
+    report = {
+        "meta": {
+            "commit": commit,
+            "timestamp": datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "rows": args.rows,
+            "requests": args.requests,
+            "concurrency": args.concurrency,
+            "cache": args.cache,
+            "seed_seconds": round(seed_seconds, 3),
+        },
+        "results": {},
+    }
+    modes = ["client", "http"] if args.mode == "both" else [args.mode]
+    for mode in modes:
+        print(f"\n{mode} mode:", flush=True)
+        # every mode gets the same requests
+        plan = scenarios(args.rows, random.Random(args.seed),
+                         args.full_dataset)
+        if mode == "client":
+            report["results"][mode] = run_client(app, plan, args.requests)
+        else:
+            report["results"][mode] = run_http(app, plan, args.requests,
+                                               args.concurrency)
+
+    with open(args.output, "w") as file:
+        json.dump(report, file, indent=2)
+    print(f"\nReport written to {args.output}")
+    if args.compare:
+        compare(report, args.compare)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+from collections import OrderedDict
+from threading import Lock
+import os
+import time
+
+
+class ResponseCache:
+    """
+    Bounded LRU cache with time to live for the responses of the read
+    endpoints. Each response is saved with the version of the catalog in
+    the database (its change feed) it was built from and is only served at
+    that version, so a worker never serves a response made stale by the
+    writes of another one. It is also emptied by the writes of its own
+    process.
+    """
+
+    def __init__(self, max_entries: int = 512, ttl: float = 300):
+        """
+        Creates the cache
+
+        Arguments:
+            max_entries {int} -- responses kept, the least recently used
+                ones are dropped first
+            ttl {float} -- seconds a response is kept
+        """
+        self.max_entries = max_entries
+        self.ttl = ttl
+        # writes committed by this process
+        self.version = 0
+        self._entries = OrderedDict()
+        self._lock = Lock()
+
+    def get(self, key, version: int):
+        """
+        Returns the response saved with the key, or None if there is none,
+        it has expired or it was built from another version of the catalog
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry["version"] != version or \
+                    entry["expires"] < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return entry
+
+    def set(self, key, version: int, **response):
+        """
+        Saves a response with the key and the version of the catalog it was
+        built from (read before building it)
+        """
+        with self._lock:
+            if self.max_entries <= 0:
+                return
+            response["version"] = version
+            response["expires"] = time.monotonic() + self.ttl
+            self._entries[key] = response
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def catalog_changed(self):
+        """
+        Counts a write of this process and drops every saved response.
+        Must be called after each committed write to the data table
+        """
+        with self._lock:
+            self.version += 1
+            self._entries.clear()
+
+
+response_cache = ResponseCache(
+    max_entries=int(os.environ.get("CACHE_MAX_ENTRIES", 512)),
+    ttl=float(os.environ.get("CACHE_TTL", 300)),
+    )
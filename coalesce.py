@@ -0,0 +1,149 @@
+from concurrent.futures import Future
+from threading import Lock, Thread
+from typing import Callable, Optional
+import os
+import queue
+import time
+
+from cache import response_cache
+from model import begin_transaction
+from logger import logger
+import metrics
+
+
+class WriteCoalescer:
+    """
+    Group commit of small writes: the writes submitted by concurrent
+    requests within a short window are applied by one writer thread in a
+    single transaction (one write lock and one fsync for all of them), and
+    each request gets back the outcome of its own write.
+
+    Every write runs in a savepoint, so a failing one (a duplicated name)
+    is rolled back alone and its error is raised to its request only.
+    """
+
+    def __init__(self, session_factory, window: float = 0.002,
+                 max_batch: int = 64):
+        """
+        Creates the coalescer. The writer thread is started by the first
+        write, so a process that forks (the gunicorn master) never owns it.
+
+        Arguments:
+            session_factory -- callable returning a new database session
+            window {float} -- seconds the writer waits for more writes
+                after the first one of a batch
+            max_batch {int} -- writes applied per transaction at most
+        """
+        self.session_factory = session_factory
+        self.window = window
+        self.max_batch = max_batch
+        self._queue = queue.SimpleQueue()
+        self._thread = None
+        self._lock = Lock()
+
+    def submit(self, write: Callable, present: Callable) -> Future:
+        """
+        Queues a write for the next batch
+
+        Arguments:
+            write -- callable receiving the session of the batch and
+                returning the object written (or None when there was
+                nothing to write)
+            present -- callable turning the object written into the result
+                of the future, called after the commit
+
+        Returns the future of the result.
+        """
+        self._start()
+        future = Future()
+        self._queue.put((write, present, future))
+        return future
+
+    def _start(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = Thread(target=self._run, name="write-coalescer",
+                                      daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.window
+            while len(batch) < self.max_batch:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=timeout))
+                except queue.Empty:
+                    break
+            try:
+                self.apply(batch)
+            except Exception:
+                logger.exception("Error applying a batch of %s writes",
+                                 len(batch))
+
+    def apply(self, batch: list):
+        """
+        Applies a batch of writes in one transaction and completes their
+        futures
+        """
+        metrics.write_batch_size.observe(len(batch))
+        session = self.session_factory(expire_on_commit=False)
+        written = []
+        try:
+            begin_transaction(session)
+            for write, present, future in batch:
+                if not future.set_running_or_notify_cancel():
+                    continue
+                try:
+                    with session.begin_nested():
+                        target = write(session)
+                    written.append((target, present, future))
+                except Exception as e:
+                    future.set_exception(e)
+            session.commit()
+        except Exception as e:
+            session.rollback()
+            session.close()
+            for _, _, future in written:
+                future.set_exception(e)
+            return
+        if any(target is not None for target, _, _ in written):
+            response_cache.catalog_changed()
+        for target, present, future in written:
+            try:
+                future.set_result(present(target) if target is not None
+                                  else None)
+            except Exception as e:
+                future.set_exception(e)
+        session.close()
+
+    def reset(self):
+        """
+        Forgets the writer thread and the queued writes of the parent, in a
+        forked process
+        """
+        self._queue = queue.SimpleQueue()
+        self._thread = None
+        self._lock = Lock()
+
+
+def make_write_coalescer(session_factory) -> Optional[WriteCoalescer]:
+    """
+    Creates the coalescer of the small writes when WRITE_COALESCING=1,
+    with the window (WRITE_COALESCE_WINDOW_MS) and the batch size
+    (WRITE_COALESCE_MAX_BATCH) of the environment
+
+    Returns the coalescer, or None when the writes go straight to the
+    database.
+    """
+    if os.environ.get("WRITE_COALESCING", "0") != "1":
+        return None
+    coalescer = WriteCoalescer(
+        session_factory,
+        window=float(os.environ.get("WRITE_COALESCE_WINDOW_MS", 2)) / 1000,
+        max_batch=int(os.environ.get("WRITE_COALESCE_MAX_BATCH", 64)))
+    os.register_at_fork(after_in_child=coalescer.reset)
+    return coalescer
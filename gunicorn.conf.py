@@ -0,0 +1,27 @@
+# Settings of gunicorn, the WSGI server of the API in production:
+#
+#     gunicorn --config gunicorn.conf.py "app:create_app()"
+#
+# Every setting can be changed through the environment variables below.
+import multiprocessing
+import os
+
+bind = os.environ.get("BIND", "0.0.0.0:5000")
+# one process per core, each answering requests in a few threads (the
+# requests mostly wait for SQLite, which releases the GIL)
+workers = int(os.environ.get("WEB_CONCURRENCY", multiprocessing.cpu_count()))
+threads = int(os.environ.get("THREADS", 4))
+worker_class = "gthread"
+timeout = int(os.environ.get("TIMEOUT", 60))
+# the app is loaded once by the master and the workers are forked from it,
+# so they start at once. The connections of the pool and the logging
+# threads don't survive the fork: model and logger renew them in each
+# worker (os.register_at_fork)
+preload_app = True
+
+
+def on_starting(server):
+    """Creates or upgrades the database schema once, in the master, before
+    the workers are forked."""
+    from model import init_db
+    init_db()
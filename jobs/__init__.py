@@ -0,0 +1,7 @@
+# Description: Background jobs run by the API (endpoint or CLI triggered)
+# and the tools they share to reach external services.
+from jobs.registry import Job, start_job, get_job
+from jobs.http import HostLimiter, FetchCache, fetch
+from jobs.wfs import WFSResolver
+from jobs.extents import ExtentNormalizer
+from jobs.links import LinkChecker, probe
@@ -0,0 +1,69 @@
+from model import Data
+from model.crs import normalize_extents, EXTENT_COLUMNS, EXTENT_UPDATE_SQL
+from cache import response_cache
+from logger import logger
+
+
+class ExtentNormalizer:
+    """
+    Calculates again the native and WGS84 extents of every data, a chunk
+    at a time: the boxes of a chunk are reprojected together, one
+    vectorized call per coordinate system, and only the data whose extents
+    changed are written.
+    """
+
+    def __init__(self, session_factory, chunk_size: int = 5000):
+        """
+        Creates a normalizer
+
+        Arguments:
+            session_factory -- callable returning a database session
+            chunk_size {int} -- data read, reprojected and saved per commit
+        """
+        self.session_factory = session_factory
+        self.chunk_size = chunk_size
+
+    def run(self, only_missing: bool = False) -> dict:
+        """
+        Normalizes the extents of every data (or only of the ones with a
+        bounding box and no extent yet)
+
+        Returns a summary of the run.
+        """
+        session = self.session_factory()
+        summary = {"data": 0, "updated": 0, "unchanged": 0, "unknown": 0}
+        columns = [getattr(Data, column) for column in EXTENT_COLUMNS]
+        after = 0
+        while True:
+            query = session.query(Data.id, Data.coordinate_system,
+                                  Data.bounding_box, *columns) \
+                .filter(Data.id > after, Data.bounding_box.isnot(None))
+            if only_missing:
+                query = query.filter(Data.native_min_y.is_(None))
+            rows = query.order_by(Data.id).limit(self.chunk_size).all()
+            if not rows:
+                break
+            after = rows[-1].id
+            summary["data"] += len(rows)
+
+            extents = normalize_extents(row[:3] for row in rows)
+            changed = []
+            for row, extent in zip(rows, extents):
+                if extent["native_crs"] is None:
+                    summary["unknown"] += 1
+                if tuple(row[3:]) == tuple(extent[column]
+                                           for column in EXTENT_COLUMNS):
+                    summary["unchanged"] += 1
+                else:
+                    changed.append(extent)
+            if changed:
+                # the update trigger moves them in the R*Tree
+                session.execute(EXTENT_UPDATE_SQL, changed)
+            session.commit()
+            summary["updated"] += len(changed)
+        session.close()
+        if summary["updated"]:
+            response_cache.catalog_changed()
+        logger.info("Extents normalized: %s updated, %s unknown",
+                    summary["updated"], summary["unknown"])
+        return summary
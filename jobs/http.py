@@ -0,0 +1,82 @@
+from contextlib import contextmanager, nullcontext
+from threading import BoundedSemaphore, Lock
+from typing import Optional
+from urllib.parse import urlsplit
+from urllib.request import Request, urlopen
+import time
+
+
+class HostLimiter:
+    """
+    Limits the number of concurrent requests sent to each host, so a pool
+    of workers doesn't flood a single external service.
+    """
+
+    def __init__(self, max_per_host: int = 2):
+        self.max_per_host = max_per_host
+        self._semaphores = {}
+        self._lock = Lock()
+
+    @contextmanager
+    def limit(self, url: str):
+        """
+        Waits for a free slot of the host of the url and holds it
+        """
+        host = urlsplit(url).netloc.lower()
+        with self._lock:
+            semaphore = self._semaphores.get(host)
+            if semaphore is None:
+                semaphore = BoundedSemaphore(self.max_per_host)
+                self._semaphores[host] = semaphore
+        with semaphore:
+            yield
+
+
+class FetchCache:
+    """
+    Keeps the body of the external responses for ttl seconds, so the same
+    service is fetched only once per run (and across close runs).
+    """
+
+    def __init__(self, ttl: float = 3600):
+        self.ttl = ttl
+        self._bodies = {}
+        self._lock = Lock()
+
+    def get(self, url: str) -> Optional[bytes]:
+        with self._lock:
+            entry = self._bodies.get(url)
+            if entry is None or entry[0] < time.monotonic():
+                return None
+            return entry[1]
+
+    def set(self, url: str, body: bytes):
+        with self._lock:
+            self._bodies[url] = (time.monotonic() + self.ttl, body)
+
+
+# the cache of the external responses shared by the runs of the jobs
+fetch_cache = FetchCache()
+
+
+def fetch(url: str, timeout: float = 10,
+          limiter: Optional[HostLimiter] = None,
+          cache: Optional[FetchCache] = None,
+          max_bytes: int = 10 * 1024 * 1024) -> bytes:
+    """
+    Gets the body of an url, respecting the limit of its host and going
+    through the cache
+
+    Raises the urllib errors (URLError, HTTPError, timeout) of the request.
+    """
+    if cache is not None:
+        body = cache.get(url)
+        if body is not None:
+            return body
+    request = Request(url, headers={"User-Agent": "DataControl API"})
+    with limiter.limit(url) if limiter is not None else nullcontext():
+        with urlopen(request, timeout=timeout) as response:
+            body = response.read(max_bytes)
+    if cache is not None:
+        cache.set(url, body)
+    return body
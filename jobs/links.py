@@ -0,0 +1,196 @@
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from contextlib import nullcontext
+from datetime import datetime
+from itertools import islice
+from typing import Optional
+from urllib.error import HTTPError, URLError
+from urllib.parse import urlsplit, unquote
+from urllib.request import Request, urlopen
+import os
+import socket
+import time
+
+from sqlalchemy import bindparam, update
+
+from model import Data, next_check_date_expression
+from jobs.http import HostLimiter
+from cache import response_cache
+from logger import logger
+
+
+def link_path(link: str, root: Optional[str] = None) -> Optional[str]:
+    """
+    Returns the local path of a link to a file or a network share: the
+    backslashes of Windows paths become separators and the path is taken
+    under root (the mount point of the share), when informed
+
+    Returns None when there is no root and the link is neither a file://
+    url nor an absolute POSIX path (a share, a Windows path such as
+    C:\\GIS or \\Dataset, a relative path), since it can't be reached
+    from here.
+    """
+    link = link.strip()
+    if link.lower().startswith("file://"):
+        return unquote(urlsplit(link).path)
+    if root is None:
+        return link if link.startswith("/") and \
+            not link.startswith("//") else None
+    return os.path.join(root, link.replace("\\", "/").lstrip("/"))
+
+
+def probe(link: Optional[str], timeout: float = 10,
+          limiter: Optional[HostLimiter] = None,
+          root: Optional[str] = None) -> dict:
+    """
+    Checks if the link of a data can be reached: a HEAD request (a GET when
+    the service refuses HEAD) for the web links, the existence of the path
+    for the files and network shares
+
+    Returns the status (ok, broken, missing, timeout, unreachable,
+    invalid or unchecked, for a path that can't be reached with no root),
+    the HTTP status code and the latency in milliseconds.
+    """
+    if not link or not link.strip():
+        return {"status": "invalid", "code": None, "latency_ms": None}
+    link = link.strip()
+    started = time.perf_counter()
+    if not link.lower().startswith(("http://", "https://")):
+        path = link_path(link, root)
+        if path is None:
+            return {"status": "unchecked", "code": None, "latency_ms": None}
+        exists = os.path.exists(path)
+        return {"status": "ok" if exists else "missing", "code": None,
+                "latency_ms": round((time.perf_counter() - started) * 1000,
+                                    3)}
+
+    code, status = None, "ok"
+    try:
+        with limiter.limit(link) if limiter is not None else nullcontext():
+            for method in ("HEAD", "GET"):
+                request = Request(link, method=method,
+                                  headers={"User-Agent": "DataControl API"})
+                try:
+                    with urlopen(request, timeout=timeout) as response:
+                        code = response.status
+                    break
+                except HTTPError as e:
+                    code = e.code
+                    # some services only answer GET
+                    if method == "HEAD" and e.code in (403, 405, 501):
+                        continue
+                    break
+        if code is not None and code >= 400:
+            status = "broken"
+    except (socket.timeout, TimeoutError):
+        status = "timeout"
+    except (URLError, OSError, ValueError):
+        status = "unreachable"
+    return {"status": status, "code": code,
+            "latency_ms": round((time.perf_counter() - started) * 1000, 3)}
+
+
+class LinkChecker:
+    """
+    Probes the links of the data concurrently and saves, in batches, the
+    status and latency of each one and a new check date for the ones that
+    were reached.
+    """
+
+    def __init__(self, session_factory, max_workers: int = 16,
+                 max_per_host: int = 4, timeout: float = 10,
+                 batch_size: int = 100, root: Optional[str] = None):
+        """
+        Creates a checker
+
+        Arguments:
+            session_factory -- callable returning a database session
+            max_workers {int} -- links probed at the same time
+            max_per_host {int} -- links of the same host probed at the
+                same time
+            timeout {float} -- seconds to wait for each web link
+            batch_size {int} -- results saved per commit
+            root {str} -- mount point of the network share the file links
+                are under (LINK_ROOT); without it only the file:// links
+                and the absolute POSIX paths are checked, the others are
+                left unchecked
+        """
+        self.session_factory = session_factory
+        self.max_workers = max_workers
+        self.limiter = HostLimiter(max_per_host)
+        self.timeout = timeout
+        self.batch_size = batch_size
+        self.root = root if root is not None \
+            else os.environ.get("LINK_ROOT")
+
+    def run(self, only_due: bool = False) -> dict:
+        """
+        Probes the links of every data (or only of the ones due for a
+        check) and saves the results
+
+        Returns a summary of the run, with the number of links by status.
+        """
+        session = self.session_factory()
+        query = session.query(Data.id, Data.name, Data.link)
+        if only_due:
+            query = query.filter(Data.next_check_date <= datetime.now())
+        rows = query.all()
+        session.rollback()
+
+        summary = {"data": len(rows), "status": {}}
+        pending = []
+        # a few probes per worker are queued at most, not one per data
+        max_in_flight = self.max_workers * 4
+        remaining = iter(rows)
+        futures = {}
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            while True:
+                for row in islice(remaining, max_in_flight - len(futures)):
+                    futures[executor.submit(probe, row.link, self.timeout,
+                                            self.limiter, self.root)] = row
+                if not futures:
+                    break
+                done, _ = wait(futures, return_when=FIRST_COMPLETED)
+                for future in done:
+                    row = futures.pop(future)
+                    result = future.result()
+                    summary["status"][result["status"]] = \
+                        summary["status"].get(result["status"], 0) + 1
+                    if result["status"] != "ok":
+                        logger.info("Link of '%s' is %s: %s", row.name,
+                                    result["status"], row.link)
+                    pending.append({"pk": row.id, **result})
+                    if len(pending) >= self.batch_size:
+                        self.save(session, pending)
+                        pending = []
+        if pending:
+            self.save(session, pending)
+        session.close()
+        if rows:
+            response_cache.catalog_changed()
+        logger.info("Links checked: %s", summary["status"])
+        return summary
+
+    def save(self, session, results: list):
+        """
+        Saves a batch of probe results in one transaction: the status of
+        every link, and the check date (with the next one) of the data
+        whose link was reached
+        """
+        checked = datetime.now()
+        session.execute(
+            update(Data.__table__)
+            .where(Data.__table__.c.pk_data == bindparam("pk"))
+            .values(link_status=bindparam("status"),
+                    link_status_code=bindparam("code"),
+                    link_latency_ms=bindparam("latency_ms"),
+                    link_checked_at=checked),
+            results)
+        reached = [result["pk"] for result in results
+                   if result["status"] == "ok"]
+        if reached:
+            session.execute(
+                update(Data).where(Data.id.in_(reached))
+                .values(check_date=checked,
+                        next_check_date=next_check_date_expression(checked)),
+                execution_options={"synchronize_session": False})
+        session.commit()
@@ -0,0 +1,67 @@
+from datetime import datetime
+from itertools import count
+from threading import Lock, Thread
+from typing import Callable, Optional
+
+from logger import logger
+
+
+class Job:
+    """
+    A job running in a background thread of the API
+    """
+
+    def __init__(self, job_id: int, name: str):
+        self.id = job_id
+        self.name = name
+        self.status = "running"
+        self.started = datetime.now()
+        self.finished = None
+        self.result = None
+        self.error = None
+
+    def run(self, func: Callable, *args, **kwargs):
+        """
+        Runs func, saving its result (or the error that stopped it)
+        """
+        try:
+            self.result = func(*args, **kwargs)
+            self.status = "done"
+        except Exception as e:
+            logger.exception("Job #%s '%s' failed", self.id, self.name)
+            self.error = str(e)
+            self.status = "failed"
+        finally:
+            self.finished = datetime.now()
+
+
+_jobs = {}
+_ids = count(1)
+_lock = Lock()
+# finished jobs kept to be consulted
+MAX_JOBS = 100
+
+
+def start_job(name: str, func: Callable, *args, **kwargs) -> Job:
+    """
+    Starts func in a background thread
+
+    Returns the Job following it.
+    """
+    with _lock:
+        job = Job(next(_ids), name)
+        _jobs[job.id] = job
+        # forget the oldest finished jobs
+        for job_id in sorted(_jobs)[:max(0, len(_jobs) - MAX_JOBS)]:
+            if _jobs[job_id].status != "running":
+                del _jobs[job_id]
+    Thread(target=job.run, args=(func, *args), kwargs=kwargs,
+           name=f"job-{job.id}", daemon=True).start()
+    return job
+
+
+def get_job(job_id: int) -> Optional[Job]:
+    """
+    Returns the job with the id, or None if it isn't known
+    """
+    return _jobs.get(job_id)
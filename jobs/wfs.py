@@ -0,0 +1,271 @@
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Optional, Tuple
+from urllib.parse import urlsplit, urlunsplit, urlencode, parse_qsl
+from xml.etree import ElementTree
+import json
+import math
+
+from model import Data
+from model.spatial import parse_bounding_box
+from jobs.http import HostLimiter, FetchCache, fetch, fetch_cache
+from cache import response_cache
+from logger import logger
+
+
+Box = Tuple[float, float, float, float]
+
+
+def service_url(link: Optional[str], source: Optional[str]) -> Optional[str]:
+    """
+    Returns the url of the service of a WFS data: the link or the source,
+    preferring the one that looks like a feature service
+    """
+    urls = [url.strip() for url in (link, source)
+            if url and url.strip().lower().startswith(("http://", "https://"))]
+    for url in urls:
+        lowered = url.lower()
+        if "featureserver" in lowered or "mapserver" in lowered or \
+                "wfs" in lowered:
+            return url
+    return urls[0] if urls else None
+
+
+def capabilities_url(url: str) -> Tuple[str, str]:
+    """
+    Returns the kind of the service ("esri" or "wfs") and the url that
+    describes its extent: the JSON description of an ArcGIS REST layer or
+    the GetCapabilities document of an OGC WFS (without the feature types
+    of the url, so the layers of a service share one document)
+    """
+    parts = urlsplit(url)
+    if "/featureserver" in parts.path.lower() or \
+            "/mapserver" in parts.path.lower():
+        return "esri", urlunsplit(parts._replace(query="f=json",
+                                                 fragment=""))
+    query = [(key, value) for key, value in parse_qsl(parts.query)
+             if key.lower() not in ("service", "request", "typename",
+                                    "typenames")]
+    query += [("service", "WFS"), ("request", "GetCapabilities")]
+    return "wfs", urlunsplit(parts._replace(query=urlencode(query),
+                                            fragment=""))
+
+
+def type_names(url: str) -> list:
+    """
+    Returns the feature types named in a WFS url (typeName of WFS 1.0/1.1,
+    typeNames of 2.0), comma separated
+    """
+    return [name.strip()
+            for key, value in parse_qsl(urlsplit(url).query)
+            if key.lower() in ("typename", "typenames")
+            for name in value.split(",") if name.strip()]
+
+
+def _local_name(name: str) -> str:
+    return name.rsplit(":", 1)[-1]
+
+
+def _same_type(name: str, wanted: str) -> bool:
+    """
+    Tells if the name of a feature type is the one wanted, ignoring the
+    namespace prefix when one of them has none
+    """
+    if ":" in name and ":" in wanted:
+        return name == wanted
+    return _local_name(name) == _local_name(wanted)
+
+
+def parse_esri_extent(body: bytes) -> Optional[Box]:
+    """
+    Reads the extent of an ArcGIS REST layer description, in WGS84 or Web
+    Mercator
+
+    Returns (min_lat, min_lon, max_lat, max_lon) or None.
+    """
+    extent = json.loads(body).get("extent")
+    if not extent:
+        return None
+    reference = extent.get("spatialReference") or {}
+    wkid = reference.get("latestWkid") or reference.get("wkid")
+    xmin, ymin = extent["xmin"], extent["ymin"]
+    xmax, ymax = extent["xmax"], extent["ymax"]
+    if wkid in (3857, 102100, 102113, 900913):
+        # Web Mercator metres to degrees
+        radius = 6378137.0
+        xmin, xmax = (math.degrees(x / radius) for x in (xmin, xmax))
+        ymin, ymax = (math.degrees(2 * math.atan(math.exp(y / radius))
+                                   - math.pi / 2) for y in (ymin, ymax))
+    elif wkid not in (4326, None):
+        return None
+    return (ymin, xmin, ymax, xmax)
+
+
+def parse_wfs_capabilities(body: bytes,
+                           names: Optional[list] = None) -> Optional[Box]:
+    """
+    Reads the extent of the feature types named (or of every one, when
+    there is no name) from a WFS GetCapabilities document (WGS84BoundingBox
+    of WFS 1.1/2.0, LatLongBoundingBox of 1.0)
+
+    Returns (min_lat, min_lon, max_lat, max_lon) or None, when a feature
+    type named isn't in the document.
+    """
+    feature_types = {}
+    for element in ElementTree.fromstring(body).iter():
+        if element.tag.rsplit("}", 1)[-1] != "FeatureType":
+            continue
+        for child in element:
+            if child.tag.rsplit("}", 1)[-1] == "Name" and child.text:
+                feature_types[child.text.strip()] = element
+                break
+    if names:
+        selected = []
+        for wanted in names:
+            matches = [element for name, element in feature_types.items()
+                       if _same_type(name, wanted)]
+            if not matches:
+                return None
+            selected += matches
+    else:
+        selected = list(feature_types.values())
+    boxes = []
+    for element in (child for feature_type in selected
+                    for child in feature_type):
+        tag = element.tag.rsplit("}", 1)[-1]
+        if tag == "WGS84BoundingBox":
+            corners = {child.tag.rsplit("}", 1)[-1]: child.text.split()
+                       for child in element}
+            lower, upper = corners.get("LowerCorner"), \
+                corners.get("UpperCorner")
+            if lower and upper:
+                boxes.append((float(lower[1]), float(lower[0]),
+                              float(upper[1]), float(upper[0])))
+        elif tag == "LatLongBoundingBox":
+            boxes.append((float(element.get("miny")),
+                          float(element.get("minx")),
+                          float(element.get("maxy")),
+                          float(element.get("maxx"))))
+    if not boxes:
+        return None
+    return (min(box[0] for box in boxes), min(box[1] for box in boxes),
+            max(box[2] for box in boxes), max(box[3] for box in boxes))
+
+
+def format_bounding_box(box: Box) -> str:
+    """
+    Writes a bounding box in the format stored in Data,
+    "minLat minLon; maxLat maxLon"
+    """
+    return f"{box[0]} {box[1]}; {box[2]} {box[3]}"
+
+
+class WFSResolver:
+    """
+    Fetches the bounding box of the WFS data from the external services
+    named in their link (or source), concurrently, and saves them in
+    batches.
+    """
+
+    def __init__(self, session_factory, max_workers: int = 8,
+                 max_per_host: int = 2, timeout: float = 10,
+                 batch_size: int = 50, cache: Optional[FetchCache] = None):
+        """
+        Creates a resolver
+
+        Arguments:
+            session_factory -- callable returning a database session
+            max_workers {int} -- services fetched at the same time
+            max_per_host {int} -- services of the same host fetched at the
+                same time
+            timeout {float} -- seconds to wait for each service
+            batch_size {int} -- bounding boxes saved per commit
+            cache {FetchCache} -- cache of the service responses, the one
+                shared by the runs of the process by default
+        """
+        self.session_factory = session_factory
+        self.max_workers = max_workers
+        self.limiter = HostLimiter(max_per_host)
+        self.timeout = timeout
+        self.batch_size = batch_size
+        self.cache = cache if cache is not None else fetch_cache
+
+    def resolve(self, url: str) -> Optional[Box]:
+        """
+        Fetches the bounding box of the service at url
+        """
+        kind, description_url = capabilities_url(url)
+        body = fetch(description_url, self.timeout, self.limiter, self.cache)
+        if kind == "esri":
+            return parse_esri_extent(body)
+        return parse_wfs_capabilities(body, type_names(url))
+
+    def run(self, only_missing: bool = False) -> dict:
+        """
+        Resolves the bounding box of every WFS data (or only of the ones
+        without a bounding box) and saves the ones that changed
+
+        Returns a summary of the run.
+        """
+        session = self.session_factory()
+        query = session.query(Data.id, Data.name, Data.link, Data.source,
+                              Data.bounding_box) \
+            .filter(Data.format == "WFS")
+        rows = query.all()
+        session.rollback()
+        if only_missing:
+            rows = [row for row in rows
+                    if parse_bounding_box(row.bounding_box) is None]
+
+        summary = {"data": len(rows), "updated": 0, "unchanged": 0,
+                   "failed": 0, "errors": {}}
+        pending = {}
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            futures = {}
+            for row in rows:
+                url = service_url(row.link, row.source)
+                if url is None:
+                    summary["failed"] += 1
+                    summary["errors"][row.name] = "No service url"
+                    continue
+                futures[executor.submit(self.resolve, url)] = row
+            for future in as_completed(futures):
+                row = futures[future]
+                try:
+                    box = future.result()
+                except Exception as e:
+                    logger.warning("Error resolving the bounding box of "
+                                   "'%s': %s", row.name, e)
+                    box = None
+                    summary["errors"][row.name] = str(e)
+                if box is None:
+                    summary["failed"] += 1
+                    summary["errors"].setdefault(row.name, "No extent found")
+                    continue
+                bounding_box = format_bounding_box(box)
+                if bounding_box == row.bounding_box:
+                    summary["unchanged"] += 1
+                    continue
+                pending[row.id] = bounding_box
+                if len(pending) >= self.batch_size:
+                    summary["updated"] += self.save(session, pending)
+                    pending = {}
+        if pending:
+            summary["updated"] += self.save(session, pending)
+        session.close()
+        logger.info("WFS bounding boxes resolved: %s updated, %s failed",
+                    summary["updated"], summary["failed"])
+        return summary
+
+    def save(self, session, bounding_boxes: dict) -> int:
+        """
+        Saves a batch of bounding boxes, by data id, in one commit
+
+        Returns the number of data updated.
+        """
+        dataset = session.query(Data).filter(
+            Data.id.in_(bounding_boxes)).all()
+        for data in dataset:
+            data.bounding_box = bounding_boxes[data.id]
+        session.commit()
+        response_cache.catalog_changed()
+        return len(dataset)
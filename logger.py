@@ -1,6 +1,12 @@
 from logging.config import dictConfig
+from logging.handlers import QueueHandler, QueueListener
+from datetime import datetime
+import atexit
+import copy
+import json
 import logging
 import os
+import queue
 
 
 log_path = "log/"
@@ -10,6 +16,49 @@ if not os.path.exists(log_path):
    os.makedirs(log_path)
 
 
+class JsonFormatter(logging.Formatter):
+    """
+    Writes each record as one JSON object per line, with the fields passed
+    in the extra argument of the logging call
+    """
+    # attributes every LogRecord has, the other ones came in extra
+    RECORD_ATTRIBUTES = set(vars(logging.LogRecord(
+        "", 0, "", 0, "", None, None))) | {"message", "asctime"}
+
+    def format(self, record):
+        entry = {
+            "time": datetime.fromtimestamp(record.created).isoformat(
+                timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in self.RECORD_ATTRIBUTES:
+                entry[key] = value
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry["exception"] = record.exc_text
+        return json.dumps(entry, default=str, ensure_ascii=False)
+
+
+class LazyQueueHandler(QueueHandler):
+    """
+    Puts the records in the queue without formatting them: the message is
+    only built by the handlers of the listener thread. The traceback of
+    the exception is rendered now, since it refers to this thread's stack.
+    """
+
+    def prepare(self, record):
+        record = copy.copy(record)
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(
+                record.exc_info)
+            record.exc_info = None
+        return record
+
+
 dictConfig({
     "version": 1,
     "disable_existing_loggers": True,
@@ -19,6 +68,9 @@ dictConfig({
         },
         "detailed": {
             "format": "[%(asctime)s] %(levelname)-4s %(funcName)s() L%(lineno)-4d %(message)s - call_trace=%(pathname)s L%(lineno)-4d",
+        },
+        "json": {
+            "()": JsonFormatter,
         }
     },
     "handlers": {
@@ -41,7 +93,7 @@ dictConfig({
             "class": "logging.handlers.RotatingFileHandler",
             "formatter": "detailed",
             "filename": "log/gunicorn.error.log",
-            "maxBytes": 10000,
+            "maxBytes": 10 * 1024 * 1024,
             "backupCount": 10,
             "delay": "True",
         },
@@ -49,7 +101,23 @@ dictConfig({
             "class": "logging.handlers.RotatingFileHandler",
             "formatter": "detailed",
             "filename": "log/gunicorn.detailed.log",
-            "maxBytes": 10000,
+            "maxBytes": 10 * 1024 * 1024,
+            "backupCount": 10,
+            "delay": "True",
+        },
+        "access_file": {
+            "class": "logging.handlers.RotatingFileHandler",
+            "formatter": "json",
+            "filename": "log/access.log",
+            "maxBytes": 50 * 1024 * 1024,
+            "backupCount": 10,
+            "delay": "True",
+        },
+        "slow_query_file": {
+            "class": "logging.handlers.RotatingFileHandler",
+            "formatter": "json",
+            "filename": "log/slow_query.log",
+            "maxBytes": 10 * 1024 * 1024,
             "backupCount": 10,
             "delay": "True",
         }
@@ -59,6 +127,19 @@ dictConfig({
             "handlers": ["console", "error_file"],  #, email],
             "level": "INFO",
             "propagate": False,
+        },
+        # structured (JSON) log of the requests
+        "access": {
+            "handlers": ["access_file"],
+            "level": "INFO" if os.environ.get("ACCESS_LOG", "1") != "0"
+            else "WARNING",
+            "propagate": False,
+        },
+        # SQL statements slower than SLOW_QUERY_MS, with their plans
+        "slow_query": {
+            "handlers": ["slow_query_file"],
+            "level": "INFO",
+            "propagate": False,
         }
     },
     "root": {
@@ -68,4 +149,55 @@ dictConfig({
 })
 
 
+def start_queue_logging(logger_names=("", "gunicorn.error", "access",
+                                      "slow_query")):
+    """
+    Moves the handlers of the loggers to background listener threads: the
+    loggers only put the records in a queue, so writing (and rotating) the
+    files never happens in the thread answering a request.
+
+    Returns the listeners.
+    """
+    listeners = []
+    for name in logger_names:
+        configured = logging.getLogger(name)
+        # one queue per logger, so each record reaches only its handlers
+        records = queue.SimpleQueue()
+        listener = QueueListener(records, *configured.handlers,
+                                 respect_handler_level=True)
+        configured.handlers = [LazyQueueHandler(records)]
+        listener.start()
+        # writes the records still in the queue when the process ends
+        atexit.register(listener.stop)
+        listeners.append(listener)
+    return listeners
+
+
+def restart_queue_logging():
+    """
+    Starts new listener threads in a forked process (a gunicorn worker):
+    the threads of the parent don't exist in the child, so without them the
+    records would pile up in the queues
+    """
+    global listeners
+    restarted = []
+    for listener in listeners:
+        atexit.unregister(listener.stop)
+        listener = QueueListener(listener.queue, *listener.handlers,
+                                 respect_handler_level=True)
+        listener.start()
+        atexit.register(listener.stop)
+        restarted.append(listener)
+    listeners = restarted
+
+
+listeners = []
+# LOG_QUEUE=0 keeps the handlers writing in the thread that logs
+if os.environ.get("LOG_QUEUE", "1") != "0":
+    listeners = start_queue_logging()
+    os.register_at_fork(after_in_child=restart_queue_logging)
+
+
 logger = logging.getLogger(__name__)
+access_logger = logging.getLogger("access")
+slow_query_logger = logging.getLogger("slow_query")
@@ -0,0 +1,214 @@
+from bisect import bisect_left
+from threading import Lock
+import time
+
+from flask import g, has_request_context, request
+from sqlalchemy import event
+
+import timing
+
+
+# upper bounds of the histograms buckets
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25,
+                   0.5, 1.0, 2.5, 5.0, 10.0)
+SIZE_BUCKETS = (128, 512, 1024, 4096, 16384, 65536, 262144, 1048576,
+                4194304, 16777216)
+COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+
+def _labels(names, values):
+    if not names:
+        return ""
+    pairs = ",".join(f'{name}="{value}"' for name, value in zip(names, values))
+    return "{" + pairs + "}"
+
+
+class Counter:
+    """
+    A value that only goes up, by label values
+    """
+    kind = "counter"
+
+    def __init__(self, name: str, help: str, labels=()):
+        self.name, self.help, self.labels = name, help, tuple(labels)
+        self._values = {}
+        self._lock = Lock()
+
+    def inc(self, *label_values, amount: float = 1):
+        with self._lock:
+            self._values[label_values] = \
+                self._values.get(label_values, 0) + amount
+
+    def samples(self):
+        with self._lock:
+            items = list(self._values.items())
+        for label_values, value in items:
+            yield self.name + _labels(self.labels, label_values), value
+
+
+class Gauge(Counter):
+    """
+    A value that goes up and down, by label values
+    """
+    kind = "gauge"
+
+    def dec(self, *label_values, amount: float = 1):
+        self.inc(*label_values, amount=-amount)
+
+    def set(self, *label_values, value: float):
+        with self._lock:
+            self._values[label_values] = value
+
+
+class Histogram:
+    """
+    Counts the observed values in buckets, by label values
+    """
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, buckets, labels=()):
+        self.name, self.help, self.labels = name, help, tuple(labels)
+        self.buckets = tuple(buckets)
+        self._values = {}
+        self._lock = Lock()
+
+    def observe(self, value: float, *label_values):
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self._values.get(label_values)
+            if entry is None:
+                entry = self._values[label_values] = \
+                    [[0] * (len(self.buckets) + 1), 0.0, 0]
+            entry[0][index] += 1
+            entry[1] += value
+            entry[2] += 1
+
+    def samples(self):
+        with self._lock:
+            items = [(label_values, (list(counts), total, count))
+                     for label_values, (counts, total, count)
+                     in self._values.items()]
+        names = self.labels + ("le",)
+        for label_values, (counts, total, count) in items:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + ("+Inf",), counts):
+                cumulative += bucket_count
+                yield (self.name + "_bucket" +
+                       _labels(names, label_values + (bound,)), cumulative)
+            yield self.name + "_sum" + _labels(self.labels, label_values), \
+                total
+            yield self.name + "_count" + _labels(self.labels, label_values), \
+                count
+
+
+requests_total = Counter(
+    "http_requests_total", "Requests answered.",
+    ("method", "route", "status"))
+request_duration = Histogram(
+    "http_request_duration_seconds", "Time to answer a request.",
+    LATENCY_BUCKETS, ("method", "route"))
+response_size = Histogram(
+    "http_response_size_bytes", "Size of the response bodies.",
+    SIZE_BUCKETS, ("method", "route"))
+requests_in_flight = Gauge(
+    "http_requests_in_flight", "Requests being answered.")
+queries_total = Counter(
+    "db_queries_total", "SQL statements executed.")
+query_duration = Histogram(
+    "db_query_duration_seconds", "Time to execute a SQL statement.",
+    LATENCY_BUCKETS)
+queries_per_request = Histogram(
+    "db_queries_per_request", "SQL statements executed per request.",
+    COUNT_BUCKETS, ("route",))
+write_batch_size = Histogram(
+    "db_write_batch_size", "Writes applied per transaction by the write "
+    "coalescer.", COUNT_BUCKETS)
+replica_syncs = Counter(
+    "replica_syncs_total", "Updates of the read replica of the catalog, "
+    "by kind (delta or full load).", ("kind",))
+replica_version = Gauge(
+    "replica_version", "Catalog version of the read replica.")
+pool_checkouts = Counter(
+    "db_pool_checkouts_total", "Connections taken from the pool.")
+pool_checked_out = Gauge(
+    "db_pool_checked_out", "Connections in use.")
+
+METRICS = [requests_total, request_duration, response_size,
+           requests_in_flight, queries_total, query_duration,
+           queries_per_request, write_batch_size, replica_syncs,
+           replica_version, pool_checkouts, pool_checked_out]
+
+
+def render() -> str:
+    """
+    Returns the metrics in the Prometheus text exposition format
+    """
+    lines = []
+    for metric in METRICS:
+        lines.append(f"# HELP {metric.name} {metric.help}")
+        lines.append(f"# TYPE {metric.name} {metric.kind}")
+        for sample, value in metric.samples():
+            lines.append(f"{sample} {value}")
+    return "\n".join(lines) + "\n"
+
+
+def _route():
+    rule = request.url_rule
+    return rule.rule if rule is not None else "<unmatched>"
+
+
+def instrument_app(app):
+    """
+    Measures the requests of the app. Must be called before any other
+    before_request hook is registered, as a hook answering the request
+    (the response cache) skips the ones registered after it.
+    """
+    @app.before_request
+    def start_request_metrics():
+        g.metrics_started = time.perf_counter()
+        g.metrics_queries = 0
+        requests_in_flight.inc()
+
+    @app.after_request
+    def record_request_metrics(response):
+        started = g.get("metrics_started")
+        if started is None:
+            return response
+        route = _route()
+        requests_total.inc(request.method, route, response.status_code)
+        request_duration.observe(time.perf_counter() - started,
+                                 request.method, route)
+        if response.content_length is not None:
+            response_size.observe(response.content_length,
+                                  request.method, route)
+        queries_per_request.observe(g.get("metrics_queries", 0), route)
+        return response
+
+    @app.teardown_request
+    def end_request_metrics(exception=None):
+        if g.pop("metrics_started", None) is not None:
+            requests_in_flight.dec()
+
+
+def instrument_engine(engine):
+    """
+    Measures the SQL statements and the pool checkouts of the engine
+    """
+    def record_query_metrics(conn, statement, parameters, executemany,
+                             duration):
+        queries_total.inc()
+        query_duration.observe(duration)
+        if has_request_context() and "metrics_queries" in g:
+            g.metrics_queries += 1
+
+    timing.on_statement(engine, record_query_metrics)
+
+    @event.listens_for(engine, "checkout")
+    def record_checkout(dbapi_connection, connection_record,
+                        connection_proxy):
+        pool_checkouts.inc()
+        pool_checked_out.inc()
+
+    @event.listens_for(engine, "checkin")
+    def record_checkin(dbapi_connection, connection_record):
+        pool_checked_out.dec()
@@ -1,31 +1,223 @@
 from sqlalchemy_utils import database_exists, create_database
-from sqlalchemy.orm import sessionmaker
-from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker, scoped_session
+from sqlalchemy import create_engine, event, inspect, text, make_url
+from sqlalchemy.pool import QueuePool
+from threading import Lock
 import os
+import sqlite3
 
 # import elements from model
 from model.base import Base
 # import elements from model.data
-from model.data import Data
+from model.data import Data, fill_next_check_dates, \
+    next_check_date_expression
+from model.area import AreaClosure, AREAS, fill_area_closure
+from model.spatial import data_rtree, create_spatial_index
+from model.crs import fill_extents
+from model.fulltext import create_text_index, match_expression, TEXT_SEARCH_SQL
+from model.changes import data_tombstone, create_change_feed, current_version
+from model.stats import create_stats, rebuild_stats, read_stats
+from model.trigram import create_trigram_index, suggest_names
 
 db_path = "database/"
-# verify if the path exists
-if not os.path.exists(db_path):
-    # then create it
-    os.makedirs(db_path)
 
-# database url (this is a local sqlite url)
-db_url = f'sqlite:///{db_path}/db.sqlite3'
+# database url (by default a local sqlite url)
+db_url = os.environ.get("DATABASE_URL", f'sqlite:///{db_path}/db.sqlite3')
 
-# create a connection engine with the database
-engine = create_engine(db_url, echo=False)
+# version of the schema built by init_db, saved in the SQLite user_version.
+# It must be bumped whenever a table, column, index or trigger is added, so
+# the databases built before are brought up to date on the next start
+SCHEMA_VERSION = 6
 
-# Instance a session maker with the database
-Session = sessionmaker(bind=engine)
+# SQLite settings applied to every new connection (DB_TUNED=0 keeps the
+# SQLite defaults): WAL lets readers go on while a writer commits,
+# synchronous=NORMAL is safe with WAL and saves one fsync per commit, the
+# busy timeout makes concurrent writers wait instead of failing, and mmap
+# and a bigger page cache cut the reads that go through system calls
+SQLITE_PRAGMAS = {
+    "journal_mode": "WAL",
+    "synchronous": "NORMAL",
+    "busy_timeout": int(os.environ.get("DB_BUSY_TIMEOUT_MS", 5000)),
+    "mmap_size": int(os.environ.get("DB_MMAP_SIZE", 268435456)),
+    "cache_size": int(os.environ.get("DB_CACHE_SIZE", -65536)),
+    }
 
-# create the database if it doesn't exist
-if not database_exists(engine.url):
-    create_database(engine.url)
 
-# create the tables in the database, if they don't exist
-Base.metadata.create_all(engine)
+def tune_sqlite(dbapi_connection, connection_record):
+    """
+    Applies SQLITE_PRAGMAS to a new connection with the database
+    """
+    if not isinstance(dbapi_connection, sqlite3.Connection) or \
+            os.environ.get("DB_TUNED", "1") == "0":
+        return
+    cursor = dbapi_connection.cursor()
+    for pragma, value in SQLITE_PRAGMAS.items():
+        cursor.execute(f"PRAGMA {pragma} = {value}")
+    cursor.close()
+
+
+# Instance a session maker with the database. The sessions are scoped:
+# every call to Session() in the same request returns the same session,
+# which is closed by Session.remove() at the end of the request
+Session = scoped_session(sessionmaker())
+
+engine = None
+_initialized = False
+_init_lock = Lock()
+
+
+def configure_engine(url: str = None, pool_size: int = None,
+                     max_overflow: int = None, pool_timeout: float = None):
+    """
+    Creates the connection engine with the database and binds the sessions
+    to it. The settings not informed are read from DATABASE_URL,
+    DB_POOL_SIZE, DB_MAX_OVERFLOW and DB_POOL_TIMEOUT. The pool settings
+    only apply to the databases with a queue pool (not the in-memory
+    SQLite ones, which keep one connection per thread). No connection is
+    opened: the schema is only checked by init_db.
+
+    Returns the engine.
+    """
+    global engine, _initialized
+    url = make_url(url or db_url)
+    pool_settings = {}
+    if issubclass(url.get_dialect().get_pool_class(url), QueuePool):
+        # the pool keeps up to pool_size connections open, plus
+        # max_overflow under load
+        pool_settings = dict(
+            pool_size=pool_size if pool_size is not None
+            else int(os.environ.get("DB_POOL_SIZE", 5)),
+            max_overflow=max_overflow if max_overflow is not None
+            else int(os.environ.get("DB_MAX_OVERFLOW", 10)),
+            pool_timeout=pool_timeout if pool_timeout is not None
+            else float(os.environ.get("DB_POOL_TIMEOUT", 30)),
+            )
+    engine = create_engine(url, echo=False, **pool_settings)
+    event.listen(engine, "connect", tune_sqlite)
+    Session.remove()
+    Session.configure(bind=engine)
+    _initialized = False
+    return engine
+
+
+def begin_transaction(session):
+    """
+    Opens the transaction of a session on its connection, before its
+    savepoints: pysqlite opens none for a SAVEPOINT, so each RELEASE would
+    commit the write of its savepoint on its own
+    """
+    connection = session.connection()
+    if connection.dialect.name == "sqlite":
+        connection.exec_driver_sql("BEGIN")
+
+
+def dispose_after_fork():
+    """
+    Drops, in a forked process (a gunicorn worker), the connections of the
+    pool inherited from the parent, without closing them: they still
+    belong to the parent, and sharing a connection between processes
+    corrupts it
+    """
+    if engine is not None:
+        engine.dispose(close=False)
+
+
+os.register_at_fork(after_in_child=dispose_after_fork)
+
+
+def upgrade_schema(engine):
+    """
+    Adds to the existing tables the columns and indexes declared in the
+    models after the tables were created (create_all only creates missing
+    tables).
+    """
+    inspector = inspect(engine)
+    with engine.begin() as connection:
+        for table in Base.metadata.sorted_tables:
+            if not inspector.has_table(table.name):
+                continue
+            existing = {column["name"]
+                        for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name not in existing:
+                    column_type = column.type.compile(engine.dialect)
+                    connection.execute(text(
+                        f'ALTER TABLE {table.name} '
+                        f'ADD COLUMN {column.name} {column_type}'))
+            for index in table.indexes:
+                index.create(connection, checkfirst=True)
+
+
+def schema_version(connection) -> int:
+    """
+    Returns the version of the schema saved in the database (always 0 out
+    of SQLite, where the schema is checked on every start)
+    """
+    if connection.dialect.name != "sqlite":
+        return 0
+    return connection.execute(text("PRAGMA user_version")).scalar()
+
+
+def init_db():
+    """
+    Creates or brings up to date the database, once per process: the first
+    call does the work (a single query when the saved schema version is the
+    current one) and the next ones return at once. Called on the first
+    request, by the commands and by the gunicorn master before forking.
+    """
+    global _initialized
+    if _initialized:
+        return
+    with _init_lock:
+        if _initialized:
+            return
+        if engine is None:
+            configure_engine()
+        if engine.url.get_backend_name() == "sqlite" and \
+                engine.url.database and \
+                not os.path.exists(os.path.dirname(engine.url.database)
+                                   or "."):
+            os.makedirs(os.path.dirname(engine.url.database))
+        # create the database if it doesn't exist
+        if not database_exists(engine.url):
+            create_database(engine.url)
+        with engine.connect() as connection:
+            up_to_date = schema_version(connection) == SCHEMA_VERSION
+        if not up_to_date:
+            build_schema(engine)
+        _initialized = True
+
+
+def build_schema(engine):
+    """
+    Creates the tables, columns, indexes and triggers missing in the
+    database and fills the columns added since it was built
+    """
+    # create the tables in the database, if they don't exist
+    Base.metadata.create_all(engine)
+    # bring the tables created by previous versions up to date
+    upgrade_schema(engine)
+    with engine.begin() as connection:
+        # create the spatial index over the bounding boxes
+        create_spatial_index(connection)
+        # calculate the native and WGS84 extents of the data saved before
+        fill_extents(connection)
+        # create the full-text index over the text columns
+        create_text_index(connection)
+        # create the trigram index over the names
+        create_trigram_index(connection)
+        # create the change feed (row versions and tombstones)
+        create_change_feed(connection)
+        # calculate the next check of the data saved before it existed
+        fill_next_check_dates(connection)
+        # create the summary tables of the statistics of the catalog
+        create_stats(connection)
+        # write the closure table of the hierarchy of the areas
+        fill_area_closure(connection)
+        if connection.dialect.name == "sqlite":
+            connection.execute(text(f"PRAGMA user_version = {SCHEMA_VERSION}"))
+
+
+# the engine of the settings in the environment, replaced by the app
+# factory when it is given other settings
+configure_engine()
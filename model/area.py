@@ -0,0 +1,69 @@
+from sqlalchemy import Column, String, Integer, Index, delete, insert
+from model import Base
+
+
+# The areas of the data and the ones that contain them. Northern Ireland
+# is part of both the island and the United Kingdom
+AREA_HIERARCHY = {
+    "All Ireland": ["ROI - All", "Northern Ireland"],
+    "ROI - All": ["Carlow", "Cavan", "Clare", "Cork", "Donegal", "Dublin",
+                  "Galway", "Kerry", "Kildare", "Kilkenny", "Laois",
+                  "Leitrim", "Limerick", "Longford", "Louth", "Mayo",
+                  "Meath", "Monaghan", "Offaly", "Roscommon", "Sligo",
+                  "Tipperary", "Waterford", "Westmeath", "Wexford",
+                  "Wicklow"],
+    "UK - All": ["England", "Scotland", "Wales", "Northern Ireland"],
+    }
+
+AREAS = set(AREA_HIERARCHY) | {child for children in AREA_HIERARCHY.values()
+                               for child in children}
+
+
+class AreaClosure(Base):
+    """
+    Closure table of AREA_HIERARCHY: one row for every area and each area
+    it contains, at any depth (and for every area and itself, at depth 0),
+    so the areas above or below an area are one indexed lookup
+    """
+    __tablename__ = 'area_closure'
+    # the primary key serves the descendants of an area, this index the
+    # ancestors
+    __table_args__ = (
+        Index("ix_area_closure_descendant", "descendant", "ancestor"),
+        )
+
+    ancestor = Column(String(20), primary_key=True)
+    descendant = Column(String(20), primary_key=True)
+    depth = Column(Integer, nullable=False)
+
+
+def area_closure():
+    """
+    Calculates the rows of the closure table of AREA_HIERARCHY
+
+    Returns a list of (ancestor, descendant, depth).
+    """
+    rows = {}
+
+    def descend(ancestor, area, depth):
+        # the shortest path is kept when an area is reached twice
+        if rows.get((ancestor, area), depth) >= depth:
+            rows[(ancestor, area)] = depth
+        for child in AREA_HIERARCHY.get(area, []):
+            descend(ancestor, child, depth + 1)
+
+    for area in sorted(AREAS):
+        descend(area, area, 0)
+    return [(ancestor, descendant, depth)
+            for (ancestor, descendant), depth in sorted(rows.items())]
+
+
+def fill_area_closure(connection):
+    """
+    Writes the closure table of AREA_HIERARCHY, replacing the rows of a
+    previous hierarchy
+    """
+    connection.execute(delete(AreaClosure))
+    connection.execute(insert(AreaClosure), [
+        {"ancestor": ancestor, "descendant": descendant, "depth": depth}
+        for ancestor, descendant, depth in area_closure()])
@@ -0,0 +1,89 @@
+from sqlalchemy import Table, MetaData, Column, Integer, String, DateTime, \
+    text
+
+
+# Change feed of the data table. Every insert and update of a data takes
+# the next value of the sequence as its version (and sets updated_at), and
+# every delete leaves a tombstone with its own version, so the changes
+# since a version are an indexed range scan on version. It is kept in
+# triggers, like the R*Tree and full-text indexes, so the ORM, the bulk
+# import and the set-based batch operations all feed it.
+data_sequence = Table(
+    "data_sequence", MetaData(),
+    Column("id", Integer, primary_key=True),
+    Column("version", Integer, nullable=False),
+    )
+
+data_tombstone = Table(
+    "data_tombstone", MetaData(),
+    Column("version", Integer, primary_key=True),
+    Column("id", Integer, nullable=False),
+    Column("name", String(140)),
+    Column("deleted_at", DateTime),
+    )
+
+CHANGE_FEED_DDL = [
+    """CREATE TABLE IF NOT EXISTS data_sequence (
+           id INTEGER PRIMARY KEY CHECK (id = 1),
+           version INTEGER NOT NULL)""",
+    """INSERT OR IGNORE INTO data_sequence (id, version)
+       SELECT 1, coalesce(max(version), 0) FROM data""",
+    """CREATE TABLE IF NOT EXISTS data_tombstone (
+           version INTEGER PRIMARY KEY,
+           id INTEGER NOT NULL,
+           name VARCHAR(140),
+           deleted_at DATETIME)""",
+    """CREATE TRIGGER IF NOT EXISTS data_version_insert AFTER INSERT ON data
+       BEGIN
+           UPDATE data_sequence SET version = version + 1 WHERE id = 1;
+           UPDATE data
+           SET version = (SELECT version FROM data_sequence WHERE id = 1),
+               updated_at = datetime('now', 'localtime')
+           WHERE pk_data = new.pk_data;
+       END""",
+    # the WHEN clause stops the update of the version from firing it again
+    # when recursive triggers are on
+    """CREATE TRIGGER IF NOT EXISTS data_version_update AFTER UPDATE ON data
+       WHEN new.version IS old.version
+       BEGIN
+           UPDATE data_sequence SET version = version + 1 WHERE id = 1;
+           UPDATE data
+           SET version = (SELECT version FROM data_sequence WHERE id = 1),
+               updated_at = datetime('now', 'localtime')
+           WHERE pk_data = new.pk_data;
+       END""",
+    """CREATE TRIGGER IF NOT EXISTS data_version_delete AFTER DELETE ON data
+       BEGIN
+           UPDATE data_sequence SET version = version + 1 WHERE id = 1;
+           INSERT INTO data_tombstone (version, id, name, deleted_at)
+           SELECT version, old.pk_data, old.name,
+                  datetime('now', 'localtime')
+           FROM data_sequence WHERE id = 1;
+       END""",
+    ]
+
+
+def create_change_feed(connection):
+    """
+    Creates the sequence, the tombstones and the triggers of the change
+    feed, if they don't exist, giving a version to the data saved before it
+    """
+    exists = connection.execute(text(
+        "SELECT 1 FROM sqlite_master WHERE name = 'data_sequence'")).first()
+    if not exists:
+        # one version per data, in the order they were inserted
+        connection.execute(text(
+            "UPDATE data SET version = pk_data, "
+            "updated_at = coalesce(check_date, datetime('now', 'localtime')) "
+            "WHERE version IS NULL"))
+    for statement in CHANGE_FEED_DDL:
+        connection.execute(text(statement))
+
+
+def current_version(connection) -> int:
+    """
+    Returns the version of the last change of the data table
+    """
+    return connection.execute(
+        data_sequence.select().with_only_columns(data_sequence.c.version)
+        .where(data_sequence.c.id == 1)).scalar() or 0
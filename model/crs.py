@@ -0,0 +1,244 @@
+from typing import Iterable, List, Optional, Tuple
+from sqlalchemy import text
+import numpy as np
+
+from model.spatial import parse_bounding_box
+
+
+# Transverse Mercator projections of the coordinate systems of the data:
+# ellipsoid axes (a, b), scale factor on the central meridian (F0), true
+# origin (lat0, lon0, in degrees) and false origin (E0, N0, in metres)
+PROJECTIONS = {
+    # Irish Transverse Mercator, on GRS80 (ETRS89 matches WGS84 well within
+    # the metre, so no datum shift is needed)
+    "ITM": {"a": 6378137.0, "b": 6356752.314140, "F0": 0.999820,
+            "lat0": 53.5, "lon0": -8.0, "E0": 600000.0, "N0": 750000.0},
+    # British National Grid, on Airy 1830 (OSGB36 datum)
+    "BNG": {"a": 6377563.396, "b": 6356256.909, "F0": 0.9996012717,
+            "lat0": 49.0, "lon0": -2.0, "E0": 400000.0, "N0": -100000.0},
+    }
+
+# Helmert transformation from OSGB36 to WGS84: translations in metres,
+# scale in ppm and rotations in arc seconds (about 5 m of accuracy)
+OSGB36_TO_WGS84 = {"tx": 446.448, "ty": -125.157, "tz": 542.060,
+                   "s": -20.4894, "rx": 0.1502, "ry": 0.2470, "rz": 0.8421}
+AIRY_1830 = (6377563.396, 6356256.909)
+WGS84 = (6378137.0, 6356752.314245)
+
+# where each corner of a box is sampled: the corners and the middle of the
+# edges, as the edges of a projected box are curves in degrees
+_SAMPLES = np.array([(0, 0), (0, 0.5), (0, 1), (0.5, 1),
+                     (1, 1), (1, 0.5), (1, 0), (0.5, 0)])
+
+
+def _meridional_arc(projection, b, n, lat):
+    """
+    Distance along the central meridian from the true origin to lat
+    (radians), already scaled by F0
+    """
+    lat0 = np.radians(projection["lat0"])
+    d, s = lat - lat0, lat + lat0
+    return b * projection["F0"] * (
+        (1 + n + 1.25 * n ** 2 + 1.25 * n ** 3) * d
+        - (3 * n + 3 * n ** 2 + 2.625 * n ** 3) * np.sin(d) * np.cos(s)
+        + (1.875 * n ** 2 + 1.875 * n ** 3) * np.sin(2 * d) * np.cos(2 * s)
+        - (35 / 24) * n ** 3 * np.sin(3 * d) * np.cos(3 * s))
+
+
+def inverse_transverse_mercator(coordinate_system: str, northing, easting):
+    """
+    Converts grid coordinates (metres) of ITM or BNG to latitude and
+    longitude (degrees) on the ellipsoid of the projection, for whole
+    arrays at once (the formulas of the Ordnance Survey guide to
+    coordinate systems)
+    """
+    projection = PROJECTIONS[coordinate_system]
+    a, b, F0 = projection["a"], projection["b"], projection["F0"]
+    e2 = 1 - (b * b) / (a * a)
+    n = (a - b) / (a + b)
+    northing = np.asarray(northing, dtype=float) - projection["N0"]
+    east = np.asarray(easting, dtype=float) - projection["E0"]
+
+    # latitude of the foot of the perpendicular to the central meridian
+    lat = np.radians(projection["lat0"]) + northing / (a * F0)
+    for _ in range(10):
+        remainder = northing - _meridional_arc(projection, b, n, lat)
+        if np.all(np.abs(remainder) < 1e-5):
+            break
+        lat = lat + remainder / (a * F0)
+
+    sin, cos, tan = np.sin(lat), np.cos(lat), np.tan(lat)
+    nu = a * F0 / np.sqrt(1 - e2 * sin ** 2)
+    rho = a * F0 * (1 - e2) / (1 - e2 * sin ** 2) ** 1.5
+    eta2 = nu / rho - 1
+    sec = 1 / cos
+    t2, t4, t6 = tan ** 2, tan ** 4, tan ** 6
+    VII = tan / (2 * rho * nu)
+    VIII = tan / (24 * rho * nu ** 3) * (5 + 3 * t2 + eta2 - 9 * t2 * eta2)
+    IX = tan / (720 * rho * nu ** 5) * (61 + 90 * t2 + 45 * t4)
+    X = sec / nu
+    XI = sec / (6 * nu ** 3) * (nu / rho + 2 * t2)
+    XII = sec / (120 * nu ** 5) * (5 + 28 * t2 + 24 * t4)
+    XIIA = sec / (5040 * nu ** 7) * (61 + 662 * t2 + 1320 * t4 + 720 * t6)
+
+    latitude = lat - VII * east ** 2 + VIII * east ** 4 - IX * east ** 6
+    longitude = np.radians(projection["lon0"]) + X * east \
+        - XI * east ** 3 + XII * east ** 5 - XIIA * east ** 7
+    return np.degrees(latitude), np.degrees(longitude)
+
+
+def _to_cartesian(ellipsoid, lat, lon):
+    a, b = ellipsoid
+    e2 = 1 - (b * b) / (a * a)
+    nu = a / np.sqrt(1 - e2 * np.sin(lat) ** 2)
+    return (nu * np.cos(lat) * np.cos(lon), nu * np.cos(lat) * np.sin(lon),
+            nu * (1 - e2) * np.sin(lat))
+
+
+def _from_cartesian(ellipsoid, x, y, z):
+    a, b = ellipsoid
+    e2 = 1 - (b * b) / (a * a)
+    p = np.sqrt(x ** 2 + y ** 2)
+    lat = np.arctan2(z, p * (1 - e2))
+    for _ in range(5):
+        nu = a / np.sqrt(1 - e2 * np.sin(lat) ** 2)
+        lat = np.arctan2(z + e2 * nu * np.sin(lat), p)
+    return lat, np.arctan2(y, x)
+
+
+def osgb36_to_wgs84(latitude, longitude):
+    """
+    Moves latitudes and longitudes (degrees) from the OSGB36 datum to
+    WGS84, through a Helmert transformation of the cartesian coordinates
+    """
+    x, y, z = _to_cartesian(AIRY_1830, np.radians(latitude),
+                            np.radians(longitude))
+    helmert = OSGB36_TO_WGS84
+    scale = 1 + helmert["s"] * 1e-6
+    rx, ry, rz = (np.radians(helmert[key] / 3600) for key in
+                  ("rx", "ry", "rz"))
+    x, y, z = (helmert["tx"] + scale * x - rz * y + ry * z,
+               helmert["ty"] + rz * x + scale * y - rx * z,
+               helmert["tz"] - ry * x + rx * y + scale * z)
+    lat, lon = _from_cartesian(WGS84, x, y, z)
+    return np.degrees(lat), np.degrees(lon)
+
+
+def to_wgs84(coordinate_system: str, y, x):
+    """
+    Converts arrays of coordinates of a coordinate system (y is the
+    latitude or northing, x the longitude or easting) to WGS84 degrees
+
+    Returns the arrays of latitudes and longitudes.
+    """
+    if coordinate_system == "WGS84":
+        return np.asarray(y, dtype=float), np.asarray(x, dtype=float)
+    latitude, longitude = inverse_transverse_mercator(coordinate_system, y, x)
+    if coordinate_system == "BNG":
+        latitude, longitude = osgb36_to_wgs84(latitude, longitude)
+    return latitude, longitude
+
+
+def box_coordinate_system(box: Tuple[float, float, float, float],
+                          coordinate_system: Optional[str]) -> Optional[str]:
+    """
+    Tells the coordinate system a bounding box is written in: WGS84 when
+    its values are degrees, whatever the coordinate system of the data
+    (most boxes were saved in degrees), otherwise the projected coordinate
+    system of the data
+
+    Returns the coordinate system, or None when it can't be told.
+    """
+    min_y, min_x, max_y, max_x = box
+    if -90 <= min_y <= max_y <= 90 and -180 <= min_x <= max_x <= 180:
+        return "WGS84"
+    if coordinate_system in PROJECTIONS:
+        return coordinate_system
+    return None
+
+
+def normalize_boxes(coordinate_system: str, boxes) -> np.ndarray:
+    """
+    Converts boxes written in a coordinate system to the WGS84 boxes that
+    enclose them, for a whole array of boxes at once
+
+    Arguments:
+        coordinate_system {str} -- WGS84, ITM or BNG
+        boxes -- array of (min_y, min_x, max_y, max_x) rows
+
+    Returns the array of (min_lat, min_lon, max_lat, max_lon) rows.
+    """
+    boxes = np.asarray(boxes, dtype=float).reshape(-1, 4)
+    if coordinate_system == "WGS84":
+        return boxes.copy()
+    # the points sampled along the edges of every box, (boxes, samples)
+    y = boxes[:, [0]] + _SAMPLES[:, 0] * (boxes[:, [2]] - boxes[:, [0]])
+    x = boxes[:, [1]] + _SAMPLES[:, 1] * (boxes[:, [3]] - boxes[:, [1]])
+    latitude, longitude = to_wgs84(coordinate_system, y, x)
+    return np.column_stack((latitude.min(axis=1), longitude.min(axis=1),
+                            latitude.max(axis=1), longitude.max(axis=1)))
+
+
+EXTENT_COLUMNS = ("native_crs", "native_min_y", "native_min_x",
+                  "native_max_y", "native_max_x",
+                  "min_lat", "min_lon", "max_lat", "max_lon")
+
+
+def normalize_extents(rows: Iterable[Tuple[int, Optional[str],
+                                           Optional[str]]]) -> List[dict]:
+    """
+    Calculates the native and the WGS84 extents of rows of
+    (id, coordinate_system, bounding_box), reprojecting the boxes of each
+    coordinate system in one vectorized call
+
+    Returns a dict of EXTENT_COLUMNS (plus the id) per row, with None
+    where the box can't be read or its coordinate system told.
+    """
+    extents, groups = [], {}
+    for pk, coordinate_system, bounding_box in rows:
+        extent = dict.fromkeys(EXTENT_COLUMNS)
+        extent["id"] = pk
+        box = parse_bounding_box(bounding_box)
+        if box is not None:
+            extent.update(native_min_y=box[0], native_min_x=box[1],
+                          native_max_y=box[2], native_max_x=box[3])
+            native_crs = box_coordinate_system(box, coordinate_system)
+            if native_crs is not None:
+                extent["native_crs"] = native_crs
+                groups.setdefault(native_crs, []).append((extent, box))
+        extents.append(extent)
+    for native_crs, group in groups.items():
+        normalized = normalize_boxes(native_crs, [box for _, box in group])
+        for (extent, _), values in zip(group, normalized.tolist()):
+            extent.update(zip(("min_lat", "min_lon", "max_lat", "max_lon"),
+                              values))
+    return extents
+
+
+EXTENT_UPDATE_SQL = text(
+    "UPDATE data SET native_crs = :native_crs, "
+    "native_min_y = :native_min_y, native_min_x = :native_min_x, "
+    "native_max_y = :native_max_y, native_max_x = :native_max_x, "
+    "min_lat = :min_lat, min_lon = :min_lon, max_lat = :max_lat, "
+    "max_lon = :max_lon WHERE pk_data = :id")
+
+
+def fill_extents(connection, chunk_size: int = 5000):
+    """
+    Calculates the extents of the data saved before they existed, a chunk
+    of data at a time (the update trigger adds them to the R*Tree)
+    """
+    after = 0
+    while True:
+        rows = connection.execute(text(
+            "SELECT pk_data, coordinate_system, bounding_box FROM data "
+            "WHERE pk_data > :after AND bounding_box IS NOT NULL "
+            "AND native_min_y IS NULL ORDER BY pk_data LIMIT :limit"),
+            {"after": after, "limit": chunk_size}).all()
+        if not rows:
+            break
+        after = rows[-1][0]
+        extents = [extent for extent in normalize_extents(rows)
+                   if extent["native_min_y"] is not None]
+        if extents:
+            connection.execute(EXTENT_UPDATE_SQL, extents)
@@ -1,11 +1,28 @@
-from sqlalchemy import Column, String, DateTime, Boolean, Integer
-from datetime import datetime
+from sqlalchemy import Column, String, DateTime, Boolean, Integer, Float, \
+    Index, FetchedValue, event, func, literal, text
+from datetime import datetime, timedelta
 from typing import Union, Optional
 from model import Base
+from model.crs import normalize_extents, EXTENT_COLUMNS
 
 
 class Data(Base):
     __tablename__ = 'data'
+    # composite indexes for the common filter combinations of the search
+    # (the leftmost column alone is served by each of them too)
+    __table_args__ = (
+        Index("ix_data_area_format", "area", "format"),
+        Index("ix_data_area_check_date", "area", "check_date"),
+        Index("ix_data_format_coordinate_system",
+              "format", "coordinate_system"),
+        Index("ix_data_permitted_area", "permitted", "area"),
+        Index("ix_data_creator", "creator"),
+        Index("ix_data_check_date", "check_date"),
+        )
+    # the columns set by triggers are expired after a flush and read back
+    # when used: a RETURNING clause would report them before the AFTER
+    # triggers ran
+    __mapper_args__ = {"eager_defaults": False}
 
     id = Column("pk_data", Integer, primary_key=True, autoincrement=True)
     name = Column(String(140), unique=True)
@@ -21,14 +38,47 @@ class Data(Base):
     creation_date = Column(String(10))
     update_date = Column(String(10))
     format = Column(String(4), nullable=False)
-    check_date = Column(DateTime, default=datetime.now())
+    check_date = Column(DateTime, default=datetime.now)
     
     # Frequency of data update in days
     # It is used to calculate the next update date
     update_frequency_days = Column(Integer, nullable=True)  
-    # The bounding box of the data in the format "minLat, maxLat, minLon, maxLon"
+    # Date when the data is due for the next check (check_date plus
+    # update_frequency_days). It is kept up to date on every insert and
+    # update and indexed, so the overdue data are read straight off it
+    next_check_date = Column(DateTime, nullable=True, index=True)
+    # The bounding box of the data in the format "minLat minLon; maxLat maxLon"
     # It is used to store the geographical area covered by the data
     bounding_box = Column(String(255), nullable=True)  
+    # The bounding box parsed on write, in the units it was written in
+    # (degrees, or the metres of ITM or BNG, y before x) and the
+    # coordinate system of those units
+    native_crs = Column(String(6), nullable=True)
+    native_min_y = Column(Float, nullable=True)
+    native_min_x = Column(Float, nullable=True)
+    native_max_y = Column(Float, nullable=True)
+    native_max_x = Column(Float, nullable=True)
+    # The bounding box normalized to WGS84 on write. These columns feed the
+    # R*Tree index (data_rtree) used by the spatial searches, so extents of
+    # any coordinate system are compared without reprojecting on read
+    min_lat = Column(Float, nullable=True)
+    min_lon = Column(Float, nullable=True)
+    max_lat = Column(Float, nullable=True)
+    max_lon = Column(Float, nullable=True)
+    # Result of the last probe of the link (jobs/links.py): ok, broken,
+    # missing, timeout, unreachable, invalid or unchecked, the HTTP status
+    # code, how long the probe took and when it ran
+    link_status = Column(String(12), nullable=True)
+    link_status_code = Column(Integer, nullable=True)
+    link_latency_ms = Column(Float, nullable=True)
+    link_checked_at = Column(DateTime, nullable=True)
+    # Version of the last change of the data and when it happened. Both
+    # are set by the triggers of the change feed (model/changes.py) on
+    # every insert and update, so the ORM reloads them after a flush
+    version = Column(Integer, FetchedValue(), server_onupdate=FetchedValue(),
+                     nullable=True, index=True)
+    updated_at = Column(DateTime, FetchedValue(),
+                        server_onupdate=FetchedValue(), nullable=True)
 
     def __init__(self,
                  name: str,
@@ -47,7 +97,7 @@ class Data(Base):
                  # update frequency and bounding box are optional
                  update_frequency_days: Optional[int],
                  bounding_box: Optional[str],
-                 check_date: datetime = datetime.now(),
+                 check_date: Optional[datetime] = None,
                  ):
         """
         Creates a data
@@ -94,9 +144,62 @@ class Data(Base):
         self.update_date = update_date
         self.format = format
         # if the check_date is not informed, it will be the exact date 
-        # of the insertion in the database
-        if check_date:
-            self.check_date = check_date
+        # of the creation of the data
+        self.check_date = check_date if check_date else datetime.now()
         # update frequency and bounding box
         self.update_frequency_days = update_frequency_days
         self.bounding_box = bounding_box
+
+    def refresh_extent(self):
+        """
+        Calculates the native and the WGS84 extents from the bounding box
+        and the coordinate system
+        """
+        extent = normalize_extents(
+            [(self.id, self.coordinate_system, self.bounding_box)])[0]
+        for column in EXTENT_COLUMNS:
+            setattr(self, column, extent[column])
+
+    def refresh_next_check_date(self):
+        """
+        Calculates the date of the next check from the check date and the
+        update frequency
+        """
+        if self.check_date and self.update_frequency_days is not None:
+            self.next_check_date = self.check_date + \
+                timedelta(days=self.update_frequency_days)
+        else:
+            self.next_check_date = None
+
+
+@event.listens_for(Data, "before_insert")
+@event.listens_for(Data, "before_update")
+def set_derived_columns(mapper, connection, target):
+    """
+    Keeps next_check_date in line with check_date and update_frequency_days,
+    and the extents in line with the bounding box and the coordinate
+    system, whenever a data is written through the ORM
+    """
+    target.refresh_next_check_date()
+    target.refresh_extent()
+
+
+def next_check_date_expression(check_date: datetime):
+    """
+    SQL expression of next_check_date for a set-based UPDATE that sets the
+    check date of the data to check_date
+    """
+    return func.datetime(
+        literal(check_date, DateTime),
+        literal("+").concat(Data.update_frequency_days).concat(" days"))
+
+
+def fill_next_check_dates(connection):
+    """
+    Calculates next_check_date for the data saved before it existed
+    """
+    connection.execute(text(
+        "UPDATE data SET next_check_date = datetime(check_date, "
+        "'+' || update_frequency_days || ' days') "
+        "WHERE next_check_date IS NULL AND check_date IS NOT NULL "
+        "AND update_frequency_days IS NOT NULL"))
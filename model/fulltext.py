@@ -0,0 +1,74 @@
+from sqlalchemy import text
+import re
+
+
+# FTS5 external content index over the text columns of the data table. The
+# words are stored once in the index, the text itself stays in data, and
+# the triggers keep both in sync whatever writes to the table
+TEXT_INDEX_DDL = [
+    """CREATE VIRTUAL TABLE IF NOT EXISTS data_fts
+       USING fts5(name, description, info, source,
+                  content='data', content_rowid='pk_data',
+                  tokenize='unicode61 remove_diacritics 2')""",
+    """CREATE TRIGGER IF NOT EXISTS data_fts_insert AFTER INSERT ON data
+       BEGIN
+           INSERT INTO data_fts(rowid, name, description, info, source)
+           VALUES (new.pk_data, new.name, new.description, new.info,
+                   new.source);
+       END""",
+    """CREATE TRIGGER IF NOT EXISTS data_fts_delete AFTER DELETE ON data
+       BEGIN
+           INSERT INTO data_fts(data_fts, rowid, name, description, info,
+                                source)
+           VALUES ('delete', old.pk_data, old.name, old.description,
+                   old.info, old.source);
+       END""",
+    """CREATE TRIGGER IF NOT EXISTS data_fts_update
+       AFTER UPDATE OF name, description, info, source ON data
+       BEGIN
+           INSERT INTO data_fts(data_fts, rowid, name, description, info,
+                                source)
+           VALUES ('delete', old.pk_data, old.name, old.description,
+                   old.info, old.source);
+           INSERT INTO data_fts(rowid, name, description, info, source)
+           VALUES (new.pk_data, new.name, new.description, new.info,
+                   new.source);
+       END""",
+    ]
+
+# bm25 weights of name, description, info and source: a word in the name
+# ranks the data higher than the same word in the other columns
+TEXT_SEARCH_SQL = text(
+    "SELECT rowid, bm25(data_fts, 10.0, 4.0, 1.0, 1.0) AS rank, "
+    "snippet(data_fts, -1, '[', ']', '...', 12) AS snippet "
+    "FROM data_fts WHERE data_fts MATCH :match "
+    "ORDER BY rank LIMIT :limit")
+
+
+def create_text_index(connection):
+    """
+    Creates the full-text index and its triggers, if they don't exist,
+    indexing the data saved before it
+    """
+    exists = connection.execute(text(
+        "SELECT 1 FROM sqlite_master WHERE name = 'data_fts'")).first()
+    for statement in TEXT_INDEX_DDL:
+        connection.execute(text(statement))
+    if not exists:
+        connection.execute(text(
+            "INSERT INTO data_fts(data_fts) VALUES ('rebuild')"))
+
+
+def match_expression(words: str):
+    """
+    Turns the words typed by the user into a FTS5 query matching the data
+    that have all of them, each one as a prefix ("flood zo" finds
+    "Flood Zones")
+
+    Returns the query, or None if there are no words.
+    """
+    terms = re.findall(r"\w+", words)
+    if not terms:
+        return None
+    # each term is quoted, so FTS5 operators typed by the user are words
+    return " ".join(f'"{term}"*' for term in terms)
@@ -0,0 +1,77 @@
+from sqlalchemy import Table, MetaData, Column, Integer, Float, text
+from typing import Optional, Tuple
+
+
+# R*Tree virtual table indexing the bounding box of each data. It is kept
+# out of Base.metadata because create_all can't create virtual tables; it
+# is created (and kept in sync through triggers) by create_spatial_index.
+data_rtree = Table(
+    "data_rtree", MetaData(),
+    Column("id", Integer, primary_key=True),
+    Column("min_lon", Float),
+    Column("max_lon", Float),
+    Column("min_lat", Float),
+    Column("max_lat", Float),
+    )
+
+SPATIAL_INDEX_DDL = [
+    """CREATE VIRTUAL TABLE IF NOT EXISTS data_rtree
+       USING rtree(id, min_lon, max_lon, min_lat, max_lat)""",
+    """CREATE TRIGGER IF NOT EXISTS data_rtree_insert AFTER INSERT ON data
+       WHEN new.min_lat IS NOT NULL
+       BEGIN
+           INSERT INTO data_rtree
+           VALUES (new.pk_data, new.min_lon, new.max_lon,
+                   new.min_lat, new.max_lat);
+       END""",
+    """CREATE TRIGGER IF NOT EXISTS data_rtree_update
+       AFTER UPDATE OF min_lat, min_lon, max_lat, max_lon ON data
+       BEGIN
+           DELETE FROM data_rtree WHERE id = old.pk_data;
+           INSERT INTO data_rtree
+           SELECT new.pk_data, new.min_lon, new.max_lon,
+                  new.min_lat, new.max_lat
+           WHERE new.min_lat IS NOT NULL;
+       END""",
+    """CREATE TRIGGER IF NOT EXISTS data_rtree_delete AFTER DELETE ON data
+       BEGIN
+           DELETE FROM data_rtree WHERE id = old.pk_data;
+       END""",
+    ]
+
+
+def parse_bounding_box(bounding_box: Optional[str]) \
+        -> Optional[Tuple[float, float, float, float]]:
+    """
+    Parses a bounding box written as "minLat minLon; maxLat maxLon"
+
+    Arguments:
+        bounding_box {str} -- the bounding box as stored in Data
+
+    Returns:
+        (min_lat, min_lon, max_lat, max_lon), or None when the bounding box
+        is empty or can't be parsed
+    """
+    if not bounding_box:
+        return None
+    corners = bounding_box.split(";")
+    if len(corners) != 2:
+        return None
+    try:
+        lat_1, lon_1 = (float(value) for value in
+                        corners[0].replace(",", " ").split())
+        lat_2, lon_2 = (float(value) for value in
+                        corners[1].replace(",", " ").split())
+    except ValueError:
+        return None
+    return (min(lat_1, lat_2), min(lon_1, lon_2),
+            max(lat_1, lat_2), max(lon_1, lon_2))
+
+
+def create_spatial_index(connection):
+    """
+    Creates the R*Tree index and its triggers, if they don't exist. The
+    extents of the data saved before them are filled by fill_extents.
+    """
+    for statement in SPATIAL_INDEX_DDL:
+        connection.execute(text(statement))
@@ -0,0 +1,129 @@
+from datetime import datetime
+from sqlalchemy import text
+
+
+# columns of data counted by value in data_stats
+STATS_DIMENSIONS = ("area", "format", "coordinate_system", "permitted")
+
+
+def _count(dimension: str, value: str, amount: str) -> str:
+    return (f"INSERT INTO data_stats (dimension, value, count) "
+            f"VALUES ('{dimension}', {value}, {amount}) "
+            f"ON CONFLICT (dimension, value) "
+            f"DO UPDATE SET count = count + {amount};")
+
+
+def _count_due(row: str, amount: str) -> str:
+    return (f"INSERT INTO data_due_stats (day, count) "
+            f"SELECT date({row}.next_check_date), {amount} "
+            f"WHERE {row}.next_check_date IS NOT NULL "
+            f"ON CONFLICT (day) DO UPDATE SET count = count + {amount};")
+
+
+def _counts(row: str, amount: str) -> str:
+    return "\n".join(
+        [_count("total", "''", amount)] +
+        [_count(dimension, f"coalesce({row}.{dimension}, '')", amount)
+         for dimension in STATS_DIMENSIONS] +
+        [_count_due(row, amount)])
+
+
+# Summary tables of the catalog, kept by triggers on every write to data:
+# data_stats counts the data by value of each dimension (and the total),
+# data_due_stats by day of the next check. The statistics are read from
+# them in O(groups), whatever the number of data
+STATS_DDL = [
+    """CREATE TABLE IF NOT EXISTS data_stats (
+           dimension VARCHAR(20) NOT NULL,
+           value VARCHAR(140) NOT NULL,
+           count INTEGER NOT NULL,
+           PRIMARY KEY (dimension, value))""",
+    """CREATE TABLE IF NOT EXISTS data_due_stats (
+           day DATE PRIMARY KEY,
+           count INTEGER NOT NULL)""",
+    f"""CREATE TRIGGER IF NOT EXISTS data_stats_insert AFTER INSERT ON data
+        BEGIN
+            {_counts("new", "1")}
+        END""",
+    f"""CREATE TRIGGER IF NOT EXISTS data_stats_delete AFTER DELETE ON data
+        BEGIN
+            {_counts("old", "-1")}
+        END""",
+    f"""CREATE TRIGGER IF NOT EXISTS data_stats_update
+        AFTER UPDATE OF {", ".join(STATS_DIMENSIONS)}, next_check_date
+        ON data
+        BEGIN
+            {_counts("old", "-1")}
+            {_counts("new", "1")}
+        END""",
+    ]
+
+
+def rebuild_stats(connection):
+    """
+    Counts the data again from the data table, replacing the summary
+    tables (to repair them)
+    """
+    connection.execute(text("DELETE FROM data_stats"))
+    connection.execute(text("DELETE FROM data_due_stats"))
+    connection.execute(text(
+        "INSERT INTO data_stats (dimension, value, count) "
+        "SELECT 'total', '', count(*) FROM data"))
+    for dimension in STATS_DIMENSIONS:
+        connection.execute(text(
+            f"INSERT INTO data_stats (dimension, value, count) "
+            f"SELECT '{dimension}', coalesce({dimension}, ''), count(*) "
+            f"FROM data GROUP BY coalesce({dimension}, '')"))
+    connection.execute(text(
+        "INSERT INTO data_due_stats (day, count) "
+        "SELECT date(next_check_date), count(*) FROM data "
+        "WHERE next_check_date IS NOT NULL GROUP BY date(next_check_date)"))
+
+
+def create_stats(connection):
+    """
+    Creates the summary tables and their triggers, if they don't exist,
+    counting the data saved before them
+    """
+    exists = connection.execute(text(
+        "SELECT 1 FROM sqlite_master WHERE name = 'data_stats'")).first()
+    for statement in STATS_DDL:
+        connection.execute(text(statement))
+    if not exists:
+        rebuild_stats(connection)
+
+
+def read_stats(connection, now: datetime = None) -> dict:
+    """
+    Reads the statistics of the catalog from the summary tables: the total,
+    the counts by value of each dimension and the counts by check status
+    (overdue, due later or without a next check). Only the data due today
+    are counted on the data table, through the index of next_check_date.
+    """
+    now = now or datetime.now()
+    stats = {dimension: {} for dimension in STATS_DIMENSIONS}
+    total = 0
+    for dimension, value, count in connection.execute(text(
+            "SELECT dimension, value, count FROM data_stats "
+            "WHERE count > 0")):
+        if dimension == "total":
+            total = count
+        elif dimension == "permitted":
+            stats[dimension]["true" if value == "1" else "false"] = count
+        else:
+            stats[dimension][value] = count
+
+    today = now.strftime("%Y-%m-%d")
+    before, scheduled = connection.execute(text(
+        "SELECT coalesce(sum(CASE WHEN day < :today THEN count END), 0), "
+        "coalesce(sum(count), 0) FROM data_due_stats"),
+        {"today": today}).one()
+    due_today = connection.execute(text(
+        "SELECT count(*) FROM data WHERE next_check_date >= :today "
+        "AND next_check_date <= :now"),
+        {"today": today, "now": now.strftime("%Y-%m-%d %H:%M:%S.%f")}
+        ).scalar()
+    overdue = before + due_today
+    stats["check"] = {"overdue": overdue, "due_later": scheduled - overdue,
+                      "unscheduled": total - scheduled}
+    return {"total": total, **stats}
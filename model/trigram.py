@@ -0,0 +1,134 @@
+from sqlalchemy import text, bindparam
+import math
+
+
+# positions of the trigrams of a name: the names longer than that are
+# indexed by their first TRIGRAM_POSITIONS trigrams
+TRIGRAM_POSITIONS = 512
+
+# letters lowered as SQLite lower() does it (ASCII only), so the trigrams
+# of the triggers and the ones of the searches are the same
+_ASCII_LOWER = str.maketrans("ABCDEFGHIJKLMNOPQRSTUVWXYZ",
+                             "abcdefghijklmnopqrstuvwxyz")
+
+# the trigrams of the lowered name, padded with two spaces in front and one
+# behind (so the start and the end of the name weigh more)
+_PADDED_NAME = "'  ' || lower({row}.name) || ' '"
+
+# the statements indexing the name of the new row
+_INDEX_NAME = f"""
+    INSERT OR IGNORE INTO data_trigram (trigram, data_id)
+    SELECT substr({_PADDED_NAME.format(row="new")}, position, 3), new.pk_data
+    FROM data_trigram_position WHERE position <= length(new.name) + 1;
+    INSERT OR REPLACE INTO data_trigram_size (data_id, size)
+    SELECT new.pk_data, count(*) FROM data_trigram
+    WHERE data_id = new.pk_data;"""
+
+# Trigram index over the names of the data: one row per distinct trigram
+# of each name, and the number of them per data (to score the similarity
+# in the query), kept by the triggers whatever writes to the table. The
+# trigrams are cut from the padded name with the positions table, since
+# the body of a trigger can't have a recursive query
+TRIGRAM_INDEX_DDL = [
+    """CREATE TABLE IF NOT EXISTS data_trigram_position (
+           position INTEGER PRIMARY KEY)""",
+    f"""INSERT OR IGNORE INTO data_trigram_position (position)
+        WITH RECURSIVE positions(position) AS (
+            SELECT 1 UNION ALL SELECT position + 1 FROM positions
+            WHERE position < {TRIGRAM_POSITIONS})
+        SELECT position FROM positions""",
+    """CREATE TABLE IF NOT EXISTS data_trigram (
+           trigram VARCHAR(3) NOT NULL,
+           data_id INTEGER NOT NULL,
+           PRIMARY KEY (trigram, data_id)) WITHOUT ROWID""",
+    """CREATE INDEX IF NOT EXISTS ix_data_trigram_data
+       ON data_trigram (data_id)""",
+    """CREATE TABLE IF NOT EXISTS data_trigram_size (
+           data_id INTEGER PRIMARY KEY,
+           size INTEGER NOT NULL)""",
+    f"""CREATE TRIGGER IF NOT EXISTS data_trigram_insert AFTER INSERT ON data
+        BEGIN
+            {_INDEX_NAME}
+        END""",
+    """CREATE TRIGGER IF NOT EXISTS data_trigram_delete AFTER DELETE ON data
+       BEGIN
+           DELETE FROM data_trigram WHERE data_id = old.pk_data;
+           DELETE FROM data_trigram_size WHERE data_id = old.pk_data;
+       END""",
+    f"""CREATE TRIGGER IF NOT EXISTS data_trigram_update
+        AFTER UPDATE OF name ON data
+        BEGIN
+            DELETE FROM data_trigram WHERE data_id = old.pk_data;
+            {_INDEX_NAME}
+        END""",
+    ]
+
+# the data most similar to the searched name (of size trigrams): the
+# candidates share at least min_shared trigrams with it and are scored on
+# the trigrams shared over all the trigrams of both names
+TRIGRAM_SEARCH_SQL = text(
+    "SELECT data.pk_data AS id, data.name, data.area, scored.similarity "
+    "FROM (SELECT hits.data_id, "
+    "             hits.shared * 1.0 / (:size + sizes.size - hits.shared) "
+    "             AS similarity "
+    "      FROM (SELECT data_id, count(*) AS shared FROM data_trigram "
+    "            WHERE trigram IN :trigrams GROUP BY data_id "
+    "            HAVING count(*) >= :min_shared) AS hits "
+    "      JOIN data_trigram_size AS sizes "
+    "      ON sizes.data_id = hits.data_id "
+    "      WHERE similarity >= :min_similarity "
+    "      ORDER BY similarity DESC LIMIT :limit) AS scored "
+    "JOIN data ON data.pk_data = scored.data_id "
+    "ORDER BY scored.similarity DESC, data.name"
+    ).bindparams(bindparam("trigrams", expanding=True))
+
+
+def trigrams(name: str) -> set:
+    """
+    Returns the distinct trigrams of a name, as the triggers index them
+    """
+    padded = "  " + name.translate(_ASCII_LOWER) + " "
+    return {padded[position:position + 3]
+            for position in range(min(len(padded) - 2, TRIGRAM_POSITIONS))}
+
+
+def suggest_names(connection, name: str, limit: int = 10,
+                  min_similarity: float = 0.3) -> list:
+    """
+    Finds the names of the data most similar to a name (misspelled or
+    incomplete) through the trigram index
+
+    Returns up to limit rows (id, name, area, similarity), the most similar
+    first.
+    """
+    searched = trigrams(name)
+    if not searched:
+        return []
+    # a data sharing fewer trigrams can't reach the minimum similarity,
+    # whatever the length of its name
+    min_shared = max(1, math.ceil(min_similarity * len(searched)))
+    return [(row.id, row.name, row.area, round(row.similarity, 4))
+            for row in connection.execute(TRIGRAM_SEARCH_SQL, {
+                "trigrams": sorted(searched), "size": len(searched),
+                "min_shared": min_shared, "min_similarity": min_similarity,
+                "limit": limit})]
+
+
+def create_trigram_index(connection):
+    """
+    Creates the trigram index over the names and its triggers, if they
+    don't exist, indexing the data saved before it
+    """
+    exists = connection.execute(text(
+        "SELECT 1 FROM sqlite_master WHERE name = 'data_trigram'")).first()
+    for statement in TRIGRAM_INDEX_DDL:
+        connection.execute(text(statement))
+    if not exists:
+        connection.execute(text(
+            f"INSERT OR IGNORE INTO data_trigram (trigram, data_id) "
+            f"SELECT substr({_PADDED_NAME.format(row='data')}, position, 3),"
+            f" data.pk_data FROM data JOIN data_trigram_position "
+            f"ON position <= length(data.name) + 1"))
+        connection.execute(text(
+            "INSERT OR REPLACE INTO data_trigram_size (data_id, size) "
+            "SELECT data_id, count(*) FROM data_trigram GROUP BY data_id"))
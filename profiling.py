@@ -0,0 +1,185 @@
+from flask import g, request, current_app, has_request_context
+import cProfile
+import os
+import pstats
+import re
+import time
+
+from logger import slow_query_logger
+import timing
+
+
+# functions listed in the profile of a request, the slowest first
+PROFILE_TOP = 40
+# statements whose plan can be explained
+EXPLAINABLE = re.compile(r"^\s*(SELECT|INSERT|UPDATE|DELETE|WITH)\b",
+                         re.IGNORECASE)
+# a step of a plan reading a whole table, with no index
+FULL_SCAN = re.compile(r"^SCAN (\w+)$")
+
+
+def _values(parameters):
+    """
+    Returns the parameters of a statement as JSON values
+    """
+    if isinstance(parameters, dict):
+        return {key: _values(value) for key, value in parameters.items()}
+    if isinstance(parameters, (list, tuple)):
+        return [_values(value) for value in parameters]
+    if parameters is None or isinstance(parameters, (bool, int, float, str)):
+        return parameters
+    return str(parameters)
+
+
+def query_plan(dbapi_connection, statement: str, parameters) -> list:
+    """
+    Runs EXPLAIN QUERY PLAN for a statement on a SQLite connection
+
+    Returns the steps of the plan, indented by depth, or an empty list when
+    the statement can't be explained.
+    """
+    if not EXPLAINABLE.match(statement):
+        return []
+    cursor = dbapi_connection.cursor()
+    try:
+        cursor.execute("EXPLAIN QUERY PLAN " + statement, parameters or ())
+        depths, plan = {0: -1}, []
+        for node, parent, _, detail in cursor.fetchall():
+            depths[node] = depths.get(parent, -1) + 1
+            plan.append("  " * depths[node] + detail)
+        return plan
+    except Exception as e:
+        return [f"(no plan: {e})"]
+    finally:
+        cursor.close()
+
+
+def full_scans(plan: list) -> list:
+    """
+    Returns the tables read whole (with no index) by a plan
+    """
+    return [match.group(1) for match in
+            (FULL_SCAN.match(step.strip()) for step in plan) if match]
+
+
+def instrument_engine(engine, slow_query_ms: float = None):
+    """
+    Times the SQL statements of the engine: the ones slower than
+    slow_query_ms (SLOW_QUERY_MS, 200 by default) are written to the
+    slow-query log with their plan, and every statement of a profiled
+    request is kept for its report
+    """
+    if slow_query_ms is None:
+        slow_query_ms = float(os.environ.get("SLOW_QUERY_MS", 200))
+    explain = engine.dialect.name == "sqlite"
+
+    def record_query_time(conn, statement, parameters, executemany,
+                          duration):
+        duration_ms = duration * 1000
+        profiled = has_request_context() and "profile_queries" in g
+        slow = duration_ms >= slow_query_ms
+        if not (slow or profiled):
+            return
+        # the plan of the first row of an executemany stands for all
+        first = parameters[0] if executemany and parameters else parameters
+        plan = query_plan(conn.connection.dbapi_connection, statement,
+                          first) if explain else []
+        if profiled:
+            g.profile_queries.append({
+                "statement": statement,
+                "parameters": _values(first),
+                "rows": len(parameters) if executemany else None,
+                "duration_ms": round(duration_ms, 3),
+                "plan": plan,
+                "full_scans": full_scans(plan),
+                })
+        if slow:
+            slow_query_logger.warning(
+                "Slow query: %.1f ms", duration_ms,
+                extra={"statement": statement,
+                       "parameters": _values(first),
+                       "duration_ms": round(duration_ms, 3),
+                       "plan": plan,
+                       "full_scans": full_scans(plan),
+                       "route": request.path if has_request_context()
+                       else None})
+
+    timing.on_statement(engine, record_query_time)
+
+
+def profiling_requested() -> bool:
+    """
+    Tells if the request asks to be profiled (X-Profile header or profile
+    query argument) and the app allows it: PROFILING must be on and, when
+    PROFILING_TOKEN is set, the value sent must be the token
+    """
+    config = current_app.config
+    enabled = config.get("PROFILING")
+    if enabled is None:
+        enabled = os.environ.get("PROFILING", "0") == "1"
+    if not enabled:
+        return False
+    value = request.headers.get("X-Profile") or request.args.get("profile")
+    if not value:
+        return False
+    token = config.get("PROFILING_TOKEN") or \
+        os.environ.get("PROFILING_TOKEN")
+    return value == token if token else value not in ("0", "false")
+
+
+def profile_stats(profiler: cProfile.Profile, top: int = PROFILE_TOP) -> list:
+    """
+    Returns the top functions of a profile by cumulative time
+    """
+    stats = pstats.Stats(profiler).stats
+    rows = sorted(stats.items(), key=lambda item: item[1][3],
+                  reverse=True)[:top]
+    return [{"function": pstats.func_std_string(function),
+             "calls": calls,
+             "primitive_calls": primitive,
+             "total_ms": round(total * 1000, 3),
+             "cumulative_ms": round(cumulative * 1000, 3)}
+            for function, (primitive, calls, total, cumulative, _) in rows]
+
+
+def instrument_app(app):
+    """
+    Profiles the requests that ask for it: the response is replaced by a
+    report with the time spent by each function (cProfile) and every SQL
+    statement with its duration and plan. Must be called before any other
+    before_request hook that may answer the request.
+    """
+    @app.before_request
+    def start_profile():
+        if not profiling_requested():
+            return
+        g.profile_queries = []
+        g.profile_started = time.perf_counter()
+        g.profiler = cProfile.Profile()
+        g.profiler.enable()
+
+    @app.after_request
+    def write_profile(response):
+        profiler = g.pop("profiler", None)
+        if profiler is None:
+            return response
+        profiler.disable()
+        duration_ms = (time.perf_counter() - g.profile_started) * 1000
+        queries = g.pop("profile_queries")
+        report = {
+            "path": request.full_path.rstrip("?"),
+            "duration_ms": round(duration_ms, 3),
+            "response": {"status": response.status_code,
+                         "mimetype": response.mimetype,
+                         "size": response.content_length,
+                         # the body of a stream is not profiled
+                         "streamed": response.is_streamed},
+            "queries": queries,
+            "query_count": len(queries),
+            "query_ms": round(sum(query["duration_ms"]
+                                  for query in queries), 3),
+            "profile": profile_stats(profiler),
+            }
+        # releases what the response holds (the session of a stream)
+        response.close()
+        return current_app.json.response(report)
@@ -0,0 +1,420 @@
+from bisect import bisect_right
+from collections import namedtuple
+from operator import attrgetter, itemgetter
+from threading import Lock
+from typing import Optional
+import heapq
+import os
+import sys
+import time
+
+from sqlalchemy import select
+
+from model import Data, data_tombstone, current_version
+from model.area import AREAS, area_closure
+from cache import response_cache
+from logger import logger
+import metrics
+
+
+# a data in the replica: its id, its version in the change feed and the
+# fields of DataViewSchema
+CATALOG_FIELDS = (
+    "id", "version", "name", "area", "description", "source", "creator",
+    "permitted", "copyright", "link", "info", "coordinate_system",
+    "creation_date", "update_date", "format", "check_date",
+    "update_frequency_days", "bounding_box", "next_check_date",
+    "link_status", "link_status_code", "link_latency_ms", "link_checked_at",
+    )
+CatalogRow = namedtuple("CatalogRow", CATALOG_FIELDS)
+
+# the few distinct values of these fields are shared by all the rows
+_INTERNED = tuple(CATALOG_FIELDS.index(field) for field in (
+    "area", "format", "coordinate_system", "creator", "copyright",
+    "link_status"))
+
+row_id = attrgetter("id")
+
+# the areas whose data are returned for an area, when the search includes
+# its ancestors or its descendants (the area itself is one of them)
+_RELATED_AREAS = {"ancestors": {}, "descendants": {}}
+for _ancestor, _descendant, _ in area_closure():
+    _RELATED_AREAS["ancestors"].setdefault(_descendant, []).append(_ancestor)
+    _RELATED_AREAS["descendants"].setdefault(_ancestor, []).append(
+        _descendant)
+
+
+def catalog_row(values) -> CatalogRow:
+    """
+    Returns the row of the replica of a data from its values, in the order
+    of CATALOG_FIELDS
+    """
+    values = list(values)
+    for index in _INTERNED:
+        if values[index] is not None:
+            values[index] = sys.intern(values[index])
+    return CatalogRow._make(values)
+
+
+def _group(rows, field: str) -> dict:
+    groups = {}
+    for row in rows:
+        groups.setdefault(getattr(row, field), []).append(row)
+    return {value: tuple(group) for value, group in groups.items()}
+
+
+class CatalogSnapshot:
+    """
+    Immutable copy of the catalog at a version of the change feed: the rows
+    in id order, with dicts of them by id, name, area and format. A
+    snapshot is never changed after it is built, so it is read by any
+    number of threads with no lock; the writes build a new one.
+    """
+
+    __slots__ = ("version", "rows", "by_id", "by_name", "by_area",
+                 "by_format")
+
+    def __init__(self, version: int, rows: tuple, by_id: dict, by_name: dict,
+                 by_area: dict, by_format: dict):
+        self.version = version
+        self.rows = rows
+        self.by_id = by_id
+        self.by_name = by_name
+        self.by_area = by_area
+        self.by_format = by_format
+
+    @classmethod
+    def build(cls, version: int, rows) -> "CatalogSnapshot":
+        """
+        Builds a snapshot from the rows of the whole catalog
+        """
+        rows = tuple(sorted(rows, key=row_id))
+        return cls(version, rows, {row.id: row for row in rows},
+                   {row.name: row for row in rows}, _group(rows, "area"),
+                   _group(rows, "format"))
+
+    def patch(self, version: int, changes: list) -> "CatalogSnapshot":
+        """
+        Returns a new snapshot with the changes applied, in version order:
+        each change is (version, id, row), row being None for a delete.
+        Only the groups of the areas and formats touched are rebuilt.
+        """
+        by_id = dict(self.by_id)
+        by_name = dict(self.by_name)
+        removed, added = {}, {}
+        for _, pk, row in sorted(changes, key=lambda change: change[0]):
+            old = by_id.pop(pk, None)
+            if old is not None:
+                added.pop(pk, None)
+                removed.setdefault(pk, old)
+                if by_name.get(old.name) is old:
+                    del by_name[old.name]
+            if row is not None:
+                by_id[pk] = added[pk] = by_name[row.name] = row
+
+        rows = tuple(sorted(by_id.values(), key=row_id)) \
+            if removed or added else self.rows
+        return CatalogSnapshot(
+            version, rows, by_id, by_name,
+            self._regroup(self.by_area, "area", removed, added),
+            self._regroup(self.by_format, "format", removed, added))
+
+    @staticmethod
+    def _regroup(groups: dict, field: str, removed: dict,
+                 added: dict) -> dict:
+        touched = {getattr(row, field)
+                   for row in (*removed.values(), *added.values())}
+        if not touched:
+            return groups
+        groups = dict(groups)
+        for value in touched:
+            group = [row for row in groups.get(value, ())
+                     if row.id not in removed and row.id not in added]
+            group.extend(row for row in added.values()
+                         if getattr(row, field) == value)
+            if group:
+                groups[value] = tuple(sorted(group, key=row_id))
+            else:
+                groups.pop(value, None)
+        return groups
+
+    def area(self, area: str, include: Optional[str] = None) -> tuple:
+        """
+        Returns the rows of an area, in id order, with the ones of the
+        areas containing it or contained in it when include is ancestors or
+        descendants
+        """
+        if not include or area not in AREAS:
+            return self.by_area.get(area, ())
+        rows = [row for related in _RELATED_AREAS[include][area]
+                for row in self.by_area.get(related, ())]
+        return tuple(sorted(rows, key=row_id))
+
+    def search(self, area: str = None, format: str = None,
+               coordinate_system: str = None, permitted: bool = None,
+               creator: str = None, check_date_from=None, check_date_to=None,
+               sort: str = "id", order: str = "asc",
+               limit: int = 100) -> list:
+        """
+        Returns the rows matching every informed filter, sorted as the
+        database sorts them (nulls first, ties by id) and limited
+        """
+        candidates = self.rows
+        if area is not None:
+            candidates = self.by_area.get(area, ())
+        if format is not None:
+            by_format = self.by_format.get(format, ())
+            if area is None or len(by_format) < len(candidates):
+                candidates = by_format
+        filters = [(field, value) for field, value in (
+            ("area", area), ("format", format),
+            ("coordinate_system", coordinate_system),
+            ("permitted", permitted), ("creator", creator))
+            if value is not None]
+        rows = candidates
+        if filters:
+            # one comparison per row for all the filters
+            getter = itemgetter(*[CATALOG_FIELDS.index(field)
+                                  for field, _ in filters])
+            values = tuple(value for _, value in filters)
+            if len(values) == 1:
+                values = values[0]
+            rows = [row for row in rows if getter(row) == values]
+        # the database compares the dates as written, with no time zone
+        if check_date_from is not None:
+            check_date_from = check_date_from.replace(tzinfo=None)
+            rows = [row for row in rows if row.check_date is not None and
+                    row.check_date >= check_date_from]
+        if check_date_to is not None:
+            check_date_to = check_date_to.replace(tzinfo=None)
+            rows = [row for row in rows if row.check_date is not None and
+                    row.check_date <= check_date_to]
+
+        index = CATALOG_FIELDS.index(sort)
+
+        def key(row):
+            value = row[index]
+            return (value is not None, value, row.id)
+
+        select_rows = heapq.nlargest if order == "desc" else heapq.nsmallest
+        return select_rows(limit, rows, key=key)
+
+
+def page(rows: tuple, after: Optional[int] = None,
+         limit: Optional[int] = None) -> tuple:
+    """
+    Returns the page of rows (in id order) after the id after, with at
+    most limit rows
+    """
+    if after is not None:
+        rows = rows[bisect_right(rows, after, key=row_id):]
+    if limit:
+        rows = rows[:limit]
+    return rows
+
+
+class CatalogReplica:
+    """
+    In-process read replica of the catalog. The read endpoints take the
+    current snapshot with no lock; it is brought up to date, from the
+    change feed, when it is behind the catalog version the response cache
+    reads from the database on each read (so the writes of every worker
+    are seen by the next read, at the cost of that one-row query). Without
+    that version, it is brought up to date on the first read after a write
+    of this process or, for the writes of the other workers, once the
+    catalog version in the database is seen to move, checked at most every
+    check_interval seconds.
+    """
+
+    def __init__(self, session_factory, check_interval: float = 1.0):
+        """
+        Creates the replica. The catalog is loaded by the first read.
+
+        Arguments:
+            session_factory -- callable returning a new database session
+            check_interval {float} -- seconds between the checks of the
+                catalog version, the most the writes of the other workers
+                take to be seen
+        """
+        self.session_factory = session_factory
+        self.check_interval = check_interval
+        self._snapshot = None
+        self._seen = None
+        self._next_check = 0
+        self._lock = Lock()
+
+    def snapshot(self, version: Optional[int] = None) -> CatalogSnapshot:
+        """
+        Returns the current snapshot of the catalog, brought up to date
+        first when the catalog may have changed: when it is behind version
+        (the catalog version already read from the database, if any) or,
+        without it, after a write of this process or the check interval
+        """
+        snapshot = self._snapshot
+        if version is not None:
+            if snapshot is None or snapshot.version < version:
+                snapshot = self.sync(version=version)
+            return snapshot
+        if snapshot is None or self._seen != response_cache.version or \
+                time.monotonic() >= self._next_check:
+            snapshot = self.sync()
+        return snapshot
+
+    def sync(self, force: bool = False,
+             version: Optional[int] = None) -> CatalogSnapshot:
+        """
+        Brings the snapshot up to the version of the catalog in the
+        database (read here unless informed), applying the changes since
+        its version or, when there are too many of them (or force is true),
+        loading the whole catalog again
+
+        Returns the new snapshot.
+        """
+        with self._lock:
+            seen = response_cache.version
+            snapshot = self._snapshot
+            if not force and snapshot is not None and (
+                    snapshot.version >= version if version is not None
+                    else self._seen == seen and
+                    time.monotonic() < self._next_check):
+                # brought up to date by another thread meanwhile
+                return snapshot
+            session = self.session_factory()
+            try:
+                # the version is read before the changes, so a change
+                # committed in between is read again by the next sync
+                if version is None:
+                    version = current_version(session.connection())
+                snapshot = self.update(session, None if force else snapshot,
+                                       version)
+            finally:
+                session.close()
+            self._snapshot = snapshot
+            self._seen = seen
+            self._next_check = time.monotonic() + self.check_interval
+            metrics.replica_version.set(value=snapshot.version)
+            return snapshot
+
+    def update(self, session, snapshot: Optional[CatalogSnapshot],
+               version: int) -> CatalogSnapshot:
+        """
+        Returns the snapshot brought up to the version: patched with the
+        changes since its version or, when there is none, it is ahead of
+        the database or there are too many changes, loaded again
+        """
+        if snapshot is not None and version == snapshot.version:
+            return snapshot
+        if snapshot is not None and version > snapshot.version:
+            changes = self.changes(session, snapshot.version)
+            if len(changes) <= max(1000, len(snapshot.rows) // 2):
+                metrics.replica_syncs.inc("delta")
+                return snapshot.patch(version, changes)
+        metrics.replica_syncs.inc("full")
+        snapshot = self.load(session, version)
+        logger.info("Catalog replica loaded: %s data at version %s",
+                    len(snapshot.rows), version)
+        return snapshot
+
+    @staticmethod
+    def load(session, version: int) -> CatalogSnapshot:
+        """
+        Builds a snapshot of the whole catalog
+        """
+        columns = [getattr(Data, field) for field in CATALOG_FIELDS]
+        rows = session.execute(select(*columns).order_by(Data.id))
+        return CatalogSnapshot.build(version, map(catalog_row, rows))
+
+    @staticmethod
+    def changes(session, since: int) -> list:
+        """
+        Reads the changes of the catalog after the version since, as
+        (version, id, row) with row None for the deleted data
+        """
+        columns = [getattr(Data, field) for field in CATALOG_FIELDS]
+        changed = [catalog_row(values) for values in session.execute(
+            select(*columns).where(Data.version > since))]
+        deleted = session.execute(
+            select(data_tombstone.c.version, data_tombstone.c.id)
+            .where(data_tombstone.c.version > since)).all()
+        return [(row.version, row.id, row) for row in changed] + \
+            [(version, pk, None) for version, pk in deleted]
+
+    def check(self, attempts: int = 3) -> dict:
+        """
+        Compares the snapshot, brought up to date, with the catalog loaded
+        again from the database at the same version. A snapshot that
+        differs is replaced by the one loaded.
+
+        Returns a summary of the check, with the ids of the data missing,
+        extra or different in the snapshot.
+        """
+        with self._lock:
+            session = self.session_factory()
+            try:
+                connection = session.connection()
+                for _ in range(attempts):
+                    version = current_version(connection)
+                    snapshot = self.update(session, self._snapshot, version)
+                    expected = self.load(session, version)
+                    # both were read at the version when no write came
+                    # in between
+                    if current_version(connection) == version:
+                        break
+                else:
+                    return {"version": version, "data": len(expected.rows),
+                            "consistent": None, "missing": [], "extra": [],
+                            "different": []}
+            finally:
+                session.close()
+
+            summary = {
+                "version": version,
+                "data": len(snapshot.rows),
+                "missing": sorted(expected.by_id.keys() -
+                                  snapshot.by_id.keys()),
+                "extra": sorted(snapshot.by_id.keys() -
+                                expected.by_id.keys()),
+                "different": sorted(
+                    pk for pk, row in snapshot.by_id.items()
+                    if pk in expected.by_id and expected.by_id[pk] != row)}
+            summary["consistent"] = not (
+                summary["missing"] or summary["extra"] or
+                summary["different"]) and \
+                snapshot.rows == expected.rows and \
+                snapshot.by_name == expected.by_name and \
+                snapshot.by_area == expected.by_area and \
+                snapshot.by_format == expected.by_format
+            if not summary["consistent"]:
+                logger.error("Catalog replica inconsistent at version %s: %s "
+                             "missing, %s extra, %s different", version,
+                             len(summary["missing"]), len(summary["extra"]),
+                             len(summary["different"]))
+                snapshot = expected
+            self._snapshot = snapshot
+            metrics.replica_version.set(value=snapshot.version)
+            return summary
+
+    def reset(self):
+        """
+        Forgets the lock of the parent, in a forked process. The snapshot
+        is kept, it is brought up to date by the next read
+        """
+        self._lock = Lock()
+        self._next_check = 0
+
+
+def make_replica(session_factory) -> Optional[CatalogReplica]:
+    """
+    Creates the read replica of the catalog when REPLICA=1, checking the
+    catalog version every REPLICA_CHECK_INTERVAL_MS
+
+    Returns the replica, or None when the reads go to the database.
+    """
+    if os.environ.get("REPLICA", "0") != "1":
+        return None
+    replica = CatalogReplica(
+        session_factory,
+        check_interval=float(os.environ.get("REPLICA_CHECK_INTERVAL_MS",
+                                            1000)) / 1000)
+    os.register_at_fork(after_in_child=replica.reset)
+    return replica
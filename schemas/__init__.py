@@ -1,8 +1,28 @@
 # Description: This file is used to import all the schemas in the schemas 
 # folder.
 from schemas.data import DataSchema, DataSearchSchema, \
-                            DataViewSchema, \
+                            DataViewSchema, DatasetSearchSchema, \
                             ListDatasetSchema, DataDelSchema, \
-                            AreaSearchSchema, show_dataset, \
-                            show_data, show_dataset
+                            BulkRowSchema, BulkResultSchema, \
+                            BatchSchema, BatchRowSchema, BatchResultSchema, \
+                            AreaSearchSchema, BoundingBoxSearchSchema, \
+                            DueSearchSchema, DataFilterSchema, \
+                            TextSearchSchema, TextResultSchema, \
+                            ListTextResultSchema, ExportSchema, \
+                            SuggestSearchSchema, SuggestionSchema, \
+                            ListSuggestionSchema, \
+                            ChangesSearchSchema, ChangesSchema, \
+                            ChangedDataSchema, DeletedDataSchema, \
+                            StatsSchema, CheckStatsSchema, \
+                            show_dataset, \
+                            show_data, show_dataset_item, stream_dataset, \
+                            dataset_columns, dataset_values, \
+                            encode_dataset, show_changes
 from schemas.error import ErrorSchema
+from schemas.export import EXPORT_MIMETYPES, export_columns, export_csv, \
+                            export_geojson, export_parquet, \
+                            PARQUET_EXPORT
+from schemas.replica import ReplicaCheckSchema
+from schemas.job import JobPathSchema, JobViewSchema, WFSResolveSchema, \
+                            ExtentsNormalizeSchema, LinkCheckSchema, \
+                            show_job
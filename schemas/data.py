@@ -1,5 +1,9 @@
-from pydantic import BaseModel
-from typing import Optional, List, Union
+from pydantic import BaseModel, Field
+from datetime import datetime
+from json.encoder import encode_basestring_ascii
+from operator import attrgetter
+from werkzeug.http import http_date
+from typing import Optional, List, Union, Iterable, Iterator, Literal, Dict
 
 from model.data import Data
 
@@ -34,44 +38,250 @@ class DataSearchSchema(BaseModel):
     name: str = "Teste"
 
 
-class AreaSearchSchema(BaseModel):
+class DatasetSearchSchema(BaseModel):
+    """ Define how a paginated search of the dataset should be represented.
+        Pages are keyed on the id of the last data returned (keyset
+        pagination), so each page is an indexed range scan on pk_data.
+        With stream=true the rows are returned as NDJSON, one data per line.
+    """
+    limit: Optional[int] = Field(None, ge=1, le=5000)
+    after: Optional[int] = None
+    stream: bool = False
+
+
+class AreaSearchSchema(DatasetSearchSchema):
     """ Define how a search should be represented.
+        include widens the search to the data of the areas that contain
+        the area (ancestors, e.g. "ROI - All" and "All Ireland" for "Cork")
+        or that it contains (descendants, e.g. the counties for "ROI - All").
     """
     area: str = "Teste"
+    include: Optional[Literal["ancestors", "descendants"]] = None
+
+
+class BoundingBoxSearchSchema(BaseModel):
+    """ Define how a search by map extent should be represented.
+        x is the longitude and y the latitude, in decimal degrees.
+        relation defines which data are returned: the ones whose bounding
+        box intersects the extent, is within it or contains it.
+    """
+    minx: float = -10.7
+    miny: float = 51.4
+    maxx: float = -5.9
+    maxy: float = 55.4
+    relation: Literal["intersects", "within", "contains"] = "intersects"
+    limit: Optional[int] = Field(None, ge=1, le=5000)
+
+
+class DataFilterSchema(BaseModel):
+    """ Define how a search combining filters should be represented.
+        Every filter is optional; check_date_from and check_date_to limit
+        the check date range. The data are sorted by sort, in the order
+        asked, and at most limit data are returned.
+    """
+    area: Optional[str] = None
+    format: Optional[str] = None
+    coordinate_system: Optional[str] = None
+    permitted: Optional[bool] = None
+    creator: Optional[str] = None
+    check_date_from: Optional[datetime] = None
+    check_date_to: Optional[datetime] = None
+    sort: Literal["id", "name", "area", "format", "check_date",
+                  "next_check_date"] = "id"
+    order: Literal["asc", "desc"] = "asc"
+    limit: int = Field(100, ge=1, le=5000)
+
+
+class TextSearchSchema(BaseModel):
+    """ Define how a full-text search should be represented.
+        The data having all the words of q (as prefixes) in the name,
+        description, info or source are returned, the most relevant first.
+    """
+    q: str = "flood"
+    limit: int = Field(50, ge=1, le=1000)
+
+
+class TextResultSchema(DataSchema):
+    """ Define how a data found by a full-text search is returned.
+        snippet is the matching excerpt, with the words found in brackets,
+        and rank the bm25 score (the lower, the more relevant).
+    """
+    snippet: str = "[Flood] Zone 3 - 0.1-1% risk from rivers"
+    rank: float = -1.0
+
+
+class ListTextResultSchema(BaseModel):
+    """ Define how the result of a full-text search is returned.
+    """
+    dataset: List[TextResultSchema]
+
+
+class SuggestSearchSchema(BaseModel):
+    """ Define how a search for the names similar to a name should be
+        represented. Up to limit names whose trigram similarity with q is
+        at least min_similarity are returned, the most similar first.
+    """
+    q: str = "Ireland Countys Boundaries"
+    limit: int = Field(10, ge=1, le=100)
+    min_similarity: float = Field(0.3, ge=0, le=1)
+
+
+class SuggestionSchema(BaseModel):
+    """ Define how a name similar to the searched one is returned.
+        similarity goes from 0 to 1 (the same trigrams).
+    """
+    id: int = 1
+    name: str = "Ireland County Boundaries"
+    area: str = "All Ireland"
+    similarity: float = 0.7
+
+
+class ListSuggestionSchema(BaseModel):
+    """ Define how the names similar to a name are returned.
+    """
+    suggestions: List[SuggestionSchema]
+
+
+class ExportSchema(BaseModel):
+    """ Define how an export of the dataset should be represented.
+    """
+    format: Literal["csv", "geojson", "parquet"] = "csv"
+
+
+class ChangesSearchSchema(BaseModel):
+    """ Define how a request for the changes of the dataset should be
+        represented. since is the version the client has (0 for the whole
+        catalog); at most limit changes are returned, the oldest first.
+    """
+    since: int = Field(0, ge=0)
+    limit: int = Field(1000, ge=1, le=5000)
+
+
+class DueSearchSchema(BaseModel):
+    """ Define how a search for the data due for a check should be
+        represented. before defaults to the current date and time.
+    """
+    before: Optional[datetime] = None
+    limit: int = Field(100, ge=1, le=5000)
 
 
 class ListDatasetSchema(BaseModel):
     """ Define how a list of data should be returned.
+        next_after is only present on paginated requests and holds the
+        value to send as 'after' to get the next page (null on the last one).
     """
     dataset: List[DataSchema]
+    next_after: Optional[int] = None
 
 
-def show_dataset(dataset: List[Data]):
+def show_dataset(dataset: Iterable[Data]):
     """ Returns a representation of the data following the schema defined in DataViewSchema.
     """
-    result = []
+    return {"dataset": [show_dataset_item(data) for data in dataset]}
+
+
+def show_dataset_item(data: Data):
+    """ Returns the representation of one data inside a list of data.
+    """
+    return {
+        "name": data.name,
+        "area": data.area,
+        "description": data.description,
+        "source": data.source,
+        "creator": data.creator,
+        "permitted": data.permitted,
+        "copyright": data.copyright,
+        "link": data.link,
+        "info": data.info,
+        "coordinate_system": data.coordinate_system,
+        "creation_date": data.creation_date,
+        "update_date": data.update_date,
+        "format": data.format,
+        "check_date": data.check_date,
+        # update frequency and bounding box
+        "update_frequency_days": data.update_frequency_days,
+        "bounding_box": data.bounding_box,
+        "next_check_date": data.next_check_date
+    }
+
+
+# keys of a data in a list of data, sorted as Flask's JSON provider
+# writes them, and the encoder of the value of each one
+DATASET_LAYOUT = (
+    ("area", "str"),
+    ("bounding_box", "str"),
+    ("check_date", "datetime"),
+    ("coordinate_system", "str"),
+    ("copyright", "str"),
+    ("creation_date", "str"),
+    ("creator", "str"),
+    ("description", "str"),
+    ("format", "str"),
+    ("info", "str"),
+    ("link", "str"),
+    ("name", "str"),
+    ("next_check_date", "datetime"),
+    ("permitted", "bool"),
+    ("source", "str"),
+    ("update_date", "str"),
+    ("update_frequency_days", "int"),
+    )
+_ENCODERS = {
+    "str": lambda value: "null" if value is None
+    else encode_basestring_ascii(value),
+    "datetime": lambda value: "null" if value is None
+    else encode_basestring_ascii(http_date(value)),
+    "bool": lambda value: "null" if value is None
+    else ("true" if value else "false"),
+    "int": lambda value: "null" if value is None else int.__repr__(value),
+    }
+_DATASET_ENCODERS = tuple(_ENCODERS[kind] for _, kind in DATASET_LAYOUT)
+_DATASET_TEMPLATE = "{" + ",".join(f'"{key}":%s'
+                                   for key, _ in DATASET_LAYOUT) + "}"
+
+
+def dataset_columns():
+    """ Returns the columns of Data selected by the fast path of the list
+    of data, in the order of DATASET_LAYOUT.
+    """
+    return [getattr(Data, key) for key, _ in DATASET_LAYOUT]
+
+
+# the values of a data (a Data or a row of the read replica) in the order
+# of DATASET_LAYOUT
+dataset_values = attrgetter(*[key for key, _ in DATASET_LAYOUT])
+
+
+def encode_dataset(rows: Iterable[tuple], **extra) -> str:
+    """ Returns the JSON of a list of data straight from rows of column
+    tuples (see dataset_columns), with no ORM object nor intermediary dicts.
+    The output is byte for byte the one of show_dataset written by Flask's
+    default JSON provider (sorted keys, compact, ASCII only). extra holds
+    integer (or null) keys, which must sort after "dataset".
+    """
+    template, encoders = _DATASET_TEMPLATE, _DATASET_ENCODERS
+    items = ",".join([
+        template % tuple([encode(value)
+                          for encode, value in zip(encoders, row)])
+        for row in rows])
+    tail = "".join(f',"{key}":' + ("null" if value is None else repr(value))
+                   for key, value in sorted(extra.items()))
+    return '{"dataset":[' + items + "]" + tail + "}\n"
+
+
+def stream_dataset(dataset: Iterable[Data], dumps, chunk_size: int = 500) -> Iterator[str]:
+    """ Yields the representation of the data as NDJSON (one data per line),
+    grouping the lines in chunks of chunk_size so each write to the client
+    carries a reasonable amount of bytes.
+    """
+    lines = []
     for data in dataset:
-        result.append({
-            "name": data.name,
-            "area": data.area,
-            "description": data.description,
-            "source": data.source,
-            "creator": data.creator,
-            "permitted": data.permitted,
-            "copyright": data.copyright,
-            "link": data.link,
-            "info": data.info,
-            "coordinate_system": data.coordinate_system,
-            "creation_date": data.creation_date,
-            "update_date": data.update_date,
-            "format": data.format,
-            "check_date": data.check_date,
-            # update frequency and bounding box
-            "update_frequency_days": data.update_frequency_days,
-            "bounding_box": data.bounding_box
-        })
-
-    return {"dataset": result}
+        lines.append(dumps(show_dataset_item(data)))
+        if len(lines) >= chunk_size:
+            yield "\n".join(lines) + "\n"
+            lines = []
+    if lines:
+        yield "\n".join(lines) + "\n"
 
 
 class DataViewSchema(BaseModel):
@@ -96,6 +306,107 @@ class DataViewSchema(BaseModel):
     # update frequency and bounding box
     update_frequency_days: Optional[int] = 90
     bounding_box: Optional[str] = "49.8822952975038 -6.36645881486726; 51.679402308989 0.240313964132312"
+    check_date: Optional[datetime] = None
+    next_check_date: Optional[datetime] = None
+    # result of the last probe of the link
+    link_status: Optional[str] = None
+    link_status_code: Optional[int] = None
+    link_latency_ms: Optional[float] = None
+    link_checked_at: Optional[datetime] = None
+
+
+class ChangedDataSchema(DataViewSchema):
+    """ Define how a data inserted or updated since a version is returned.
+    """
+    version: int = 1
+    updated_at: Optional[datetime] = None
+
+
+class DeletedDataSchema(BaseModel):
+    """ Define how a data deleted since a version is returned.
+    """
+    id: int = 1
+    name: Optional[str] = "Ireland County Boundaries"
+    version: int = 1
+    deleted_at: Optional[datetime] = None
+
+
+class ChangesSchema(BaseModel):
+    """ Define how the changes of the dataset since a version are returned.
+        The deleted data must be applied before the changed ones (a new
+        data may reuse the id of a deleted one). version is the one to send
+        as since on the next request; more is true when there are changes
+        left after it.
+    """
+    version: int = 1
+    more: bool = False
+    changed: List[ChangedDataSchema]
+    deleted: List[DeletedDataSchema]
+
+
+class CheckStatsSchema(BaseModel):
+    """ Define how the counts of the data by check status are returned.
+    """
+    overdue: int = 0
+    due_later: int = 1
+    unscheduled: int = 0
+
+
+class StatsSchema(BaseModel):
+    """ Define how the statistics of the dataset are returned: the total
+        and the number of data by area, format, coordinate system,
+        permission and check status.
+    """
+    total: int = 1
+    area: Dict[str, int] = {"Dublin": 1}
+    format: Dict[str, int] = {"Shapefile": 1}
+    coordinate_system: Dict[str, int] = {"ITM": 1}
+    permitted: Dict[str, int] = {"true": 1}
+    check: CheckStatsSchema
+
+
+class BulkRowSchema(BaseModel):
+    """ Define how the outcome of one record of a bulk import is returned.
+        status is created, duplicate or invalid.
+    """
+    row: int = 0
+    name: Optional[str] = "Ireland County Boundaries"
+    status: str = "created"
+    message: Optional[str] = None
+
+
+class BulkResultSchema(BaseModel):
+    """ Define how the result of a bulk import is returned.
+    """
+    created: int = 1
+    duplicate: int = 0
+    invalid: int = 0
+    results: List[BulkRowSchema]
+
+
+class BatchSchema(BaseModel):
+    """ Define how the data of a batch operation should be represented:
+        a list of names, every data of an area, or the names of the list
+        in the area when both are sent. There are no default names, so an
+        empty body reaches no data.
+    """
+    names: List[str] = []
+    area: Optional[str] = None
+
+
+class BatchRowSchema(BaseModel):
+    """ Define how the outcome of a batch operation for one data is
+        returned. status is checked, removed or not_found.
+    """
+    name: str = "Ireland County Boundaries"
+    status: str = "checked"
+
+
+class BatchResultSchema(BaseModel):
+    """ Define how the result of a batch operation is returned.
+    """
+    count: int = 1
+    results: List[BatchRowSchema]
 
 
 class DataDelSchema(BaseModel):
@@ -127,5 +438,27 @@ def show_data(data: Data):
         "check_date": data.check_date,
         # update frequency and bounding box
         "update_frequency_days": data.update_frequency_days,
-        "bounding_box": data.bounding_box
+        "bounding_box": data.bounding_box,
+        "next_check_date": data.next_check_date,
+        # result of the last probe of the link
+        "link_status": data.link_status,
+        "link_status_code": data.link_status_code,
+        "link_latency_ms": data.link_latency_ms,
+        "link_checked_at": data.link_checked_at
+    }
+
+
+def show_changes(changed: Iterable[Data], deleted: Iterable, version: int,
+                 more: bool):
+    """ Returns a representation of the changes of the dataset following
+    the schema defined in ChangesSchema.
+    """
+    return {
+        "version": version,
+        "more": more,
+        "changed": [{**show_data(data), "version": data.version,
+                     "updated_at": data.updated_at} for data in changed],
+        "deleted": [{"id": row.id, "name": row.name,
+                     "version": row.version, "deleted_at": row.deleted_at}
+                    for row in deleted],
     }
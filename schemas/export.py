@@ -0,0 +1,168 @@
+from datetime import datetime
+from typing import Iterable, Iterator
+import csv
+import io
+import json
+
+from model.data import Data
+
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:  # the Parquet export is only offered with pyarrow
+    pyarrow = None
+PARQUET_EXPORT = pyarrow is not None
+
+
+# columns of the exported data, in the order they are written
+EXPORT_COLUMNS = ("id", "name", "area", "description", "source", "creator",
+                  "permitted", "copyright", "link", "info",
+                  "coordinate_system", "creation_date", "update_date",
+                  "format", "check_date", "next_check_date",
+                  "update_frequency_days", "bounding_box")
+# the parsed bounding box, selected after EXPORT_COLUMNS for the geometry
+BOX_COLUMNS = ("min_lat", "min_lon", "max_lat", "max_lon")
+
+EXPORT_MIMETYPES = {
+    "csv": "text/csv",
+    "geojson": "application/geo+json",
+    "parquet": "application/vnd.apache.parquet",
+}
+
+
+def export_columns():
+    """ Returns the columns of Data selected by the exports: EXPORT_COLUMNS
+    followed by BOX_COLUMNS.
+    """
+    return [getattr(Data, column) for column in EXPORT_COLUMNS + BOX_COLUMNS]
+
+
+def _isoformat(value):
+    return value.isoformat() if isinstance(value, datetime) else value
+
+
+def export_csv(rows: Iterable[tuple], chunk_size: int = 500) -> Iterator[str]:
+    """ Yields the data as CSV, a header and then chunk_size rows at a time.
+    """
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(EXPORT_COLUMNS)
+    width = len(EXPORT_COLUMNS)
+    for count, row in enumerate(rows, 1):
+        writer.writerow([_isoformat(value) for value in row[:width]])
+        if count % chunk_size == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+
+def box_geometry(min_lat, min_lon, max_lat, max_lon):
+    """ Returns the bounding box as a GeoJSON polygon (longitude first), or
+    None when the data has no bounding box.
+    """
+    if min_lat is None:
+        return None
+    return {"type": "Polygon",
+            "coordinates": [[[min_lon, min_lat], [max_lon, min_lat],
+                             [max_lon, max_lat], [min_lon, max_lat],
+                             [min_lon, min_lat]]]}
+
+
+def export_geojson(rows: Iterable[tuple],
+                   chunk_size: int = 500) -> Iterator[str]:
+    """ Yields the data as a GeoJSON FeatureCollection, each data a feature
+    whose geometry is its bounding box, chunk_size features at a time.
+    """
+    width = len(EXPORT_COLUMNS)
+    yield '{"type":"FeatureCollection","features":['
+    features = []
+    separator = ""
+    for row in rows:
+        properties = {column: _isoformat(value) for column, value
+                      in zip(EXPORT_COLUMNS, row[:width])}
+        features.append(json.dumps({
+            "type": "Feature",
+            "id": properties["id"],
+            "geometry": box_geometry(*row[width:]),
+            "properties": properties,
+        }, ensure_ascii=False, separators=(",", ":")))
+        if len(features) >= chunk_size:
+            yield separator + ",".join(features)
+            separator = ","
+            features = []
+    if features:
+        yield separator + ",".join(features)
+    yield "]}\n"
+
+
+class _ChunkSink:
+    """ Write-only file collecting what the Parquet writer writes, so it can
+    be streamed and dropped after each row group.
+    """
+
+    def __init__(self):
+        self.chunks = []
+        self.position = 0
+        self.closed = False
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        self.position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self.position
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def drain(self) -> bytes:
+        data = b"".join(self.chunks)
+        self.chunks = []
+        return data
+
+
+def parquet_schema():
+    """ Returns the Arrow schema of the Parquet export.
+    """
+    types = {"id": pyarrow.int64(), "permitted": pyarrow.bool_(),
+             "check_date": pyarrow.timestamp("us"),
+             "next_check_date": pyarrow.timestamp("us"),
+             "update_frequency_days": pyarrow.int64()}
+    fields = [(column, types.get(column, pyarrow.string()))
+              for column in EXPORT_COLUMNS]
+    fields += [(column, pyarrow.float64()) for column in BOX_COLUMNS]
+    return pyarrow.schema(fields)
+
+
+def export_parquet(rows: Iterable[tuple],
+                   row_group_size: int = 10000) -> Iterator[bytes]:
+    """ Yields the data as a Parquet file, written one row group of
+    row_group_size data at a time.
+    """
+    schema = parquet_schema()
+    names = schema.names
+    sink = _ChunkSink()
+    writer = pyarrow.parquet.ParquetWriter(sink, schema)
+
+    def write_group(group):
+        columns = list(zip(*group))
+        writer.write_table(pyarrow.table(
+            {name: list(values) for name, values in zip(names, columns)},
+            schema=schema))
+
+    group = []
+    for row in rows:
+        group.append(row)
+        if len(group) >= row_group_size:
+            write_group(group)
+            group = []
+            yield sink.drain()
+    if group:
+        write_group(group)
+    writer.close()
+    yield sink.drain()
@@ -0,0 +1,61 @@
+from pydantic import BaseModel
+from datetime import datetime
+from typing import Optional
+
+from jobs import Job
+
+
+class JobPathSchema(BaseModel):
+    """ Define how a job is identified in the path.
+    """
+    job_id: int
+
+
+class WFSResolveSchema(BaseModel):
+    """ Define how a request to resolve the WFS bounding boxes should be
+        represented. only_missing restricts it to the WFS data without a
+        bounding box.
+    """
+    only_missing: bool = False
+
+
+class ExtentsNormalizeSchema(BaseModel):
+    """ Define how a request to normalize the extents should be
+        represented. only_missing restricts it to the data with a bounding
+        box and no extent yet.
+    """
+    only_missing: bool = False
+
+
+class LinkCheckSchema(BaseModel):
+    """ Define how a request to check the links should be represented.
+        only_due restricts it to the data due for a check.
+    """
+    only_due: bool = False
+
+
+class JobViewSchema(BaseModel):
+    """ Define how a background job is returned.
+    """
+    id: int = 1
+    name: str = "resolve-wfs"
+    status: str = "running"
+    started: datetime
+    finished: Optional[datetime] = None
+    result: Optional[dict] = None
+    error: Optional[str] = None
+
+
+def show_job(job: Job):
+    """ Returns a representation of the job following the schema
+    defined in JobViewSchema.
+    """
+    return {
+        "id": job.id,
+        "name": job.name,
+        "status": job.status,
+        "started": job.started,
+        "finished": job.finished,
+        "result": job.result,
+        "error": job.error
+    }
@@ -0,0 +1,15 @@
+from pydantic import BaseModel
+from typing import Optional, List
+
+
+class ReplicaCheckSchema(BaseModel):
+    """ Define how the check of the read replica against the database is
+        returned. consistent is null when the catalog kept changing and
+        the check could not be done at a single version.
+    """
+    version: int = 1
+    data: int = 1
+    consistent: Optional[bool] = True
+    missing: List[int] = []
+    extra: List[int] = []
+    different: List[int] = []
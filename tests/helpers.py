@@ -0,0 +1,120 @@
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from threading import Thread
+import os
+import shutil
+import tempfile
+import unittest
+
+from app import create_app
+from cache import response_cache
+from model import Session, init_db
+import model
+
+
+def data_form(name: str, **fields) -> dict:
+    """
+    Returns the form of a new data, with the fields informed replacing the
+    default ones
+    """
+    form = {
+        "name": name,
+        "area": "Dublin",
+        "description": f"Description of {name}",
+        "source": "https://example.com/data",
+        "creator": "Tests",
+        "permitted": "true",
+        "copyright": "CC BY 4.0",
+        "link": "\\\\Dataset\\Tests",
+        "info": "None",
+        "coordinate_system": "ITM",
+        "creation_date": "01/01/2019",
+        "update_date": "01/01/2019",
+        "format": "SHP",
+        "update_frequency_days": "90",
+    }
+    form.update({key: str(value).lower() if isinstance(value, bool)
+                 else value for key, value in fields.items()})
+    return form
+
+
+class AppTestCase(unittest.TestCase):
+    """
+    Runs each test against the app with a new SQLite database, in a
+    temporary directory removed at the end of the test
+    """
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.database = os.path.join(self.directory, "test.sqlite3")
+        self.app = create_app({"DATABASE_URL": f"sqlite:///{self.database}"})
+        self.client = self.app.test_client()
+        init_db()
+        # the responses cached by the tests before
+        response_cache.catalog_changed()
+
+    def tearDown(self):
+        Session.remove()
+        model.engine.dispose()
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def add_data(self, name: str, **fields):
+        """
+        Inserts a data through the API, failing the test if it isn't
+        created
+        """
+        response = self.client.post("/data", data=data_form(name, **fields))
+        self.assertEqual(response.status_code, 200, response.get_data())
+        return response.get_json()
+
+
+class StubServer:
+    """
+    Local HTTP server answering the paths of its routes, for the jobs that
+    reach external services. A route maps a path to its answer: (status,
+    body) or a callable receiving the handler and returning them. Every
+    request is kept in requests as (method, path with query).
+    """
+
+    def __init__(self, routes: dict):
+        self.routes = routes
+        self.requests = []
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+
+            def answer(self, send_body: bool):
+                server.requests.append((self.command, self.path))
+                route = server.routes.get(self.path.split("?", 1)[0])
+                if route is None:
+                    status, body = 404, b"Not found"
+                elif callable(route):
+                    status, body = route(self)
+                else:
+                    status, body = route
+                self.send_response(status)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                if send_body:
+                    self.wfile.write(body)
+
+            def do_GET(self):
+                self.answer(True)
+
+            def do_HEAD(self):
+                self.answer(False)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.httpd.daemon_threads = True
+        self.url = f"http://127.0.0.1:{self.httpd.server_port}"
+        self.thread = Thread(target=self.httpd.serve_forever, daemon=True)
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.httpd.shutdown()
+        self.httpd.server_close()
@@ -0,0 +1,48 @@
+import unittest
+
+from tests.helpers import AppTestCase
+
+
+class BatchTest(AppTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.add_data("Roads", area="Dublin")
+        self.add_data("Rivers", area="Cork")
+        self.add_data("Parks", area="Dublin")
+
+    def names(self) -> list:
+        return sorted(data["name"] for data in
+                      self.client.get("/dataset").get_json()["dataset"])
+
+    def test_names_and_area_select_the_names_of_the_area(self):
+        response = self.client.patch("/dataset/check", json={
+            "names": ["Roads", "Rivers", "Lakes"], "area": "Dublin"})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.get_json(), {"count": 1, "results": [
+            {"name": "Roads", "status": "checked"},
+            {"name": "Rivers", "status": "not_found"},
+            {"name": "Lakes", "status": "not_found"}]})
+
+        response = self.client.delete("/dataset", json={
+            "names": ["Roads", "Rivers"], "area": "Dublin"})
+        self.assertEqual(response.get_json(), {"count": 1, "results": [
+            {"name": "Roads", "status": "removed"},
+            {"name": "Rivers", "status": "not_found"}]})
+        self.assertEqual(self.names(), ["Parks", "Rivers"])
+
+    def test_names_or_area_alone(self):
+        response = self.client.patch("/dataset/check",
+                                     json={"area": "Dublin"})
+        self.assertEqual(response.get_json()["count"], 2)
+        response = self.client.delete("/dataset",
+                                      json={"names": ["Rivers", "Lakes"]})
+        self.assertEqual(response.get_json(), {"count": 1, "results": [
+            {"name": "Rivers", "status": "removed"},
+            {"name": "Lakes", "status": "not_found"}]})
+        self.assertEqual(self.client.delete("/dataset", json={})
+                         .status_code, 400)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,96 @@
+from unittest import mock
+import json
+import sqlite3
+import unittest
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session as ORMSession
+
+import model
+from tests.helpers import AppTestCase, data_form
+from tests.test_coalesce import commits
+
+
+class BulkImportTest(AppTestCase):
+
+    def records(self, *names) -> list:
+        return [data_form(name) for name in names]
+
+    def statuses(self, body: dict) -> list:
+        return [(result["row"], result["name"], result["status"])
+                for result in body["results"]]
+
+    def test_json_array_gets_a_status_per_row(self):
+        self.add_data("Roads")
+        records = self.records("Rivers", "Roads", "Parks", "Rivers")
+        records.insert(2, {"name": "Lakes", "update_frequency_days": "often"})
+        records.append("not a record")
+        with mock.patch("app.BULK_CHUNK_SIZE", 2):
+            response = self.client.post("/dataset/bulk", json=records)
+        self.assertEqual(response.status_code, 200)
+        body = response.get_json()
+        self.assertEqual(self.statuses(body), [
+            (0, "Rivers", "created"), (1, "Roads", "duplicate"),
+            (2, "Lakes", "invalid"), (3, "Parks", "created"),
+            (4, "Rivers", "duplicate"), (5, None, "invalid")])
+        self.assertEqual((body["created"], body["duplicate"],
+                          body["invalid"]), (2, 2, 2))
+        names = [data["name"] for data in
+                 self.client.get("/dataset").get_json()["dataset"]]
+        self.assertEqual(sorted(names), ["Parks", "Rivers", "Roads"])
+
+    def test_ndjson_stream(self):
+        lines = [json.dumps(record) for record in
+                 self.records("Rivers", "Parks")]
+        lines.insert(1, "{broken")
+        response = self.client.post(
+            "/dataset/bulk", data="\n".join(lines) + "\n\n",
+            content_type="application/x-ndjson")
+        self.assertEqual(self.statuses(response.get_json()), [
+            (0, "Rivers", "created"), (1, None, "invalid"),
+            (2, "Parks", "created")])
+
+    def test_names_saved_meanwhile_are_rejected_in_one_transaction(self):
+        statements = []
+
+        @event.listens_for(model.engine, "connect")
+        def trace(dbapi_connection, connection_record):
+            dbapi_connection.set_trace_callback(statements.append)
+
+        model.engine.dispose()
+        saved = []
+
+        def save_elsewhere(session, flush_context, instances):
+            # another worker saves Parks after the names were looked up
+            if not saved:
+                saved.append(True)
+                connection = sqlite3.connect(self.database)
+                with connection:
+                    connection.execute(
+                        "INSERT INTO data (name, area, permitted, link, "
+                        "coordinate_system, format) VALUES ('Parks', "
+                        "'Dublin', 1, 'https://example.com', 'ITM', 'SHP')")
+                connection.close()
+
+        event.listen(ORMSession, "before_flush", save_elsewhere)
+        self.addCleanup(event.remove, ORMSession, "before_flush",
+                        save_elsewhere)
+        response = self.client.post("/dataset/bulk", json=self.records(
+            "Rivers", "Parks", "Lakes"))
+        self.assertEqual(self.statuses(response.get_json()), [
+            (0, "Rivers", "created"), (1, "Parks", "duplicate"),
+            (2, "Lakes", "created")])
+        # the failed batch rolls back, the retry is one transaction
+        self.assertEqual(commits(statements), 1)
+        names = [data["name"] for data in
+                 self.client.get("/dataset").get_json()["dataset"]]
+        self.assertEqual(names, ["Parks", "Rivers", "Lakes"])
+
+    def test_body_that_is_not_a_list(self):
+        response = self.client.post("/dataset/bulk",
+                                    json={"name": "Rivers"})
+        self.assertEqual(response.status_code, 400)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,49 @@
+import sqlite3
+
+from cache import response_cache
+from tests.helpers import AppTestCase
+
+
+class ResponseCacheTest(AppTestCase):
+
+    def write_from_another_worker(self, statement: str, *parameters):
+        """
+        Writes to the database without going through the app, as another
+        worker does: the response cache of this one isn't emptied
+        """
+        connection = sqlite3.connect(self.database)
+        with connection:
+            connection.execute(statement, parameters)
+        connection.close()
+
+    def test_serves_the_cached_response_until_the_catalog_changes(self):
+        self.add_data("Roads")
+        first = self.client.get("/data?name=Roads")
+        self.assertEqual(first.status_code, 200)
+        etag = first.headers["ETag"]
+        again = self.client.get("/data?name=Roads",
+                                headers={"If-None-Match": etag})
+        self.assertEqual(again.status_code, 304)
+
+        self.write_from_another_worker(
+            "UPDATE data SET description = ? WHERE name = ?",
+            "Changed elsewhere", "Roads")
+        version = response_cache.version
+        changed = self.client.get("/data?name=Roads",
+                                  headers={"If-None-Match": etag})
+        self.assertEqual(changed.status_code, 200)
+        self.assertNotEqual(changed.headers["ETag"], etag)
+        self.assertEqual(changed.get_json()["description"],
+                         "Changed elsewhere")
+        self.assertEqual(response_cache.version, version)
+
+    def test_missing_data_is_found_once_another_worker_adds_it(self):
+        self.add_data("Roads")
+        self.assertEqual(
+            self.client.get("/data?name=Rivers").status_code, 404)
+        self.write_from_another_worker(
+            "UPDATE data SET name = ? WHERE name = ?", "Rivers", "Roads")
+        self.assertEqual(
+            self.client.get("/data?name=Rivers").status_code, 200)
+        self.assertEqual(
+            self.client.get("/data?name=Roads").status_code, 404)
@@ -0,0 +1,78 @@
+import unittest
+
+from tests.helpers import AppTestCase, data_form
+
+
+class ChangeFeedTest(AppTestCase):
+
+    def changes(self, since: int, limit: int = 1000) -> dict:
+        response = self.client.get("/dataset/changes",
+                                   query_string={"since": since,
+                                                 "limit": limit})
+        self.assertEqual(response.status_code, 200)
+        return response.get_json()
+
+    def summary(self, changes: dict) -> tuple:
+        return ([(data["name"], data["version"])
+                 for data in changes["changed"]],
+                [(data["name"], data["version"])
+                 for data in changes["deleted"]])
+
+    def test_every_write_takes_the_next_version(self):
+        self.add_data("Roads")
+        self.add_data("Rivers")
+        self.add_data("Parks")
+        start = self.changes(0)
+        self.assertEqual(self.summary(start), (
+            [("Roads", 1), ("Rivers", 2), ("Parks", 3)], []))
+        self.assertEqual((start["version"], start["more"]), (3, False))
+
+        self.client.put("/data?name=Roads", data=data_form(
+            "Roads", description="Motorways"))
+        self.client.delete("/data?name=Rivers")
+        self.client.patch("/dataset/check", json={"names": ["Parks"]})
+        changes = self.changes(3)
+        self.assertEqual(self.summary(changes), (
+            [("Roads", 4), ("Parks", 6)], [("Rivers", 5)]))
+        self.assertEqual(changes["changed"][0]["description"], "Motorways")
+        self.assertEqual(changes["version"], 6)
+        self.assertEqual(self.summary(self.changes(6)), ([], []))
+
+    def test_pages_of_changes(self):
+        for name in ("Roads", "Rivers", "Parks", "Lakes"):
+            self.add_data(name)
+        self.client.delete("/dataset", json={"names": ["Roads", "Parks"]})
+        first = self.changes(0, limit=3)
+        self.assertEqual(self.summary(first), (
+            [("Rivers", 2), ("Lakes", 4)], [("Roads", 5)]))
+        self.assertEqual((first["version"], first["more"]), (5, True))
+        second = self.changes(first["version"], limit=3)
+        self.assertEqual(self.summary(second), ([], [("Parks", 6)]))
+        self.assertEqual((second["version"], second["more"]), (6, False))
+
+    def test_page_filled_by_one_list(self):
+        for name in ("Roads", "Rivers", "Parks"):
+            self.add_data(name)
+        first = self.changes(0, limit=2)
+        self.assertEqual(self.summary(first),
+                         ([("Roads", 1), ("Rivers", 2)], []))
+        self.assertEqual((first["version"], first["more"]), (2, True))
+        second = self.changes(first["version"], limit=2)
+        self.assertEqual(self.summary(second), ([("Parks", 3)], []))
+        self.assertEqual((second["version"], second["more"]), (3, False))
+
+        self.client.delete("/dataset", json={"names": ["Roads", "Rivers"]})
+        third = self.changes(3, limit=2)
+        self.assertEqual(self.summary(third),
+                         ([], [("Roads", 4), ("Rivers", 5)]))
+        self.assertEqual((third["version"], third["more"]), (5, False))
+        # a page holding exactly the last changes
+        self.add_data("Lakes")
+        exact = self.changes(3, limit=3)
+        self.assertEqual(self.summary(exact),
+                         ([("Lakes", 6)], [("Roads", 4), ("Rivers", 5)]))
+        self.assertEqual((exact["version"], exact["more"]), (6, False))
+
+
+if __name__ == "__main__":
+    unittest.main()
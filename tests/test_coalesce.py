@@ -0,0 +1,98 @@
+import os
+import shutil
+import tempfile
+import unittest
+from concurrent.futures import Future
+
+from sqlalchemy import create_engine, event, text
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import sessionmaker
+
+from coalesce import WriteCoalescer
+
+
+def commits(statements: list) -> int:
+    """
+    Counts the transactions committed by the statements traced on a SQLite
+    connection: a COMMIT, the RELEASE of an outermost savepoint and a write
+    out of any transaction each commit one
+    """
+    count, begun, savepoints = 0, False, 0
+    for statement in statements:
+        words = statement.upper().split()
+        if words[0] == "BEGIN":
+            begun = True
+        elif words[0] in ("COMMIT", "END"):
+            count, begun = count + 1, False
+        elif words[0] == "ROLLBACK" and "TO" not in words:
+            begun, savepoints = False, 0
+        elif words[0] == "SAVEPOINT":
+            savepoints += 1
+        elif words[0] == "RELEASE":
+            savepoints -= 1
+            count += not begun and savepoints == 0
+        elif words[0] in ("INSERT", "UPDATE", "DELETE"):
+            count += not begun and savepoints == 0
+    return count
+
+
+class WriteCoalescerTest(unittest.TestCase):
+
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, True)
+        self.engine = create_engine(
+            f"sqlite:///{os.path.join(directory, 'test.sqlite3')}")
+        self.addCleanup(self.engine.dispose)
+        with self.engine.begin() as connection:
+            connection.exec_driver_sql(
+                "CREATE TABLE item (name VARCHAR NOT NULL UNIQUE)")
+        self.statements = []
+
+        @event.listens_for(self.engine, "connect")
+        def trace(dbapi_connection, connection_record):
+            dbapi_connection.set_trace_callback(self.statements.append)
+
+        self.engine.dispose()
+        self.coalescer = WriteCoalescer(sessionmaker(self.engine))
+
+    def insert(self, name: str) -> tuple:
+        def write(session):
+            session.execute(text("INSERT INTO item (name) VALUES (:name)"),
+                            {"name": name})
+            return name
+        return write, str.upper, Future()
+
+    def names(self) -> list:
+        with self.engine.connect() as connection:
+            return [name for name, in connection.exec_driver_sql(
+                "SELECT name FROM item ORDER BY name")]
+
+    def test_batch_is_committed_once(self):
+        batch = [self.insert(name) for name in ("a", "b", "c", "d")]
+        self.coalescer.apply(batch)
+        self.assertEqual(commits(self.statements), 1)
+        self.assertEqual([future.result() for _, _, future in batch],
+                         ["A", "B", "C", "D"])
+        self.assertEqual(self.names(), ["a", "b", "c", "d"])
+
+    def test_failing_write_rolls_back_its_savepoint_only(self):
+        batch = [self.insert(name) for name in ("a", "b", "a", "c")]
+        self.coalescer.apply(batch)
+        self.assertEqual(commits(self.statements), 1)
+        self.assertEqual(batch[0][2].result(), "A")
+        self.assertEqual(batch[1][2].result(), "B")
+        self.assertIsInstance(batch[2][2].exception(), IntegrityError)
+        self.assertEqual(batch[3][2].result(), "C")
+        self.assertEqual(self.names(), ["a", "b", "c"])
+
+    def test_submitted_writes_get_their_results(self):
+        futures = [self.coalescer.submit(write, present)
+                   for write, present, _ in map(self.insert, "xyz")]
+        self.assertEqual([future.result(timeout=5) for future in futures],
+                         ["X", "Y", "Z"])
+        self.assertEqual(self.names(), ["x", "y", "z"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,89 @@
+import unittest
+
+import numpy as np
+
+from model import Session, Data
+from model.crs import inverse_transverse_mercator, normalize_boxes, \
+    normalize_extents, to_wgs84
+from tests.helpers import AppTestCase
+
+
+# the worked example of the Ordnance Survey guide to coordinate systems in
+# Great Britain: E 651409.903, N 313177.270 is 52°39'27.2531"N,
+# 1°43'4.5177"E on OSGB36
+OS_EXAMPLE = (313177.270, 651409.903)
+OS_EXAMPLE_OSGB36 = (52 + 39 / 60 + 27.2531 / 3600,
+                     1 + 43 / 60 + 4.5177 / 3600)
+# the Spire of Dublin, in ITM and WGS84
+DUBLIN_ITM = (734697, 715830)
+DUBLIN_WGS84 = (53.3498, -6.2603)
+
+
+class TransformTest(unittest.TestCase):
+
+    def test_os_worked_example(self):
+        latitude, longitude = inverse_transverse_mercator("BNG", *OS_EXAMPLE)
+        self.assertAlmostEqual(float(latitude), OS_EXAMPLE_OSGB36[0],
+                               places=7)
+        self.assertAlmostEqual(float(longitude), OS_EXAMPLE_OSGB36[1],
+                               places=7)
+
+    def test_osgb36_datum_shift(self):
+        latitude, longitude = to_wgs84("BNG", *OS_EXAMPLE)
+        # OSGB36 and WGS84 are about a hundred metres apart there
+        shift_north = (float(latitude) - OS_EXAMPLE_OSGB36[0]) * 111320
+        shift_east = (float(longitude) - OS_EXAMPLE_OSGB36[1]) * 111320 * \
+            np.cos(np.radians(OS_EXAMPLE_OSGB36[0]))
+        self.assertAlmostEqual(shift_north, 45, delta=10)
+        self.assertAlmostEqual(shift_east, -127, delta=10)
+
+    def test_dublin_in_itm(self):
+        latitude, longitude = to_wgs84("ITM", *DUBLIN_ITM)
+        self.assertAlmostEqual(float(latitude), DUBLIN_WGS84[0], delta=1e-4)
+        self.assertAlmostEqual(float(longitude), DUBLIN_WGS84[1],
+                               delta=1e-4)
+        # the true origin of ITM
+        self.assertEqual([float(value) for value in
+                          to_wgs84("ITM", 750000, 600000)], [53.5, -8.0])
+
+    def test_boxes_enclose_their_edges(self):
+        box = (700000, 700000, 760000, 730000)
+        (min_lat, min_lon, max_lat, max_lon), = normalize_boxes("ITM", [box])
+        for northing in np.linspace(box[0], box[2], 5):
+            for easting in (box[1], box[3]):
+                latitude, longitude = to_wgs84("ITM", northing, easting)
+                self.assertTrue(min_lat <= latitude <= max_lat)
+                self.assertTrue(min_lon <= longitude <= max_lon)
+        self.assertEqual(normalize_boxes("WGS84", [(53, -7, 54, -6)])
+                         .tolist(), [[53, -7, 54, -6]])
+
+    def test_extents_tell_the_coordinate_system(self):
+        itm, degrees, broken = normalize_extents([
+            (1, "ITM", "734000 715000; 735000 716000"),
+            (2, "ITM", "53.3 -6.3; 53.4 -6.2"),
+            (3, "ITM", "not a box")])
+        self.assertEqual(itm["native_crs"], "ITM")
+        self.assertAlmostEqual(itm["min_lat"], 53.343, places=2)
+        self.assertEqual((degrees["native_crs"], degrees["min_lat"],
+                          degrees["max_lon"]), ("WGS84", 53.3, -6.2))
+        self.assertIsNone(broken["native_crs"])
+        self.assertIsNone(broken["min_lat"])
+
+
+class ExtentOnWriteTest(AppTestCase):
+
+    def test_saved_box_is_normalized(self):
+        self.add_data("Spire", coordinate_system="ITM",
+                      bounding_box="734697 715830; 734697 715830")
+        data = Session().query(Data).one()
+        self.assertEqual(data.native_crs, "ITM")
+        self.assertAlmostEqual(data.min_lat, DUBLIN_WGS84[0], delta=1e-4)
+        self.assertAlmostEqual(data.max_lon, DUBLIN_WGS84[1], delta=1e-4)
+        response = self.client.get("/data/bbox", query_string={
+            "minx": -6.27, "miny": 53.34, "maxx": -6.25, "maxy": 53.36})
+        self.assertEqual([data["name"] for data in
+                          response.get_json()["dataset"]], ["Spire"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,22 @@
+import unittest
+
+from tests.helpers import AppTestCase
+
+
+class DeleteDataTest(AppTestCase):
+
+    def test_deletes_the_data_and_its_cached_responses(self):
+        self.add_data("Roads")
+        self.assertEqual(self.client.get("/data?name=Roads").status_code,
+                         200)
+        response = self.client.delete("/data?name=Roads")
+        self.assertEqual(response.get_json(),
+                         {"message": "Data removed", "name": "Roads"})
+        self.assertEqual(self.client.get("/data?name=Roads").status_code,
+                         404)
+        self.assertEqual(self.client.delete("/data?name=Roads").status_code,
+                         404)
+
+
+if __name__ == "__main__":
+    unittest.main()
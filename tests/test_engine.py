@@ -0,0 +1,39 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from sqlalchemy.pool import QueuePool, SingletonThreadPool
+
+from model import Session, configure_engine, init_db, Data
+import model
+
+
+class ConfigureEngineTest(unittest.TestCase):
+
+    def tearDown(self):
+        Session.remove()
+        model.engine.dispose()
+
+    def test_in_memory_database_has_no_pool_settings(self):
+        for url in ("sqlite://", "sqlite:///:memory:"):
+            engine = configure_engine(url, pool_size=2, max_overflow=1,
+                                      pool_timeout=5)
+            self.assertIsInstance(engine.pool, SingletonThreadPool)
+        init_db()
+        self.assertEqual(Session().query(Data).count(), 0)
+
+    def test_file_database_takes_the_pool_settings(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, True)
+        engine = configure_engine(
+            f"sqlite:///{os.path.join(directory, 'test.sqlite3')}",
+            pool_size=2, max_overflow=1, pool_timeout=5)
+        self.assertIsInstance(engine.pool, QueuePool)
+        self.assertEqual(engine.pool.size(), 2)
+        self.assertEqual(engine.pool._max_overflow, 1)
+        self.assertEqual(engine.pool._timeout, 5)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,39 @@
+from unittest import mock
+import csv
+import io
+import unittest
+
+from schemas import export
+from tests.helpers import AppTestCase
+
+
+class ExportTest(AppTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.add_data("Roads")
+        self.add_data("Rivers", area="Cork")
+
+    def test_csv(self):
+        response = self.client.get("/dataset/export?format=csv")
+        self.assertEqual(response.status_code, 200)
+        rows = list(csv.DictReader(io.StringIO(response.get_data(True))))
+        self.assertEqual([row["name"] for row in rows], ["Roads", "Rivers"])
+
+    def test_parquet_without_pyarrow(self):
+        with mock.patch("app.PARQUET_EXPORT", False):
+            response = self.client.get("/dataset/export?format=parquet")
+        self.assertEqual(response.status_code, 501)
+
+    @unittest.skipUnless(export.PARQUET_EXPORT, "pyarrow isn't installed")
+    def test_parquet(self):
+        import pyarrow.parquet
+        response = self.client.get("/dataset/export?format=parquet")
+        self.assertEqual(response.status_code, 200)
+        table = pyarrow.parquet.read_table(io.BytesIO(response.get_data()))
+        self.assertEqual(table.column("name").to_pylist(),
+                         ["Roads", "Rivers"])
+
+
+if __name__ == "__main__":
+    unittest.main()
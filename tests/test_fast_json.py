@@ -0,0 +1,81 @@
+from unittest import mock
+import sqlite3
+import unittest
+
+import app
+from cache import response_cache
+from tests.helpers import AppTestCase
+
+
+# text the encoder must escape as the JSON provider does: quotes,
+# backslashes, control characters, non-ASCII and astral characters
+ODD_TEXT = 'Café "Ω" \\\\share\\\\path\t\x01 — line break 😀 </script>'
+
+PATHS = [
+    "/dataset", "/dataset?limit=2", "/dataset?limit=2&after=2",
+    "/area?area=Dublin", "/area?area=Dublin&limit=1",
+    "/area?area=All Ireland&include=descendants",
+    "/data/search?area=Dublin", "/data/search?sort=name&order=desc",
+    "/data/search?sort=check_date&order=desc&permitted=false",
+    "/data/bbox?minx=-11&miny=51&maxx=-5&maxy=56",
+    "/data/due?before=2100-01-01T00:00:00",
+    ]
+
+
+class FastJSONTest(AppTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.add_data("Roads " + ODD_TEXT, area="Dublin",
+                      description=ODD_TEXT, info="",
+                      bounding_box="53.2 -6.5; 53.5 -6.0")
+        self.add_data("Rivers", area="Dublin", permitted=False,
+                      creator="Ordnance Survey Ireland – OSi",
+                      bounding_box="722000 700000; 745000 730000")
+        self.add_data("Parks", area="Cork", update_frequency_days=7)
+        connection = sqlite3.connect(self.database)
+        with connection:
+            # nulls, datetimes with and without microseconds and the
+            # results of a link check
+            connection.execute(
+                "UPDATE data SET creator = NULL, info = NULL, "
+                "copyright = NULL, creation_date = NULL, "
+                "link_status = 'broken', link_status_code = 404, "
+                "link_latency_ms = 12.3456789, "
+                "link_checked_at = '2024-02-29 23:59:59.000001' "
+                "WHERE name = 'Parks'")
+            connection.execute(
+                "UPDATE data SET check_date = '2020-01-01 00:00:00', "
+                "next_check_date = NULL, update_frequency_days = NULL "
+                "WHERE name = 'Rivers'")
+        connection.close()
+
+    def get(self, path: str) -> bytes:
+        # the same path is answered again, not from the response cache
+        response_cache.catalog_changed()
+        response = self.client.get(path)
+        self.assertEqual(response.status_code, 200, path)
+        return response.get_data()
+
+    def test_fast_path_writes_the_bytes_of_the_orm_path(self):
+        with mock.patch("app.encode_dataset",
+                        wraps=app.encode_dataset) as encode:
+            fast = [self.get(path) for path in PATHS]
+        self.assertEqual(encode.call_count, len(PATHS))
+        with mock.patch("app.FAST_JSON_ENDPOINTS", set()):
+            orm = [self.get(path) for path in PATHS]
+        for path, fast_body, orm_body in zip(PATHS, fast, orm):
+            self.assertTrue(fast_body.startswith(b'{"dataset":[{'), path)
+            self.assertEqual(fast_body, orm_body, path)
+        self.assertIn(b"\\u00e9", fast[0])
+        self.assertIn(b"\\ud83d\\ude00", fast[0])
+
+    def test_check_command(self):
+        result = self.app.test_cli_runner().invoke(
+            args=["check-fast-json", "--chunk", "2"])
+        self.assertEqual(result.exit_code, 0, result.output)
+        self.assertIn("3 data checked, 0 chunks mismatching", result.output)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,156 @@
+from concurrent.futures import ThreadPoolExecutor
+from unittest import mock
+import os
+import shutil
+import socket
+import tempfile
+import time
+import unittest
+
+from jobs.links import LinkChecker, link_path, probe
+from model import Session, Data
+from tests.helpers import AppTestCase, StubServer
+
+
+def only_get(handler):
+    return (405, b"") if handler.command == "HEAD" else (200, b"ok")
+
+
+def slow(handler):
+    time.sleep(1)
+    return 200, b"late"
+
+
+ROUTES = {"/ok": (200, b"ok"), "/only-get": only_get, "/slow": slow}
+
+
+def closed_port() -> int:
+    """
+    Returns a local port nothing listens on
+    """
+    with socket.socket() as listener:
+        listener.bind(("127.0.0.1", 0))
+        return listener.getsockname()[1]
+
+
+class ProbeTest(unittest.TestCase):
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root, True)
+        os.makedirs(os.path.join(self.root, "Dataset", "Tests"))
+
+    def test_web_links(self):
+        with StubServer(ROUTES) as server:
+            ok = probe(server.url + "/ok")
+            only_get = probe(server.url + "/only-get")
+            not_found = probe(server.url + "/gone")
+            late = probe(server.url + "/slow", timeout=0.2)
+            methods = [method for method, path in server.requests
+                       if path == "/only-get"]
+        self.assertEqual((ok["status"], ok["code"]), ("ok", 200))
+        self.assertGreaterEqual(ok["latency_ms"], 0)
+        self.assertEqual((only_get["status"], only_get["code"]), ("ok", 200))
+        self.assertEqual(methods, ["HEAD", "GET"])
+        self.assertEqual((not_found["status"], not_found["code"]),
+                         ("broken", 404))
+        self.assertEqual(late["status"], "timeout")
+        self.assertEqual(probe(f"http://127.0.0.1:{closed_port()}/")
+                         ["status"], "unreachable")
+
+    def test_file_links(self):
+        self.assertEqual(probe("\\\\Dataset\\Tests", root=self.root)
+                         ["status"], "ok")
+        self.assertEqual(probe("\\\\Dataset\\Missing", root=self.root)
+                         ["status"], "missing")
+        self.assertEqual(probe("file://" + self.root)["status"], "ok")
+        self.assertEqual(probe(os.path.join(self.root, "missing.shp"))
+                         ["status"], "missing")
+        self.assertEqual(probe(self.root)["status"], "ok")
+        # with no root, the Windows and relative paths can't be reached
+        self.assertEqual(probe("\\Dataset\\Tests")["status"], "unchecked")
+        self.assertEqual(probe("C:\\GIS\\roads.shp")["status"], "unchecked")
+        self.assertEqual(probe("  ")["status"], "invalid")
+
+    def test_links_without_root_are_unchecked(self):
+        for link in ("\\\\server\\share\\roads.shp",
+                     "\\Dataset\\Ireland\\Counties", "C:\\GIS\\roads.shp",
+                     "Dataset/Roads", "//server/share"):
+            self.assertIsNone(link_path(link), link)
+            self.assertEqual(probe(link)["status"], "unchecked", link)
+        self.assertEqual(link_path(" /srv/gis/roads.shp "),
+                         "/srv/gis/roads.shp")
+        self.assertEqual(link_path("file:///srv/gis/a%20b.shp"),
+                         "/srv/gis/a b.shp")
+        self.assertEqual(link_path("\\\\server\\share", "/mnt"),
+                         "/mnt/server/share")
+        self.assertEqual(probe("\\\\server\\share\\roads.shp"),
+                         {"status": "unchecked", "code": None,
+                          "latency_ms": None})
+
+
+class CountingExecutor(ThreadPoolExecutor):
+    """
+    Thread pool keeping the most futures it had pending at once
+    """
+    most_pending = 0
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.pending = 0
+
+    def submit(self, *args, **kwargs):
+        self.pending += 1
+        CountingExecutor.most_pending = max(CountingExecutor.most_pending,
+                                            self.pending)
+        future = super().submit(*args, **kwargs)
+        future.add_done_callback(self.done)
+        return future
+
+    def done(self, future):
+        self.pending -= 1
+
+
+class LinkCheckerTest(AppTestCase):
+
+    def test_saves_the_status_of_every_link(self):
+        root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, root, True)
+        os.makedirs(os.path.join(root, "Dataset", "Tests"))
+        with StubServer(ROUTES) as server:
+            for number in range(20):
+                self.add_data(f"Ok {number}", link=server.url + "/ok")
+            self.add_data("Only GET", link=server.url + "/only-get")
+            self.add_data("Gone", link=server.url + "/gone")
+            self.add_data("Share")
+            self.add_data("Missing", link="\\\\Dataset\\Missing")
+            CountingExecutor.most_pending = 0
+            with mock.patch("jobs.links.ThreadPoolExecutor",
+                            CountingExecutor):
+                summary = LinkChecker(Session, max_workers=2,
+                                      batch_size=7, root=root).run()
+        self.assertEqual(summary, {"data": 24, "status": {
+            "ok": 22, "broken": 1, "missing": 1}})
+        self.assertLessEqual(CountingExecutor.most_pending, 8)
+        statuses = dict(Session().query(Data.name, Data.link_status))
+        self.assertEqual(statuses["Gone"], "broken")
+        self.assertEqual(statuses["Missing"], "missing")
+        self.assertEqual(statuses["Share"], "ok")
+        self.assertEqual(statuses["Only GET"], "ok")
+
+    def test_network_shares_are_unchecked_without_root(self):
+        self.add_data("Share")
+        check_date = Session().query(Data.check_date).scalar()
+        Session.remove()
+        with mock.patch.dict(os.environ):
+            os.environ.pop("LINK_ROOT", None)
+            summary = LinkChecker(Session).run()
+        self.assertEqual(summary["status"], {"unchecked": 1})
+        data = Session().query(Data).one()
+        self.assertEqual(data.link_status, "unchecked")
+        # the check date is only renewed for the links reached
+        self.assertEqual(data.check_date, check_date)
+
+
+if __name__ == "__main__":
+    unittest.main()
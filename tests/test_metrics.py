@@ -0,0 +1,50 @@
+import unittest
+
+from sqlalchemy import create_engine
+from sqlalchemy.exc import OperationalError
+
+import metrics
+import timing
+from tests.helpers import AppTestCase, data_form
+
+
+class StatementTimingTest(unittest.TestCase):
+
+    def test_failing_statement_leaves_nothing_on_the_connection(self):
+        engine = create_engine("sqlite://")
+        self.addCleanup(engine.dispose)
+        durations = []
+        timing.on_statement(engine, lambda conn, statement, parameters,
+                            executemany, duration: durations.append(duration))
+        with engine.connect() as conn:
+            info = dict(conn.info)
+            for _ in range(3):
+                with self.assertRaises(OperationalError):
+                    conn.exec_driver_sql("SELECT * FROM missing")
+            self.assertEqual(conn.info, info)
+            conn.exec_driver_sql("SELECT 1")
+        self.assertEqual(len(durations), 1)
+        self.assertGreaterEqual(durations[0], 0)
+
+
+class QueryMetricsTest(AppTestCase):
+
+    def test_failing_writes_are_not_timed(self):
+        self.add_data("Roads")
+        queries = dict(metrics.queries_total.samples())["db_queries_total"]
+        for _ in range(3):
+            response = self.client.post("/data", data=data_form("Roads"))
+            self.assertEqual(response.status_code, 409)
+        response = self.client.get("/dataset/stats")
+        self.assertEqual(response.status_code, 200)
+        self.assertGreater(
+            dict(metrics.queries_total.samples())["db_queries_total"],
+            queries)
+        samples = dict(metrics.query_duration.samples())
+        self.assertEqual(samples["db_query_duration_seconds_count"],
+                         dict(metrics.queries_total.samples())
+                         ["db_queries_total"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,64 @@
+import json
+import unittest
+
+from tests.helpers import AppTestCase
+
+
+class PaginationTest(AppTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.ids = {}
+        for number in range(7):
+            area = "Cork" if number % 3 == 1 else "Dublin"
+            self.ids[f"Data {number}"] = \
+                self.add_data(f"Data {number}", area=area)["id"]
+
+    def pages(self, path: str, limit: int) -> list:
+        """
+        Follows the pages of a list, returning the names of each one
+        """
+        pages, after = [], None
+        while True:
+            url = f"{path}&limit={limit}" + \
+                (f"&after={after}" if after is not None else "")
+            body = self.client.get(url).get_json()
+            pages.append([data["name"] for data in body["dataset"]])
+            after = body["next_after"]
+            if after is None:
+                return pages
+            self.assertEqual(after, self.ids[pages[-1][-1]])
+
+    def test_dataset_pages_follow_the_ids(self):
+        self.assertEqual(self.pages("/dataset?", 3), [
+            ["Data 0", "Data 1", "Data 2"], ["Data 3", "Data 4", "Data 5"],
+            ["Data 6"]])
+        # a full last page is followed by an empty one
+        self.assertEqual(self.pages("/dataset?", 7), [
+            [f"Data {number}" for number in range(7)], []])
+
+    def test_area_pages(self):
+        self.assertEqual(self.pages("/area?area=Dublin", 2), [
+            ["Data 0", "Data 2"], ["Data 3", "Data 5"], ["Data 6"]])
+
+    def test_pages_skip_the_data_removed_meanwhile(self):
+        first = self.client.get("/dataset?limit=3").get_json()
+        self.client.delete("/data?name=Data 3")
+        second = self.client.get(
+            f"/dataset?limit=3&after={first['next_after']}").get_json()
+        self.assertEqual([data["name"] for data in second["dataset"]],
+                         ["Data 4", "Data 5", "Data 6"])
+
+    def test_stream(self):
+        response = self.client.get(
+            f"/dataset?stream=true&after={self.ids['Data 4']}")
+        self.assertEqual(response.mimetype, "application/x-ndjson")
+        lines = response.get_data(True).splitlines()
+        self.assertEqual([json.loads(line)["name"] for line in lines],
+                         ["Data 5", "Data 6"])
+        self.assertNotIn("next_after", self.client.get("/dataset")
+                         .get_json())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,34 @@
+import unittest
+
+import model
+import timing
+from tests.helpers import AppTestCase, data_form
+
+
+class ProfilingTest(AppTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.app.config["PROFILING"] = True
+
+    def test_metrics_and_profiling_share_the_statement_timing(self):
+        self.assertEqual(len(timing._callbacks[model.engine]), 2)
+
+    def test_profiles_the_queries_after_failing_writes(self):
+        self.add_data("Roads")
+        for _ in range(3):
+            response = self.client.post("/data", data=data_form("Roads"))
+            self.assertEqual(response.status_code, 409)
+        response = self.client.get("/data?name=Roads",
+                                   headers={"X-Profile": "1"})
+        self.assertEqual(response.status_code, 200)
+        report = response.get_json()
+        self.assertEqual(report["response"]["status"], 200)
+        self.assertGreater(report["query_count"], 0)
+        for query in report["queries"]:
+            self.assertGreaterEqual(query["duration_ms"], 0)
+            self.assertIsInstance(query["plan"], list)
+
+
+if __name__ == "__main__":
+    unittest.main()
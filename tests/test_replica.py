@@ -0,0 +1,161 @@
+from unittest import mock
+import sqlite3
+import unittest
+
+from model import Session
+from replica import CatalogReplica, CatalogSnapshot, catalog_row, \
+    CATALOG_FIELDS
+from tests.helpers import AppTestCase
+
+
+def row(pk: int, version: int, name: str, area: str = "Dublin",
+        format: str = "SHP"):
+    values = dict.fromkeys(CATALOG_FIELDS)
+    values.update(id=pk, version=version, name=name, area=area,
+                  format=format)
+    return catalog_row(values[field] for field in CATALOG_FIELDS)
+
+
+class CatalogSnapshotTest(unittest.TestCase):
+
+    def assert_same(self, snapshot, expected):
+        self.assertEqual(snapshot.version, expected.version)
+        self.assertEqual(snapshot.rows, expected.rows)
+        self.assertEqual(snapshot.by_id, expected.by_id)
+        self.assertEqual(snapshot.by_name, expected.by_name)
+        self.assertEqual(snapshot.by_area, expected.by_area)
+        self.assertEqual(snapshot.by_format, expected.by_format)
+
+    def test_patch_matches_a_build(self):
+        snapshot = CatalogSnapshot.build(3, [
+            row(1, 1, "Roads"), row(2, 2, "Rivers", "Cork", "GPKG"),
+            row(3, 3, "Parks")])
+        patched = snapshot.patch(7, [
+            # Roads moves to Cork and is renamed, Rivers is deleted, Lakes
+            # is added and then updated
+            (6, 4, row(4, 6, "Lakes", "Kerry")),
+            (4, 1, row(1, 4, "Motorways", "Cork")),
+            (5, 2, None),
+            (3, 4, row(4, 3, "Lake", "Kerry", "GPKG")),
+            ])
+        self.assert_same(patched, CatalogSnapshot.build(7, [
+            row(1, 4, "Motorways", "Cork"), row(3, 3, "Parks"),
+            row(4, 6, "Lakes", "Kerry")]))
+        self.assertNotIn("GPKG", patched.by_format)
+        self.assertNotIn("Roads", patched.by_name)
+        # the snapshot patched is left as it was
+        self.assertEqual([r.name for r in snapshot.rows],
+                         ["Roads", "Rivers", "Parks"])
+
+    def test_delete_and_reuse_of_a_name(self):
+        snapshot = CatalogSnapshot.build(1, [row(1, 1, "Roads")])
+        patched = snapshot.patch(3, [(2, 1, None),
+                                     (3, 2, row(2, 3, "Roads"))])
+        self.assert_same(patched,
+                         CatalogSnapshot.build(3, [row(2, 3, "Roads")]))
+        self.assertEqual(patched.patch(4, [(4, 2, None)]).by_area, {})
+
+    def test_area_lookups(self):
+        snapshot = CatalogSnapshot.build(1, [
+            row(1, 1, "Roads", "Dublin"), row(2, 1, "Island", "All Ireland"),
+            row(3, 1, "Republic", "ROI - All"), row(4, 1, "Cliffs", "Clare"),
+            row(5, 1, "Other", "Teste")])
+
+        def names(*args):
+            return [r.name for r in snapshot.area(*args)]
+        self.assertEqual(names("Dublin"), ["Roads"])
+        self.assertEqual(names("Dublin", "ancestors"),
+                         ["Roads", "Island", "Republic"])
+        self.assertEqual(names("ROI - All", "descendants"),
+                         ["Roads", "Republic", "Cliffs"])
+        self.assertEqual(names("Teste", "ancestors"), ["Other"])
+
+
+class ReplicaTest(AppTestCase):
+
+    def setUp(self):
+        super().setUp()
+        # a long interval: the reads see the other workers' writes through
+        # the version read by the response cache, not by the interval
+        self.replica = CatalogReplica(Session.session_factory,
+                                      check_interval=3600)
+        patcher = mock.patch("app.replica", self.replica)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def write_from_another_worker(self, statement: str, *parameters):
+        connection = sqlite3.connect(self.database)
+        with connection:
+            connection.execute(statement, parameters)
+        connection.close()
+
+    def names(self, path: str) -> list:
+        response = self.client.get(path)
+        self.assertEqual(response.status_code, 200)
+        return [data["name"] for data in response.get_json()["dataset"]]
+
+    def test_reads_follow_the_writes_of_every_worker(self):
+        self.add_data("Roads", area="Dublin")
+        self.add_data("Rivers", area="Cork")
+        self.assertEqual(self.names("/dataset"), ["Roads", "Rivers"])
+        self.assertEqual(
+            self.client.get("/data?name=Roads").get_json()["description"],
+            "Description of Roads")
+
+        self.write_from_another_worker(
+            "UPDATE data SET description = 'Changed', area = 'Cork' "
+            "WHERE name = 'Roads'")
+        self.assertEqual(
+            self.client.get("/data?name=Roads").get_json()["description"],
+            "Changed")
+        self.assertEqual(self.names("/area?area=Cork"), ["Roads", "Rivers"])
+
+        self.write_from_another_worker("DELETE FROM data WHERE name = ?",
+                                       "Rivers")
+        self.assertEqual(self.names("/dataset"), ["Roads"])
+        self.assertEqual(self.client.get("/data?name=Rivers").status_code,
+                         404)
+        self.client.delete("/data?name=Roads")
+        self.assertEqual(self.names("/dataset"), [])
+
+    def test_area_includes_match_the_database(self):
+        self.add_data("Roads", area="Dublin")
+        self.add_data("Island", area="All Ireland")
+        self.add_data("Coast", area="Northern Ireland")
+        paths = ["/area?area=Dublin&include=ancestors",
+                 "/area?area=All Ireland&include=descendants",
+                 "/area?area=UK - All&include=descendants",
+                 "/data/search?area=Dublin"]
+        replica = [self.client.get(path).get_json() for path in paths]
+        with mock.patch("app.replica", None):
+            database = [self.client.get(path).get_json() for path in paths]
+        self.assertEqual(replica, database)
+        self.assertEqual([data["name"] for data in replica[0]["dataset"]],
+                         ["Roads", "Island"])
+
+    def test_check_replaces_a_diverging_snapshot(self):
+        self.add_data("Roads")
+        self.add_data("Rivers")
+        check = self.client.get("/replica/check").get_json()
+        self.assertEqual((check["consistent"], check["data"]), (True, 2))
+
+        # a snapshot that lost a data at the current version
+        snapshot = self.replica.snapshot()
+        self.replica._snapshot = snapshot.patch(
+            snapshot.version, [(snapshot.version, snapshot.rows[0].id,
+                                None)])
+        check = self.client.get("/replica/check").get_json()
+        self.assertEqual((check["consistent"], check["missing"]),
+                         (False, [snapshot.rows[0].id]))
+        self.assertEqual(self.client.get("/replica/check")
+                         .get_json()["consistent"], True)
+        self.assertEqual(self.names("/dataset"), ["Roads", "Rivers"])
+
+    def test_check_is_off_without_replica(self):
+        with mock.patch("app.replica", None):
+            self.assertEqual(self.client.get("/replica/check").status_code,
+                             404)
+
+
+if __name__ == "__main__":
+    unittest.main()
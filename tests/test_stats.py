@@ -0,0 +1,69 @@
+from datetime import datetime
+import sqlite3
+import unittest
+
+import model
+from model import read_stats, rebuild_stats
+from tests.helpers import AppTestCase, data_form
+
+
+class StatsTest(AppTestCase):
+
+    def tables(self, connection) -> tuple:
+        return (sorted(connection.exec_driver_sql(
+                    "SELECT dimension, value, count FROM data_stats "
+                    "WHERE count > 0").all()),
+                sorted(connection.exec_driver_sql(
+                    "SELECT day, count FROM data_due_stats "
+                    "WHERE count > 0").all()))
+
+    def assert_matches_rebuild(self):
+        """
+        Checks the summary tables kept by the triggers against the ones
+        counted again from the data table
+        """
+        now = datetime.now()
+        with model.engine.begin() as connection:
+            kept = self.tables(connection), read_stats(connection, now)
+            rebuild_stats(connection)
+            rebuilt = self.tables(connection), read_stats(connection, now)
+            connection.rollback()
+        self.assertEqual(kept, rebuilt)
+        return kept[1]
+
+    def test_triggers_match_a_rebuild(self):
+        self.add_data("Roads", area="Dublin", format="SHP")
+        self.add_data("Rivers", area="Cork", format="GPKG",
+                      permitted=False)
+        self.add_data("Parks", area="Dublin", format="WFS",
+                      update_frequency_days=7)
+        self.add_data("Lakes", area="Kerry", coordinate_system="WGS84")
+        stats = self.assert_matches_rebuild()
+        self.assertEqual(stats["total"], 4)
+        self.assertEqual(stats["area"], {"Dublin": 2, "Cork": 1,
+                                         "Kerry": 1})
+
+        self.client.put("/data?name=Roads", data=data_form(
+            "Roads", area="Cork", format="GPKG"))
+        self.client.delete("/data?name=Lakes")
+        self.client.patch("/dataset/check", json={"area": "Dublin"})
+        self.client.post("/dataset/bulk", json=[
+            data_form("Bogs", area="Offaly"), data_form("Parks")])
+        connection = sqlite3.connect(self.database)
+        with connection:
+            connection.execute(
+                "UPDATE data SET permitted = 0, next_check_date = NULL "
+                "WHERE name = 'Bogs'")
+        connection.close()
+        stats = self.assert_matches_rebuild()
+        self.assertEqual(stats["total"], 4)
+        self.assertEqual(stats["area"].get("Cork"), 2)
+        self.assertNotIn("Kerry", stats["area"])
+
+        response = self.client.get("/dataset/stats")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.get_json()["total"], 4)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,61 @@
+import sqlite3
+import unittest
+
+from tests.helpers import AppTestCase, data_form
+
+
+class TextSearchTest(AppTestCase):
+
+    def search(self, words: str) -> list:
+        response = self.client.get("/data/text", query_string={"q": words})
+        self.assertEqual(response.status_code, 200)
+        return [data["name"] for data in response.get_json()["dataset"]]
+
+    def test_index_follows_the_writes(self):
+        self.add_data("Flood Zones", description="Areas at risk of flooding")
+        self.add_data("Roads", description="National road network",
+                      info="Motorways")
+        self.assertEqual(self.search("flood"), ["Flood Zones"])
+        self.assertEqual(self.search("motorway"), ["Roads"])
+        self.assertEqual(self.search("road network"), ["Roads"])
+        self.assertEqual(self.search("road flood"), [])
+
+        response = self.client.put(
+            "/data?name=Roads",
+            data=data_form("Roads", description="Rivers and streams"))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.search("network"), [])
+        self.assertEqual(self.search("streams"), ["Roads"])
+
+        self.client.delete("/data?name=Flood Zones")
+        self.assertEqual(self.search("flood"), [])
+
+    def test_writes_out_of_the_app_are_indexed(self):
+        self.add_data("Roads")
+        connection = sqlite3.connect(self.database)
+        with connection:
+            connection.execute(
+                "UPDATE data SET source = 'https://example.com/peat' "
+                "WHERE name = 'Roads'")
+        connection.close()
+        self.assertEqual(self.search("peat"), ["Roads"])
+
+    def test_snippet_and_rank(self):
+        self.add_data("Flood Zones", description="Areas at risk of flooding")
+        self.add_data("Coast", description="Coastal flood defences "
+                      "against flood and flooding")
+        response = self.client.get("/data/text", query_string={"q": "flood"})
+        dataset = response.get_json()["dataset"]
+        # a word in the name weighs more than many in the description
+        self.assertEqual([data["name"] for data in dataset],
+                         ["Flood Zones", "Coast"])
+        self.assertLessEqual(dataset[0]["rank"], dataset[1]["rank"])
+        self.assertIn("[", dataset[0]["snippet"])
+
+    def test_search_without_words(self):
+        response = self.client.get("/data/text", query_string={"q": " - "})
+        self.assertEqual(response.status_code, 400)
+
+
+if __name__ == "__main__":
+    unittest.main()
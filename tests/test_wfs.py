@@ -0,0 +1,122 @@
+import unittest
+
+from jobs.http import FetchCache
+from jobs.wfs import WFSResolver, capabilities_url, parse_wfs_capabilities, \
+    type_names
+from model import Session, Data
+from tests.helpers import AppTestCase, StubServer
+
+
+CAPABILITIES_2_0 = b"""<?xml version="1.0"?>
+<wfs:WFS_Capabilities version="2.0.0"
+    xmlns:wfs="http://www.opengis.net/wfs/2.0"
+    xmlns:ows="http://www.opengis.net/ows/1.1">
+  <FeatureTypeList>
+    <FeatureType>
+      <Name>ns:Roads</Name>
+      <ows:WGS84BoundingBox>
+        <ows:LowerCorner>-6.5 53.1</ows:LowerCorner>
+        <ows:UpperCorner>-6.0 53.5</ows:UpperCorner>
+      </ows:WGS84BoundingBox>
+    </FeatureType>
+    <FeatureType>
+      <Name>ns:Rivers</Name>
+      <ows:WGS84BoundingBox>
+        <ows:LowerCorner>-10.0 51.5</ows:LowerCorner>
+        <ows:UpperCorner>-5.5 55.4</ows:UpperCorner>
+      </ows:WGS84BoundingBox>
+    </FeatureType>
+  </FeatureTypeList>
+</wfs:WFS_Capabilities>"""
+
+CAPABILITIES_1_0 = b"""<?xml version="1.0"?>
+<WFS_Capabilities version="1.0.0">
+  <FeatureTypeList>
+    <FeatureType>
+      <Name>Parks</Name>
+      <LatLongBoundingBox minx="-6.4" miny="53.2" maxx="-6.1" maxy="53.4"/>
+    </FeatureType>
+  </FeatureTypeList>
+</WFS_Capabilities>"""
+
+
+class ParseCapabilitiesTest(unittest.TestCase):
+
+    def test_reads_the_feature_type_named(self):
+        self.assertEqual(parse_wfs_capabilities(CAPABILITIES_2_0,
+                                                ["ns:Roads"]),
+                         (53.1, -6.5, 53.5, -6.0))
+        self.assertEqual(parse_wfs_capabilities(CAPABILITIES_2_0,
+                                                ["Rivers"]),
+                         (51.5, -10.0, 55.4, -5.5))
+        self.assertEqual(parse_wfs_capabilities(CAPABILITIES_1_0,
+                                                ["topp:Parks"]),
+                         (53.2, -6.4, 53.4, -6.1))
+
+    def test_missing_feature_type_has_no_extent(self):
+        self.assertIsNone(parse_wfs_capabilities(CAPABILITIES_2_0,
+                                                 ["ns:Lakes"]))
+        self.assertIsNone(parse_wfs_capabilities(CAPABILITIES_2_0,
+                                                 ["other:Roads"]))
+        self.assertIsNone(parse_wfs_capabilities(CAPABILITIES_2_0,
+                                                 ["ns:Roads", "ns:Lakes"]))
+
+    def test_without_names_covers_every_feature_type(self):
+        self.assertEqual(parse_wfs_capabilities(CAPABILITIES_2_0),
+                         (51.5, -10.0, 55.4, -5.5))
+        self.assertEqual(parse_wfs_capabilities(CAPABILITIES_2_0,
+                                                ["ns:Roads", "ns:Rivers"]),
+                         (51.5, -10.0, 55.4, -5.5))
+
+    def test_type_names_of_the_url(self):
+        url = "https://example.com/wfs?service=WFS&version=2.0.0" \
+              "&request=GetFeature&typeNames=ns:Roads,ns:Rivers"
+        self.assertEqual(type_names(url), ["ns:Roads", "ns:Rivers"])
+        self.assertEqual(type_names("https://example.com/wfs?TYPENAME=a"),
+                         ["a"])
+        self.assertEqual(capabilities_url(url), (
+            "wfs", "https://example.com/wfs?version=2.0.0&service=WFS"
+                   "&request=GetCapabilities"))
+
+
+class WFSResolverTest(AppTestCase):
+
+    def bounding_box(self, name: str):
+        return Session().query(Data.bounding_box) \
+            .filter(Data.name == name).scalar()
+
+    def test_resolves_the_feature_type_of_each_link(self):
+        with StubServer({"/wfs": (200, CAPABILITIES_2_0)}) as server:
+            for name, type_name in (("Roads", "ns:Roads"),
+                                    ("Rivers", "Rivers"),
+                                    ("Lakes", "ns:Lakes")):
+                self.add_data(name, format="WFS",
+                              link=f"{server.url}/wfs?service=WFS"
+                                   f"&request=GetFeature"
+                                   f"&typeNames={type_name}")
+            self.add_data("Gone", format="WFS",
+                          link=f"{server.url}/missing?typeName=ns:Roads")
+            cache = FetchCache()
+            summary = WFSResolver(Session, max_workers=1, cache=cache).run()
+            self.assertEqual([path for _, path in server.requests
+                              if path.startswith("/wfs")],
+                             ["/wfs?service=WFS&request=GetCapabilities"])
+            # the next run finds the capabilities in the cache
+            requests = len(server.requests)
+            again = WFSResolver(Session, cache=cache).run()
+            self.assertEqual(len(server.requests), requests + 1)
+        self.assertEqual(summary["updated"], 2)
+        self.assertEqual(summary["failed"], 2)
+        self.assertEqual(set(summary["errors"]), {"Lakes", "Gone"})
+        self.assertEqual(self.bounding_box("Roads"), "53.1 -6.5; 53.5 -6.0")
+        self.assertEqual(self.bounding_box("Rivers"),
+                         "51.5 -10.0; 55.4 -5.5")
+        self.assertEqual(again["unchanged"], 2)
+
+    def test_runs_share_the_fetch_cache(self):
+        self.assertIs(WFSResolver(Session).cache,
+                      WFSResolver(Session).cache)
+
+
+if __name__ == "__main__":
+    unittest.main()
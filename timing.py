@@ -0,0 +1,39 @@
+from sqlalchemy import event
+import time
+import weakref
+
+
+# the callbacks of the statements of each engine
+_callbacks = weakref.WeakKeyDictionary()
+
+
+def on_statement(engine, callback):
+    """
+    Calls callback(conn, statement, parameters, executemany, duration)
+    after each SQL statement run by the engine, with its duration in
+    seconds. The engine gets one pair of listeners whatever the number of
+    callbacks, and the start time is kept in the execution context of the
+    statement, so a statement that fails leaves nothing behind on the
+    pooled connection.
+    """
+    callbacks = _callbacks.get(engine)
+    if callbacks is None:
+        callbacks = _callbacks[engine] = []
+
+        @event.listens_for(engine, "before_cursor_execute")
+        def start_statement(conn, cursor, statement, parameters, context,
+                            executemany):
+            if context is not None:
+                context.statement_started = time.perf_counter()
+
+        @event.listens_for(engine, "after_cursor_execute")
+        def finish_statement(conn, cursor, statement, parameters, context,
+                             executemany):
+            started = getattr(context, "statement_started", None)
+            if started is None:
+                return
+            duration = time.perf_counter() - started
+            for callback in callbacks:
+                callback(conn, statement, parameters, executemany, duration)
+
+    callbacks.append(callback)